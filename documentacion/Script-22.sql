@@ -128,3 +128,26 @@ FROM album_prices ap
 JOIN Album a ON ap.collection_Id = a.collection_Id
 WHERE ap.collection_Id = 78989263
 ORDER BY fecha;
+ 
+-- Con el historial compactado (Track_price_intervals / Album_price_intervals) las consultas
+-- anteriores funcionan sobre las vistas track_prices_diario / album_prices_diario.
+-- Precio vigente de cada álbum, directamente sobre los tramos:
+SELECT 
+    a.collectionname,
+    api.collectionprice,
+    api.valid_from,
+    api.last_checked
+FROM album_price_intervals api
+JOIN album a ON api.collection_id = a.collection_id
+WHERE api.valid_to IS NULL
+ORDER BY api.last_checked DESC;
+ 
+-- Cambios de precio de una canción (un tramo por precio)
+SELECT 
+    tpi.track_id,
+    tpi.trackprice,
+    tpi.valid_from,
+    tpi.valid_to
+FROM track_price_intervals tpi
+WHERE tpi.track_id = 1440857781
+ORDER BY tpi.valid_from;
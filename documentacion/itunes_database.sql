@@ -1,3 +1,8 @@
+-- Esquema base: versión 1 de las migraciones (copiada en src/ETL/migraciones.py, que no lee este
+-- archivo). Los cambios posteriores (restricción UNIQUE en Genre, historial de precios por intervalos,
+-- particiones mensuales, índices, checkpoints de carga y resúmenes del EDA) son migraciones versionadas
+-- en src/ETL/migraciones.py, que se aplican antes de cada carga o con `python main_ETL.py --migrar`.
+
 CREATE TABLE IF NOT EXISTS Artist (
     artist_Id INTEGER PRIMARY KEY,
     artistName TEXT,
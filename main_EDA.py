@@ -1,11 +1,43 @@
 from src.EDA.explore import *
+from src.ETL.load import conectar_postgres
+from src.ETL.resumenes import (
+    duracion_y_precio_por_genero,
+    precio_medio_diario,
+    precio_medio_por_genero,
+    precio_y_duracion_por_explicitud,
+    top_artistas_por_precio
+)
+from src.instrumentacion import activar_desde_entorno, finalizar_instrumentacion
+from dotenv import load_dotenv
 import os
 
-RUTA_DATOS = "data/data_limpio/itunes.pkl"
+# Dataset limpio (.pkl, .parquet o .arrow); por defecto, el que guarda main_ETL con su formato de
+# almacenamiento por defecto (--formato-almacen parquet). Se puede cambiar con la variable de entorno ITUNES_DATOS
+RUTA_DATOS = os.getenv("ITUNES_DATOS", "../data/data_limpio/itunes_limpio.parquet")
 CARPETA_SALIDA = "output/plots"
 os.makedirs(CARPETA_SALIDA, exist_ok=True)
 
+def conectar_resumenes():
+    """
+    Con ITUNES_EDA_BD=1, conexión a PostgreSQL (datos del .env) para leer los agregados de las
+    tablas de resúmenes que mantiene la carga, en lugar de recalcularlos sobre todo el dataset.
+    Los valores no coinciden exactamente con los del dataset (ver `src.ETL.resumenes`).
+    """
+    if os.getenv("ITUNES_EDA_BD") != "1":
+        return None
+    load_dotenv()
+    conn = conectar_postgres(os.getenv("DB_NAME"), os.getenv("DB_USER"), os.getenv("DB_PASSWORD"),
+                             os.getenv("DB_HOST", "localhost"), os.getenv("DB_PORT", "5432"))
+    print("[INFO] Agregados por género, explicitud, artista y día leídos de los resúmenes de la base: una "
+          "observación por canción (o álbum) y día con los atributos actuales de la canción y artistas por "
+          "artist_id, así que pueden diferir de los calculados sobre el dataset (una fila por registro bruto).")
+    return conn
+
 def main():
+    # Instrumentación opcional (variable de entorno ITUNES_INSTRUMENTACION con la ruta del informe)
+    activar_desde_entorno()
+    conn = conectar_resumenes()
+
     # 1. Carga de datos
     df = cargar_dataset(RUTA_DATOS)
 
@@ -33,14 +65,23 @@ def main():
     graficar_residuos_lineales_album(df, guardar=True, ruta=f"{CARPETA_SALIDA}/residuos_precio_album.png")
 
     # 6. Género y explicitud
-    genre_price = df.groupby('primaryGenreName')['trackPrice'].mean().sort_values(ascending=False).head(15)
+    if conn is not None:
+        genre_price = precio_medio_por_genero(conn, top=15)
+    else:
+        genre_price = df.groupby('primaryGenreName', observed=True)['trackPrice'].mean().sort_values(ascending=False).head(15)
     graficar_precio_medio_por_genero(genre_price, guardar=True, ruta=f"{CARPETA_SALIDA}/precio_por_genero.png")
 
-    explicit_stats_df = df.groupby('trackExplicitness')[['trackPrice', 'trackTimeMillis']].mean()
+    if conn is not None:
+        explicit_stats_df = precio_y_duracion_por_explicitud(conn)
+    else:
+        explicit_stats_df = df.groupby('trackExplicitness', observed=True)[['trackPrice', 'trackTimeMillis']].mean()
     explicit_stats_df['trackTimeMinutes'] = explicit_stats_df['trackTimeMillis'] / 60000
     graficar_precio_y_duracion_por_explicitud(explicit_stats_df, guardar=True, ruta=f"{CARPETA_SALIDA}/precio_duracion_explicitud.png")
 
-    top_artists_df = df.groupby('artistName')['trackPrice'].mean().sort_values(ascending=False).head(10).to_frame(name='Precio medio (USD)')
+    if conn is not None:
+        top_artists_df = top_artistas_por_precio(conn, top=10)
+    else:
+        top_artists_df = df.groupby('artistName', observed=True)['trackPrice'].mean().sort_values(ascending=False).head(10).to_frame(name='Precio medio (USD)')
     graficar_precio_medio_por_artista(top_artists_df, guardar=True, ruta=f"{CARPETA_SALIDA}/precio_por_artista.png")
 
     # 7. Canciones largas y géneros comunes
@@ -52,14 +93,19 @@ def main():
     print("\nColecciones premium (outliers):\n", colecciones_caras)
 
     # 9. Duración y precio por género
-    graficar_duracion_y_precio_por_genero(df, guardar=True, ruta=f"{CARPETA_SALIDA}/duracion_precio_por_genero.png")
+    datos_genero = duracion_y_precio_por_genero(conn).reset_index() if conn is not None else df
+    graficar_duracion_y_precio_por_genero(datos_genero, guardar=True, ruta=f"{CARPETA_SALIDA}/duracion_precio_por_genero.png")
 
     # 10. Evolución temporal de precios
-    graficar_precio_medio_diario(df, columna_precio='trackPrice', guardar=True, ruta=f"{CARPETA_SALIDA}/evolucion_precio_track.png")
-    graficar_precio_medio_diario(df, columna_precio='collectionPrice', guardar=True, ruta=f"{CARPETA_SALIDA}/evolucion_precio_album.png")
+    graficar_precio_medio_diario(precio_medio_diario(conn, "track") if conn is not None else df, columna_precio='trackPrice', guardar=True, ruta=f"{CARPETA_SALIDA}/evolucion_precio_track.png")
+    graficar_precio_medio_diario(precio_medio_diario(conn, "album") if conn is not None else df, columna_precio='collectionPrice', guardar=True, ruta=f"{CARPETA_SALIDA}/evolucion_precio_album.png")
     
     # 11. Streaming
     graficar_streaming_disponible(df, guardar=True, carpeta=CARPETA_SALIDA)
 
+    if conn is not None:
+        conn.close()
+    finalizar_instrumentacion()
+
 if __name__ == "__main__":
     main()
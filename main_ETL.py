@@ -1,114 +1,61 @@
 # main_ETL.py
 print("[OK] Comenzando proceso ETL...")
 
+import argparse
 import os
+import shutil
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 
+from src.ETL.esquema import COLUMNAS_ETL, ESQUEMA_LIMPIEZA
 from src.ETL.file_utils import (
+    EXTENSIONES_ALMACEN,
     cargar_datos_itunes,
+    cargar_manifiesto,
+    cargar_tablas,
+    clasificar_archivos_raw,
+    clave_archivo,
     guardar_df,
-    guardar_tablas_en_pickle
+    guardar_manifiesto,
+    guardar_tablas,
+    listar_archivos_raw
 )
 from src.ETL.transform import (
     limpieza_total_texto_final,
-    limpiar_fechas_split,
-    convertir_columnas_a_entero,
-    convertir_a_booleano,
-    eliminar_filas_nulas,
-    rellenar_nulos_texto,
-    limpiar_columnas_precio,
+    coercionar_tipos,
+    imputar_precios,
     asignar_id_incremental,
-    procesar_dataframe_maestro
+    compactar_categoricas,
+    procesar_dataframe_maestro,
+    fusionar_tablas,
+    tabla_artistas,
+    TABLAS_NORMALIZADAS
 )
-from src.ETL.load import conectar_postgres, insertar_dataframe
-
-# 1. Cargar configuración
-print("[INFO] Cargando configuración de entorno (.env)...")
-load_dotenv()
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-print("[INFO] Configuración cargada correctamente.")
-
-# 2. Cargar todos los CSV acumulados
-print("\n[OK] Cargando archivos CSV acumulados...")
-df = cargar_datos_itunes()
-print(f"Total de registros cargados: {df.shape[0]}")
-
-# 3. Limpieza de datos
-print("\n[OK] Limpiando datos brutos...")
-df = limpieza_total_texto_final(df)
-df = limpiar_fechas_split(df)
-df = convertir_columnas_a_entero(df, [
-    "collectionId", "collectionArtistId", "trackTimeMillis", "discCount",
-    "discNumber", "trackCount", "trackNumber"
-])
-df = convertir_a_booleano(df, "isStreamable")
-df = eliminar_filas_nulas(df, ["collectionId", "releaseDate", "trackTimeMillis", "isStreamable"])
-df = rellenar_nulos_texto(df, [
-    "artistName", "collectionName", "trackName", "collectionCensoredName", "trackCensoredName",
-    "artistViewUrl", "collectionViewUrl", "trackViewUrl", "previewUrl",
-    "collectionArtistName", "collectionArtistViewUrl", "contentAdvisoryRating"
-])
-df = limpiar_columnas_precio(df)
-df = asignar_id_incremental(df, "collectionArtistId")
-
-# 4. Guardar DataFrame limpio
-print("\n[OK] Guardando DataFrame limpio...")
-guardar_df(df, "../data/data_limpio/itunes_limpio.pkl")
-
-# 5. Normalizar a tablas
-print("\n[OK] Normalizando tablas...")
-tablas = procesar_dataframe_maestro("../data/data_limpio/itunes_limpio.pkl")
-
-# 6. Guardar tablas individualmente
-print("\n[OK] Guardando tablas por separado...")
-guardar_tablas_en_pickle(tablas, "../data/data_limpio")
-
-# 7. Ver resumen de registros antes de insertar
-print("\n[INFO] Registros por tabla antes de insertar:")
-for tabla, df_tabla in tablas.items():
-    print(f"  - {tabla}: {len(df_tabla)} registros")
-
-# 8. Conexión a la base de datos
-print("\n[OK] Cargando tablas en PostgreSQL...")
-conn = conectar_postgres(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
-
-# 8.1 Verificar restricción UNIQUE en genre
-with conn.cursor() as cur:
-    cur.execute("""
-        DO $$
-        BEGIN
-            IF NOT EXISTS (
-                SELECT 1 FROM pg_constraint WHERE conname = 'unique_genrename'
-            ) THEN
-                ALTER TABLE genre ADD CONSTRAINT unique_genrename UNIQUE (primarygenrename);
-            END IF;
-        END$$;
-    """)
-    conn.commit()
-print("[INFO] Restricción UNIQUE en genre.primarygenrename verificada.")
-
-# 8.2 Insertar géneros (sin genre_id, lo autogenera la base)
-insertar_dataframe(tablas["genre"], "genre", ["primarygenrename"], conn)
-
-# 8.3 Leer genre_id reales desde la base
-df_genres_db = pd.read_sql("SELECT genre_id, primarygenrename FROM genre", conn)
-
-# 8.4 Merge con tabla track para asignar genre_id
-tablas["track"] = tablas["track"].merge(df_genres_db, how="left", on="primarygenrename")
-
-# 8.5 Validar que no haya tracks sin genre_id
-faltantes = tablas["track"]["genre_id"].isna().sum()
-if faltantes > 0:
-    print(f"[ERROR] {faltantes} filas en 'track' no pudieron mapear un genre_id desde la base de datos.")
-    raise ValueError("❌ Abortando carga de 'track' por fallo en mapeo de género.")
-
-# 8.6 Definir columnas para cada tabla
-esquema_columnas = {
+from src.ETL.load import conectar_postgres, insertar_dataframe, insertar_intervalos_precio, precios_no_cargados
+from src.ETL.carga_paralela import cargar_tablas_en_paralelo
+from src.ETL.carga_reanudable import cargar_tabla_reanudable
+from src.ETL.cache_claves import CacheClaves
+from src.ETL.migraciones import aplicar_migraciones, asegurar_particiones, estado_migraciones
+from src.ETL.pipeline import ejecutar_pipeline
+from src.ETL.resumenes import actualizar_resumenes, recalcular_resumenes
+from src.ETL.por_lotes import TABLAS_PRECIOS, procesar_por_lotes
+from src.instrumentacion import activar_instrumentacion, medir
+
+CARPETA_LIMPIO = "../data/data_limpio"
+CARPETA_LOTES = os.path.join(CARPETA_LIMPIO, "por_archivo")
+RUTA_MAESTRO = os.path.join(CARPETA_LIMPIO, "itunes_limpio")  # + extensión del formato de almacenamiento
+RUTA_MANIFIESTO = os.path.join(CARPETA_LIMPIO, "manifiesto_etl.json")
+CARPETA_CHECKPOINTS = os.path.join(CARPETA_LIMPIO, "checkpoints")
+CARPETA_MAESTRO_LOTES = os.path.join(CARPETA_LIMPIO, "itunes_limpio_lotes")
+CARPETA_TABLAS_LOTES = os.path.join(CARPETA_LIMPIO, "tablas_por_lotes")
+RUTA_CACHE_CLAVES = f"{CARPETA_LIMPIO}/cache_claves.pkl"
+CARPETA_CUARENTENA = os.path.join(CARPETA_LIMPIO, "cuarentena")
+
+# Columnas que se cargan en cada tabla de PostgreSQL (la primera, la clave primaria)
+ESQUEMA_COLUMNAS = {
     "artist": ["artist_id", "artistname", "artistviewurl"],
     "album": ["collection_id", "collectionname", "collectioncensoredname", "release_date",
               "collectionexplicitness", "contentadvisoryrating", "collectionprice", "currency",
@@ -121,18 +68,505 @@ esquema_columnas = {
     "track_prices": ["track_id", "trackprice", "checked_at"]
 }
 
-# 8.7 Cargar en orden
-orden_insercion = ["artist", "album", "track", "album_prices", "track_prices"]
-for nombre_tabla in orden_insercion:
-    print(f"Insertando datos en tabla '{nombre_tabla}'...")
-    insertar_dataframe(tablas[nombre_tabla], nombre_tabla, esquema_columnas[nombre_tabla], conn)
 
-conn.close()
-print("\n[OK] Proceso ETL completado con éxito.")
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL de datos de iTunes hacia PostgreSQL")
+    parser.add_argument(
+        "--full-rebuild", action="store_true",
+        help="Ignora el manifiesto y vuelve a limpiar, normalizar y cargar todos los archivos brutos"
+    )
+    parser.add_argument(
+        "--categoricas", action="store_true",
+        help="Guarda las columnas de texto muy repetitivas como tipo category para reducir memoria"
+    )
+    parser.add_argument(
+        "--checkpoint", nargs="*", default=[], metavar="ETAPA",
+        choices=["extraccion", "limpieza", "normalizacion", "por_lotes", "persistencia", "carga_bd"],
+        help="Etapas cuya salida se guarda en disco; al repetir la ejecución, una etapa con checkpoint "
+             "cuya entrada no ha cambiado se salta"
+    )
+    parser.add_argument(
+        "--precios-intervalos", action="store_true",
+        help="Carga el historial de precios como tramos (track_price_intervals / album_price_intervals) "
+             "en lugar de una fila por ID y día"
+    )
+    parser.add_argument(
+        "--por-lotes", action="store_true",
+        help="Limpia y normaliza archivo a archivo con memoria acotada (para históricos que no caben en RAM): "
+             "el DataFrame limpio y las tablas de precios se guardan por partes y se cargan parte a parte"
+    )
+    parser.add_argument(
+        "--upsert", action="store_true",
+        help="Actualiza en artist/album/track las filas ya cargadas cuyo contenido ha cambiado "
+             "(por defecto se ignoran) e informa de las filas insertadas, actualizadas y sin cambios"
+    )
+    parser.add_argument(
+        "--hilos-carga", type=int, default=1, metavar="N",
+        help="Conexiones simultáneas para cargar las tablas en PostgreSQL (por defecto 1, en serie)"
+    )
+    parser.add_argument(
+        "--filas-por-trozo", type=int, metavar="N",
+        help="Carga cada tabla en transacciones de N filas por rangos de clave: si la carga se interrumpe, "
+             "la siguiente ejecución continúa desde el último trozo confirmado, y las filas que violan una "
+             "restricción van a data_limpio/cuarentena/ en lugar de abortar la carga (no combinable con --hilos-carga)"
+    )
+    parser.add_argument(
+        "--sin-cache-claves", action="store_true",
+        help="No usa la caché local de claves de dimensión: reenvía artist/album/track completos y "
+             "lee genre entera de la base para asignar genre_id"
+    )
+    parser.add_argument(
+        "--migrar", action="store_true",
+        help="Aplica las migraciones pendientes del esquema de la base (src/ETL/migraciones.py), "
+             "muestra su estado y termina sin procesar datos"
+    )
+    parser.add_argument(
+        "--instrumentar", metavar="RUTA",
+        help="Mide tiempo, CPU, memoria y filas de cada etapa y función y guarda el informe (.json o .csv)"
+    )
+    parser.add_argument(
+        "--perfil", metavar="ETAPA",
+        help="Con --instrumentar, guarda un volcado de cProfile de la etapa o función indicada"
+    )
+    parser.add_argument(
+        "--memoria-python", action="store_true",
+        help="Con --instrumentar, mide también la memoria reservada por Python (tracemalloc, más lento)"
+    )
+    parser.add_argument(
+        "--motor", choices=["pandas", "duckdb"], default="pandas",
+        help="Motor de la normalización en tablas: pandas o consultas SQL multihilo con DuckDB "
+             "(mismas tablas; no aplica a --por-lotes)"
+    )
+    parser.add_argument(
+        "--formato-almacen", choices=["parquet", "arrow", "pickle"], default="parquet",
+        help="Formato del DataFrame limpio y las tablas en data_limpio: Parquet comprimido (por defecto), "
+             "Arrow IPC sin comprimir (lectura con memory map) o pickle (formato anterior)"
+    )
+    parser.add_argument(
+        "--particionar-fecha", action="store_true",
+        help="Con --formato-almacen parquet, guarda el DataFrame limpio en una carpeta particionada por checked_at"
+    )
+    args = parser.parse_args()
+    if args.filas_por_trozo and args.hilos_carga > 1:
+        parser.error("--filas-por-trozo no se puede combinar con --hilos-carga mayor que 1")
+    if args.particionar_fecha and args.formato_almacen != "parquet":
+        parser.error("--particionar-fecha solo se puede usar con --formato-almacen parquet")
+    if args.por_lotes and (args.motor != "pandas" or args.categoricas or args.particionar_fecha):
+        parser.error("--por-lotes no se puede combinar con --motor duckdb, --categoricas ni --particionar-fecha "
+                     "(el DataFrame limpio se guarda por partes y se normaliza con pandas)")
+    return args
+
+
+def limpiar_lote(df):
+    """Pasos de limpieza que solo dependen de cada fila: se aplican archivo a archivo."""
+    df = limpieza_total_texto_final(df)
+    df = coercionar_tipos(df, ESQUEMA_LIMPIEZA)
+    return df
+
+
+def completar_limpieza(df):
+    """
+    Pasos de limpieza que dependen de todo el histórico (media de precios e IDs incrementales).
+
+    Se aplican en cada ejecución a todo el histórico, pero en una ejecución incremental solo se
+    normalizan y cargan las filas nuevas: los precios imputados de filas cargadas en ejecuciones
+    anteriores conservan la media de entonces en las tablas y en la base. `--full-rebuild` vuelve a
+    imputarlos todos con la media actual.
+    """
+    df = imputar_precios(df, ESQUEMA_LIMPIEZA)
+    df = asignar_id_incremental(df, "collectionArtistId")
+    return df
+
+
+def ruta_lote(clave):
+    return os.path.join(CARPETA_LOTES, clave.replace("/", "__") + ".pkl")
+
+
+@medir
+def cargar_en_postgres(tablas, config_db, precios_intervalos=False, metodo="copy", hilos=1, cache_claves=True,
+                       filas_por_trozo=None):
+    # 8. Conexión a la base de datos
+    print("\n[OK] Cargando tablas en PostgreSQL...")
+    conn = conectar_postgres(**config_db)
+    try:
+        # 8.1 Aplicar las migraciones pendientes del esquema (restricción UNIQUE en genre, particiones, índices)
+        aplicar_migraciones(conn)
+
+        cache = CacheClaves(RUTA_CACHE_CLAVES) if cache_claves else None
+        if cache is not None:
+            cache.validar(conn, ["genre", "artist", "album", "track"])
+            # 8.2-8.4 genre_id desde la caché de claves: solo los géneros nuevos van a la base
+            generos = tablas["genre"]["primarygenrename"]
+            mapa_generos = dict(zip(generos, cache.ids_genero(generos, conn)))
+            tablas["track"]["genre_id"] = tablas["track"]["primarygenrename"].map(mapa_generos).astype("Int64")
+        else:
+            # 8.2 Insertar géneros (sin genre_id, lo autogenera la base)
+            insertar_dataframe(tablas["genre"], "genre", ["primarygenrename"], conn, metodo=metodo)
+
+            # 8.3 Leer genre_id reales desde la base
+            df_genres_db = pd.read_sql("SELECT genre_id, primarygenrename FROM genre", conn)
+
+            # 8.4 Merge con tabla track para asignar genre_id
+            tablas["track"] = tablas["track"].merge(df_genres_db, how="left", on="primarygenrename")
+
+        # 8.5 Validar que no haya tracks sin genre_id
+        faltantes = tablas["track"]["genre_id"].isna().sum()
+        if faltantes > 0:
+            print(f"[ERROR] {faltantes} filas en 'track' no pudieron mapear un genre_id desde la base de datos.")
+            raise ValueError("❌ Abortando carga de 'track' por fallo en mapeo de género.")
+
+        # 8.6 Columnas de cada tabla: ESQUEMA_COLUMNAS
+        esquema_columnas = ESQUEMA_COLUMNAS
+
+        # 8.7 Cargar en orden (con la caché, solo las filas de dimensión nuevas o cambiadas)
+        orden_insercion = ["artist", "album", "track"]
+        if not precios_intervalos:
+            orden_insercion += ["album_prices", "track_prices"]
+            # Particiones mensuales que falten para las fechas que se van a cargar
+            asegurar_particiones(conn, {nombre: tablas[nombre]["checked_at"] for nombre in ["album_prices", "track_prices"]})
+            # Las observaciones ya cargadas (archivo bruto modificado, carga anterior incompleta) no se duplican
+            for nombre_tabla in ["album_prices", "track_prices"]:
+                tablas[nombre_tabla] = precios_no_cargados(tablas[nombre_tabla], nombre_tabla,
+                                                           esquema_columnas[nombre_tabla][0], conn)
+        huellas = {}
+        if cache is not None:
+            for nombre_tabla in ["artist", "album", "track"]:
+                # Sin upsert, una clave ya cargada no cambia en la base: solo se envían las claves nuevas
+                tablas[nombre_tabla], huellas[nombre_tabla] = cache.filtrar(
+                    tablas[nombre_tabla], nombre_tabla, esquema_columnas[nombre_tabla], solo_nuevas=metodo != "upsert"
+                )
+
+        # Las filas escritas se registran con la huella enviada (ver `enviar_dataframe`); las que
+        # ON CONFLICT DO NOTHING ignoró (la clave ya existía), con la de su contenido actual en la base
+        claves_escritas = {nombre_tabla: [] for nombre_tabla in huellas}
+
+        def registrar_en_cache(nombre_tabla):
+            if nombre_tabla in huellas:
+                claves = tablas[nombre_tabla][esquema_columnas[nombre_tabla][0]]
+                # Con claves repetidas, la fila escrita es la primera
+                escritas = (claves.isin(claves_escritas[nombre_tabla]) & ~claves.duplicated()).to_numpy()
+                cache.registrar(nombre_tabla, claves[escritas], claves[escritas], huellas[nombre_tabla][escritas])
+                ignoradas = ~claves.isin(claves_escritas[nombre_tabla]).to_numpy()
+                cache.registrar_desde_bd(conn, nombre_tabla, esquema_columnas[nombre_tabla], claves[ignoradas])
+
+        try:
+            if hilos > 1:
+                # En paralelo: orden según las claves foráneas, tablas grandes por rangos de clave
+                informe = cargar_tablas_en_paralelo(
+                    {nombre: tablas[nombre] for nombre in orden_insercion}, esquema_columnas, config_db,
+                    hilos=hilos, metodo=metodo, claves_escritas=claves_escritas
+                )
+                estados = informe.groupby("tabla")["estado"].agg(lambda e: (e == "ok").all())
+                for nombre_tabla in orden_insercion:
+                    registrar_en_cache(nombre_tabla)
+                if not estados.all():
+                    raise RuntimeError("❌ Carga en paralelo incompleta: revisa los trozos con error u omitidos.")
+            elif filas_por_trozo:
+                # Transacciones por trozos con checkpoint; las filas rechazadas van a cuarentena
+                for nombre_tabla in orden_insercion:
+                    print(f"Insertando datos en tabla '{nombre_tabla}' (trozos de {filas_por_trozo} filas)...")
+                    cargar_tabla_reanudable(
+                        tablas[nombre_tabla], nombre_tabla, esquema_columnas[nombre_tabla], conn, metodo=metodo,
+                        filas_por_trozo=filas_por_trozo, carpeta_cuarentena=CARPETA_CUARENTENA,
+                        claves_escritas=claves_escritas.get(nombre_tabla)
+                    )
+                    registrar_en_cache(nombre_tabla)
+            else:
+                for nombre_tabla in orden_insercion:
+                    print(f"Insertando datos en tabla '{nombre_tabla}'...")
+                    insertar_dataframe(tablas[nombre_tabla], nombre_tabla, esquema_columnas[nombre_tabla], conn,
+                                       metodo=metodo, claves_escritas=claves_escritas.get(nombre_tabla))
+                    registrar_en_cache(nombre_tabla)
+        finally:
+            if cache is not None:
+                cache.guardar()
+                print("[INFO] Caché de claves (esta ejecución):")
+                print(cache.resumen().to_string())
+
+        # 8.8 Historial de precios compactado: solo se guardan los cambios de precio
+        if precios_intervalos:
+            insertar_intervalos_precio(tablas["album_prices"], "album_price_intervals", "collection_id", "collectionprice", conn)
+            insertar_intervalos_precio(tablas["track_prices"], "track_price_intervals", "track_id", "trackprice", conn)
+
+        # 8.9 Resúmenes del EDA: solo los grupos con precios nuevos (todos si se han actualizado canciones o artistas)
+        if metodo == "upsert":
+            recalcular_resumenes(conn)
+        else:
+            actualizar_resumenes(conn)
+    finally:
+        conn.close()
+
+
+def etapa_extraccion(entrada):
+    """Lee los archivos brutos nuevos o modificados (uno a uno, para poder limpiarlos por separado)."""
+    print("\n[OK] Cargando datos brutos pendientes...")
+    lotes = {
+        clave_archivo(archivo): cargar_datos_itunes(formato=entrada["formato"], columnas=COLUMNAS_ETL,
+                                                    archivos=[archivo])
+        for archivo in entrada["pendientes"]
+    }
+    return {**{k: v for k, v in entrada.items() if k != "pendientes"}, "lotes": lotes}
+
+
+def etapa_limpieza(entrada):
+    """Limpia los lotes pendientes, actualiza la caché por archivo y reconstruye el DataFrame limpio."""
+    # 3. Limpieza de datos, archivo a archivo (solo los pendientes)
+    print("\n[OK] Limpiando datos brutos pendientes...")
+    manifiesto = dict(entrada["manifiesto"])
+    os.makedirs(CARPETA_LOTES, exist_ok=True)
+    for clave in entrada["eliminados"]:
+        manifiesto.pop(clave, None)
+        if os.path.exists(ruta_lote(clave)):
+            os.remove(ruta_lote(clave))
+
+    for clave, df_lote in entrada["lotes"].items():
+        filas_brutas = len(df_lote)
+        df_lote = limpiar_lote(df_lote.copy())
+        df_lote.to_pickle(ruta_lote(clave))
+        manifiesto[clave] = {
+            "hash": entrada["hashes"][clave],
+            "filas_brutas": filas_brutas,
+            "filas_limpias": len(df_lote),
+        }
+        print(f"  - {clave}: {filas_brutas} → {len(df_lote)} registros")
+
+    # 4. Reconstruir el DataFrame limpio a partir de los lotes y aplicar los pasos globales
+    claves = sorted(manifiesto)
+    lotes = [pd.read_pickle(ruta_lote(clave)) for clave in claves]
+    nuevos = np.concatenate([np.full(len(lote), clave in entrada["lotes"]) for clave, lote in zip(claves, lotes)])
+    df = completar_limpieza(pd.concat(lotes, ignore_index=True))
+    if entrada["categoricas"]:
+        df = compactar_categoricas(df)
+    print(f"Total de registros limpios: {df.shape[0]} ({int(nuevos.sum())} nuevos)")
+
+    return {
+        "maestro": df,
+        "nuevos": nuevos,
+        "manifiesto": manifiesto,
+        "reconstruir_tablas": entrada["reconstruir_tablas"],
+        "full_rebuild": entrada["full_rebuild"],
+    }
+
+
+def etapa_normalizacion(motor="pandas"):
+    """Separa el DataFrame limpio en tablas (solo las filas nuevas, salvo reconstrucción)."""
+    def etapa(entrada):
+        # 5. Normalizar a tablas (solo las filas nuevas, salvo reconstrucción completa)
+        print(f"\n[OK] Normalizando tablas (motor: {motor})...")
+        tablas_previas = {} if entrada["full_rebuild"] else cargar_tablas(CARPETA_LIMPIO, TABLAS_NORMALIZADAS)
+        reconstruir_tablas = entrada["reconstruir_tablas"] or len(tablas_previas) < len(TABLAS_NORMALIZADAS)
+        df = entrada["maestro"]
+        df_nuevo = df[entrada["nuevos"]]
+        if entrada["full_rebuild"]:
+            tablas_nuevas = procesar_dataframe_maestro(df, motor=motor)
+        else:
+            tablas_nuevas = procesar_dataframe_maestro(df_nuevo, motor=motor) if not df_nuevo.empty else {}
+
+        if reconstruir_tablas:
+            tablas = tablas_nuevas if entrada["full_rebuild"] else procesar_dataframe_maestro(df, motor=motor)
+        else:
+            tablas = fusionar_tablas(tablas_previas, tablas_nuevas)
+            if tablas_nuevas:
+                # El nombre y la URL de cada artista son la moda de todo el histórico (no la primera
+                # fila que se cargó); se envían los artistas de las filas nuevas, que con --upsert
+                # se actualizan en la base (con COPY se conservan los de la primera carga)
+                tablas["artist"] = tabla_artistas(df)
+                artistas_nuevos = tablas["artist"]["artist_id"].isin(tablas_nuevas["artist"]["artist_id"])
+                tablas_nuevas["artist"] = tablas["artist"][artistas_nuevos].reset_index(drop=True)
+
+        return {"maestro": df, "tablas": tablas, "tablas_nuevas": tablas_nuevas, "manifiesto": entrada["manifiesto"]}
+    return etapa
+
+
+def etapa_por_lotes(entrada):
+    """
+    Limpieza y normalización archivo a archivo con memoria acotada (ver `procesar_por_lotes`): se
+    normalizan los archivos que aún no están en el estado de CARPETA_TABLAS_LOTES y se cargan solo
+    las partes de los archivos pendientes. Un archivo modificado o eliminado cambia las posiciones
+    e IDs incrementales de los posteriores, así que el estado se rehace desde el principio
+    (reutilizando la limpieza por archivo de los que no han cambiado).
+    """
+    print("\n[OK] Limpiando y normalizando por lotes...")
+    manifiesto = dict(entrada["manifiesto"])
+    os.makedirs(CARPETA_LOTES, exist_ok=True)
+    for clave in entrada["eliminados"]:
+        manifiesto.pop(clave, None)
+        if os.path.exists(ruta_lote(clave)):
+            os.remove(ruta_lote(clave))
+    if entrada["reconstruir_tablas"]:
+        for carpeta in [CARPETA_TABLAS_LOTES, CARPETA_MAESTRO_LOTES]:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    claves = {archivo: clave_archivo(archivo) for archivo in entrada["archivos"]}
+    pendientes = set(entrada["pendientes"])
+    normalizador, resumen = procesar_por_lotes(
+        entrada["archivos"], CARPETA_TABLAS_LOTES, formato=entrada["formato"],
+        ruta_intermedia=lambda archivo: ruta_lote(claves[archivo]),
+        previos={archivo: manifiesto[clave] for archivo, clave in claves.items()
+                 if archivo not in pendientes and clave in manifiesto},
+        hashes={archivo: entrada["hashes"][clave] for archivo, clave in claves.items()},
+        carpeta_maestro=CARPETA_MAESTRO_LOTES
+    )
+    for r in resumen:
+        manifiesto[claves[r["archivo"]]] = {
+            "hash": entrada["hashes"][claves[r["archivo"]]],
+            "filas_brutas": r["filas_brutas"],
+            "filas_limpias": r["filas_limpias"],
+            "precios": r["precios"],
+        }
+
+    # Tablas completas (sin las de precios, que quedan por partes en CARPETA_TABLAS_LOTES) y partes a cargar
+    tablas = {nombre: df for nombre, df in normalizador.tablas().items() if nombre not in TABLAS_PRECIOS}
+    nuevas = normalizador.tablas([normalizador.archivos[archivo]["parte"] for archivo in entrada["archivos"]
+                                  if archivo in pendientes])
+    return {
+        "maestro": None,
+        "tablas": tablas,
+        "tablas_nuevas": {nombre: df for nombre, df in nuevas.items() if nombre not in TABLAS_PRECIOS},
+        "partes_precios": {nombre: nuevas[nombre] for nombre in TABLAS_PRECIOS if nombre in nuevas},
+        "manifiesto": manifiesto,
+    }
+
+
+def etapa_persistencia(formato="parquet", particionar_fecha=False):
+    """Guarda el DataFrame limpio y las tablas normalizadas en el formato indicado."""
+    def etapa(entrada):
+        if entrada["maestro"] is not None:
+            print(f"\n[OK] Guardando DataFrame limpio ({formato})...")
+            guardar_df(entrada["maestro"], RUTA_MAESTRO + EXTENSIONES_ALMACEN[formato], formato,
+                       particionar_por="checked_at" if particionar_fecha else None)
+
+        # 6. Guardar tablas individualmente
+        print("\n[OK] Guardando tablas por separado...")
+        guardar_tablas(entrada["tablas"], CARPETA_LIMPIO, formato)
+        return entrada
+    return etapa
+
+
+def etapa_carga_bd(config_db, precios_intervalos=False, metodo="copy", hilos=1, cache_claves=True,
+                   filas_por_trozo=None):
+    """Inserta en PostgreSQL las filas nuevas y registra los archivos procesados en el manifiesto."""
+    def etapa(entrada):
+        tablas_nuevas = {nombre: df.copy() for nombre, df in entrada["tablas_nuevas"].items()}
+        partes = entrada.get("partes_precios")
+
+        # 7. Ver resumen de registros antes de insertar
+        print("\n[INFO] Registros por tabla a insertar:")
+        for tabla, df_tabla in tablas_nuevas.items():
+            print(f"  - {tabla}: {len(df_tabla)} registros (total acumulado: {len(entrada['tablas'][tabla])})")
+        for tabla, rutas in (partes or {}).items():
+            print(f"  - {tabla}: {len(rutas)} partes (una por archivo bruto)")
+
+        # 8. Carga en PostgreSQL (solo las filas nuevas)
+        if partes:
+            # Por lotes: las dimensiones con la primera parte y después los precios parte a parte
+            for i, rutas in enumerate(zip(*partes.values())):
+                tablas_parte = {nombre: df if i == 0 else df.iloc[:0] for nombre, df in tablas_nuevas.items()}
+                tablas_parte.update({nombre: pd.read_pickle(ruta) for nombre, ruta in zip(partes, rutas)})
+                cargar_en_postgres(tablas_parte, config_db, precios_intervalos, metodo, hilos, cache_claves,
+                                   filas_por_trozo)
+        elif tablas_nuevas:
+            cargar_en_postgres(tablas_nuevas, config_db, precios_intervalos, metodo, hilos, cache_claves,
+                               filas_por_trozo)
+
+        # 9. Registrar los archivos procesados una vez cargados
+        ahora = datetime.now().isoformat(timespec="seconds")
+        manifiesto = {
+            clave: {**datos, "procesado_en": datos.get("procesado_en", ahora)}
+            for clave, datos in entrada["manifiesto"].items()
+        }
+        guardar_manifiesto(manifiesto, RUTA_MANIFIESTO)
+        return entrada
+    return etapa
+
+
+def main():
+    args = parse_args()
+    if args.instrumentar:
+        # El informe se escribe al terminar el proceso, también si termina antes o con error
+        activar_instrumentacion(args.instrumentar, perfil=args.perfil, memoria_python=args.memoria_python)
+
+    # 1. Cargar configuración
+    print("[INFO] Cargando configuración de entorno (.env)...")
+    load_dotenv()
+    config_db = {
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+    }
+    formato_raw = os.getenv("ITUNES_FORMATO_RAW", "csv")
+    directorio_raw = "data/data_raw/parquet" if formato_raw == "parquet" else "data/data_raw"
+    print("[INFO] Configuración cargada correctamente.")
+
+    metodo_carga = "upsert" if args.upsert else "copy"
+
+    if args.migrar:
+        conn = conectar_postgres(**config_db)
+        aplicar_migraciones(conn)
+        print(estado_migraciones(conn).to_string(index=False))
+        # Una migración puede dejar precios en la cola de los resúmenes del EDA
+        actualizar_resumenes(conn)
+        conn.close()
+        return
 
+    # 2. Detectar archivos brutos nuevos o modificados desde la última ejecución
+    print("\n[OK] Comprobando archivos brutos pendientes...")
+    archivos = listar_archivos_raw(directorio_raw, formato=formato_raw)
+    manifiesto = {} if args.full_rebuild else cargar_manifiesto(RUTA_MANIFIESTO)
+    estado = clasificar_archivos_raw(archivos, manifiesto)
+    pendientes = estado["nuevos"] + estado["modificados"]
+    # Un archivo modificado o eliminado obliga a rehacer las tablas desde el DataFrame limpio
+    reconstruir_tablas = bool(args.full_rebuild or estado["modificados"] or estado["eliminados"])
+    print(f"[INFO] Archivos: {len(archivos)} | nuevos: {len(estado['nuevos'])} | "
+          f"modificados: {len(estado['modificados'])} | eliminados: {len(estado['eliminados'])}")
 
+    if not pendientes and not estado["eliminados"]:
+        print("\n[OK] No hay datos brutos nuevos. Nada que procesar.")
+        return
 
+    if args.por_lotes:
+        etapas = [
+            ("por_lotes", etapa_por_lotes),
+            ("persistencia", etapa_persistencia(args.formato_almacen, args.particionar_fecha)),
+            ("carga_bd", etapa_carga_bd(config_db, args.precios_intervalos, metodo_carga, args.hilos_carga,
+                                        not args.sin_cache_claves, args.filas_por_trozo)),
+        ]
+        entrada = {
+            "archivos": archivos,
+            "pendientes": pendientes,
+            "formato": formato_raw,
+            "hashes": estado["hashes"],
+            "eliminados": estado["eliminados"],
+            "manifiesto": manifiesto,
+            "reconstruir_tablas": reconstruir_tablas,
+        }
+        ejecutar_pipeline(etapas, entrada, CARPETA_CHECKPOINTS, args.checkpoint)
+        print("\n[OK] Proceso ETL completado con éxito.")
+        return
 
+    etapas = [
+        ("extraccion", etapa_extraccion),
+        ("limpieza", etapa_limpieza),
+        ("normalizacion", etapa_normalizacion(args.motor)),
+        ("persistencia", etapa_persistencia(args.formato_almacen, args.particionar_fecha)),
+        ("carga_bd", etapa_carga_bd(config_db, args.precios_intervalos, metodo_carga, args.hilos_carga,
+                                        not args.sin_cache_claves, args.filas_por_trozo)),
+    ]
+    entrada = {
+        "pendientes": pendientes,
+        "formato": formato_raw,
+        "hashes": estado["hashes"],
+        "eliminados": estado["eliminados"],
+        "manifiesto": manifiesto,
+        "reconstruir_tablas": reconstruir_tablas,
+        "full_rebuild": args.full_rebuild,
+        "categoricas": args.categoricas,
+    }
+    ejecutar_pipeline(etapas, entrada, CARPETA_CHECKPOINTS, args.checkpoint)
+    print("\n[OK] Proceso ETL completado con éxito.")
 
 
- 
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,26 @@
 import pandas as pd
 
-def cargar_dataset(ruta_pkl: str) -> pd.DataFrame:
+from src.ETL.file_utils import leer_df
+from src.instrumentacion import medir
+
+@medir
+def cargar_dataset(ruta_pkl: str, columnas: list = None, filtros=None) -> pd.DataFrame:
     """
-    Carga un dataset desde un archivo .pkl y retorna un DataFrame.
+    Carga un dataset desde un archivo .pkl, .parquet (archivo o carpeta particionada) o .arrow
+    y retorna un DataFrame.
     
     Parámetros:
-    - ruta_pkl: Ruta al archivo pickle (.pkl)
+    - ruta_pkl: Ruta al archivo (el formato se deduce de la extensión)
+    - columnas: Columnas a cargar. Con Parquet y Arrow solo se leen esas columnas del disco
+    - filtros: Filtros de filas aplicados durante la lectura (ver `leer_df`)
 
     Retorna:
     - DataFrame cargado
     """
-    df = pd.read_pickle(ruta_pkl)
+    df = leer_df(ruta_pkl, columnas, filtros)
     return df
 
+@medir
 def resumen_dataset(df: pd.DataFrame, mostrar: bool = True) -> pd.Series:
     """
     Muestra un resumen básico del dataset: dimensiones, tipos de datos y % de nulos.
@@ -32,6 +40,7 @@ def resumen_dataset(df: pd.DataFrame, mostrar: bool = True) -> pd.Series:
     nulos = df.isnull().mean().sort_values(ascending=False) * 100
     return nulos[nulos > 0]
 
+@medir
 def contar_variables_por_tipo(df: pd.DataFrame, mostrar: bool = True) -> tuple:
     """
     Cuenta y clasifica las variables del DataFrame en numéricas y categóricas.
@@ -53,6 +62,7 @@ def contar_variables_por_tipo(df: pd.DataFrame, mostrar: bool = True) -> tuple:
     return num_vars, cat_vars
 
  
+@medir
 def estadisticas_descriptivas(df: pd.DataFrame) -> dict:
     """
     Calcula estadísticas descriptivas para variables numéricas y categóricas.
@@ -67,7 +77,7 @@ def estadisticas_descriptivas(df: pd.DataFrame) -> dict:
     """
     resumen = {
         'numericas': df.describe().T,
-        'categoricas': df.describe(include='object').T
+        'categoricas': df.describe(include=['object', 'category']).T
     }
     return resumen
 
@@ -75,6 +85,7 @@ def estadisticas_descriptivas(df: pd.DataFrame) -> dict:
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+@medir
 def visualizar_variables_numericas(df: pd.DataFrame, columnas: list = None, guardar: bool = False, carpeta: str = None) -> None:
     """
     Genera histogramas y boxplots para cada variable numérica del DataFrame.
@@ -109,6 +120,7 @@ def visualizar_variables_numericas(df: pd.DataFrame, columnas: list = None, guar
 
 
  
+@medir
 def graficar_matriz_correlacion(df: pd.DataFrame, metodo: str = 'pearson', guardar: bool = False, ruta: str = None) -> None:
     """
     Muestra una matriz de correlación para variables numéricas con un mapa de calor.
@@ -132,6 +144,7 @@ def graficar_matriz_correlacion(df: pd.DataFrame, metodo: str = 'pearson', guard
     plt.show()
 
  
+@medir
 def scatter_precio_vs_duracion(df: pd.DataFrame, guardar: bool = False, ruta: str = None) -> None:
     """
     Genera un scatter plot entre precio de la canción y su duración.
@@ -153,6 +166,7 @@ def scatter_precio_vs_duracion(df: pd.DataFrame, guardar: bool = False, ruta: st
 
 
  
+@medir
 def graficar_categoricas_baja_cardinalidad(df: pd.DataFrame, max_valores: int = 10, guardar: bool = False, carpeta: str = None) -> None:
     """
     Genera gráficos de barras para variables categóricas con baja cardinalidad.
@@ -163,7 +177,7 @@ def graficar_categoricas_baja_cardinalidad(df: pd.DataFrame, max_valores: int =
     - guardar: Si True, guarda cada gráfico como archivo PNG
     - carpeta: Ruta de la carpeta donde guardar los archivos
     """
-    cat_cols = df.select_dtypes(include='object').nunique()
+    cat_cols = df.select_dtypes(include=['object', 'category']).nunique()
     low_card = cat_cols[cat_cols <= max_valores].index.tolist()
 
     for col in low_card:
@@ -177,6 +191,7 @@ def graficar_categoricas_baja_cardinalidad(df: pd.DataFrame, max_valores: int =
         plt.show()
 
 
+@medir
 def resumen_outliers(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calcula el número y porcentaje de outliers por columna numérica usando la regla del IQR.
@@ -205,6 +220,7 @@ def resumen_outliers(df: pd.DataFrame) -> pd.DataFrame:
 
     return pd.DataFrame(outlier_summary).sort_values(by='outliers (%)', ascending=False)
 
+@medir
 def histograma_precio(df: pd.DataFrame, columna: str = 'trackPrice', guardar: bool = False, ruta: str = None) -> None:
     """
     Muestra un histograma de la columna de precio especificada y permite guardarlo.
@@ -232,6 +248,7 @@ from sklearn.linear_model import LinearRegression
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+@medir
 def graficar_residuos_lineales(df: pd.DataFrame,
                                 variable_independiente: str = 'trackTimeMillis',
                                 variable_dependiente: str = 'trackPrice',
@@ -271,6 +288,7 @@ def graficar_residuos_lineales(df: pd.DataFrame,
     plt.show()
 
 
+@medir
 def histograma_precio_albumes(df: pd.DataFrame, columna: str = 'collectionPrice', guardar: bool = False, ruta: str = None) -> None:
     """
     Muestra un histograma de precios de álbumes y permite guardar el gráfico.
@@ -298,6 +316,7 @@ from sklearn.linear_model import LinearRegression
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+@medir
 def graficar_residuos_lineales_album(df: pd.DataFrame,
                                      variable_independiente: str = 'trackTimeMillis',
                                      variable_dependiente: str = 'collectionPrice',
@@ -337,6 +356,7 @@ def graficar_residuos_lineales_album(df: pd.DataFrame,
     plt.show()
 
 
+@medir
 def graficar_precio_medio_por_genero(genre_price: pd.Series, guardar: bool = False, ruta: str = None) -> None:
     """
     Grafica el precio medio por género musical.
@@ -359,6 +379,7 @@ def graficar_precio_medio_por_genero(genre_price: pd.Series, guardar: bool = Fal
     plt.show()
 
 
+@medir
 def graficar_precio_y_duracion_por_explicitud(explicit_stats_df: pd.DataFrame, guardar: bool = False, ruta: str = None) -> None:
     """
     Grafica el precio y duración media por tipo de explicitud.
@@ -387,6 +408,7 @@ def graficar_precio_y_duracion_por_explicitud(explicit_stats_df: pd.DataFrame, g
     plt.show()
 
 
+@medir
 def graficar_precio_medio_por_artista(top_artists_df: pd.DataFrame, guardar: bool = False, ruta: str = None) -> None:
     """
     Grafica el precio medio por artista (Top 10).
@@ -409,6 +431,7 @@ def graficar_precio_medio_por_artista(top_artists_df: pd.DataFrame, guardar: boo
     plt.show()
 
 
+@medir
 def graficar_generos_canciones_largas(generos_10min: pd.Series, top_n: int = 10, guardar: bool = False, ruta: str = None) -> None:
     """
     Grafica los géneros más comunes entre canciones de más de 10 minutos.
@@ -434,6 +457,7 @@ def graficar_generos_canciones_largas(generos_10min: pd.Series, top_n: int = 10,
     plt.show()
 
 
+@medir
 def obtener_colecciones_outliers(df: pd.DataFrame, columna: str = 'collectionPrice', top_n: int = 20) -> pd.DataFrame:
     """
     Identifica colecciones con precios outliers y devuelve las más caras.
@@ -455,7 +479,7 @@ def obtener_colecciones_outliers(df: pd.DataFrame, columna: str = 'collectionPri
 
     colecciones_caras = (
         outliers_precio
-        .groupby(['collectionName', 'artistName'])[columna]
+        .groupby(['collectionName', 'artistName'], observed=True)[columna]
         .mean()
         .sort_values(ascending=False)
         .head(top_n)
@@ -464,6 +488,7 @@ def obtener_colecciones_outliers(df: pd.DataFrame, columna: str = 'collectionPri
 
     return colecciones_caras
 
+@medir
 def graficar_duracion_y_precio_por_genero(df: pd.DataFrame, top_n: int = 15, guardar: bool = False, ruta: str = None) -> None:
     """
     Calcula duración y precio medio por género musical, y lo grafica.
@@ -474,7 +499,7 @@ def graficar_duracion_y_precio_por_genero(df: pd.DataFrame, top_n: int = 15, gua
     - guardar: Si True, guarda el gráfico como archivo PNG
     - ruta: Ruta completa del archivo donde guardar (incluyendo .png)
     """
-    genero_stats = df.groupby('primaryGenreName')[['trackTimeMillis', 'trackPrice']].mean()
+    genero_stats = df.groupby('primaryGenreName', observed=True)[['trackTimeMillis', 'trackPrice']].mean()
     genero_stats['duracion_minutos'] = genero_stats['trackTimeMillis'] / 60000
     genero_stats = genero_stats[['duracion_minutos', 'trackPrice']].sort_values(by='duracion_minutos', ascending=False).head(top_n)
 
@@ -497,6 +522,7 @@ def graficar_duracion_y_precio_por_genero(df: pd.DataFrame, top_n: int = 15, gua
     plt.show()
 
 
+@medir
 def graficar_precio_medio_diario(df: pd.DataFrame,
                                   columna_precio: str = 'trackPrice',
                                   columna_fecha: str = 'checked_at',
@@ -528,6 +554,7 @@ def graficar_precio_medio_diario(df: pd.DataFrame,
 
     plt.show()
      
+@medir
 def graficar_streaming_disponible(df: pd.DataFrame, guardar: bool = False, carpeta: str = None) -> None:
     """
     Genera visualizaciones sobre la disponibilidad para streaming.
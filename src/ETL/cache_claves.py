@@ -0,0 +1,179 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentacion import medir
+
+
+def _valores_canonicos(serie: pd.Series) -> pd.Series:
+    """
+    Valores de `serie` con un tipo que solo depende del contenido, como se guarda en la base:
+    números y booleanos → float64, fechas → día sin zona horaria, resto → object (nulos → None).
+    `hash_pandas_object` depende del dtype (1 en int64, Int64, float64 o category da huellas
+    distintas), así que una fila leída de la base no tendría la huella de la enviada.
+    """
+    valores = serie.astype(object).where(serie.notna(), None)
+    tipo = pd.api.types.infer_dtype(valores, skipna=True)
+    if tipo in ("boolean", "integer", "floating", "mixed-integer-float", "decimal"):
+        return valores.astype("float64")
+    if tipo in ("date", "datetime", "datetime64"):
+        return pd.to_datetime(valores, utc=True).dt.tz_localize(None).dt.normalize()
+    return valores
+
+
+def huellas_filas(df: pd.DataFrame, columnas: list) -> np.ndarray:
+    """Huella (uint64) del contenido de cada fila en las columnas indicadas (ver `_valores_canonicos`)."""
+    canonico = pd.DataFrame({columna: _valores_canonicos(df[columna]) for columna in columnas}, index=df.index)
+    return pd.util.hash_pandas_object(canonico, index=False).to_numpy()
+
+
+class CacheClaves:
+    """
+    Caché local, persistente entre ejecuciones, de las filas de dimensión ya cargadas en PostgreSQL:
+    por tabla, clave natural → ID (el SERIAL en genre, la propia clave en el resto) y huella del
+    contenido enviado.
+
+    - `filtrar` descarta antes de enviarlas las filas cuya clave ya está en la caché con la misma
+      huella (con `solo_nuevas`, todas las de claves conocidas), e informa de la tasa de aciertos.
+    - `registrar_desde_bd` guarda la huella del contenido actual en la base de las claves que la
+      carga no escribió (ON CONFLICT DO NOTHING con otro contenido).
+    - `ids_genero` resuelve genre_id solo para los géneros que no están en la caché, con
+      `INSERT ... RETURNING` (y una consulta acotada a esos géneros si ya existían en la base).
+
+    La caché guarda una firma de cada tabla en la base (OID de la base y relfilenode de la tabla):
+    si la base o la tabla se recrean o se vacían con TRUNCATE, la caché de esa tabla se descarta.
+    Los DELETE sueltos no se detectan.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.tablas = pd.read_pickle(ruta) if os.path.exists(ruta) else {}
+        self.estadisticas = {}
+
+    def _firma(self, conn, tabla_sql: str) -> tuple:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT d.oid, pg_relation_filenode(%s::regclass) FROM pg_database d WHERE d.datname = current_database()",
+                (tabla_sql,)
+            )
+            return tuple(cursor.fetchone())
+
+    def validar(self, conn, tablas_sql: list) -> None:
+        """Descarta la caché de las tablas cuya firma en la base ha cambiado."""
+        for tabla_sql in tablas_sql:
+            firma = self._firma(conn, tabla_sql)
+            entrada = self.tablas.get(tabla_sql)
+            if entrada is not None and entrada["firma"] != firma:
+                print(f"[ADVERTENCIA] La tabla '{tabla_sql}' ha cambiado en la base: se descarta su caché de claves.")
+                entrada = None
+            if entrada is None:
+                entrada = {"firma": firma, "claves": pd.DataFrame({"clave": [], "id": [], "huella": np.array([], dtype="uint64")})}
+            self.tablas[tabla_sql] = entrada
+
+    def filtrar(self, df: pd.DataFrame, tabla_sql: str, columnas: list, solo_nuevas: bool = False) -> tuple:
+        """
+        Separa las filas de `df` que hay que enviar (clave nueva o contenido distinto) de las que
+        ya están en la base tal cual. Con `solo_nuevas` (cargas con ON CONFLICT DO NOTHING, que no
+        pueden cambiar una fila existente) tampoco se envían las de claves conocidas con otro
+        contenido: se cuentan como cambiadas, pero la base las ignoraría.
+
+        Retorna (filas_a_enviar, huellas_de_esas_filas).
+        """
+        huellas = huellas_filas(df, columnas)
+        cache = self.tablas[tabla_sql]["claves"]
+        previas = pd.Series(cache["huella"].to_numpy(), index=pd.Index(cache["clave"]))
+        previas = previas[~previas.index.duplicated(keep="last")]
+        conocida = previas.reindex(df[columnas[0]]).to_numpy()
+        acierto = pd.notna(conocida) & (conocida == huellas)
+        omitir = pd.notna(conocida) if solo_nuevas else acierto
+
+        filas, aciertos, omitidas = len(df), int(acierto.sum()), int(omitir.sum())
+        nuevas = int(pd.isna(conocida).sum())
+        self.estadisticas[tabla_sql] = {
+            "filas": filas, "aciertos": aciertos, "cambiadas": filas - aciertos - nuevas, "nuevas": nuevas,
+            "tasa_acierto": round(aciertos / filas, 4) if filas else None,
+        }
+        tasa = f"{aciertos / filas:.1%}" if filas else "-"
+        print(f"[INFO] Caché de claves '{tabla_sql}': {aciertos}/{filas} filas ya cargadas ({tasa} de aciertos) "
+              f"→ se omiten {omitidas}, se envían {filas - omitidas}")
+        return df[~omitir], huellas[~omitir]
+
+    def registrar(self, tabla_sql: str, claves, ids, huellas) -> None:
+        """
+        Añade (o actualiza) claves ya confirmadas en la base cuyo contenido allí es el de `huellas`:
+        solo las filas que la carga ha escrito, no las que ignoró un ON CONFLICT DO NOTHING.
+        """
+        cache = self.tablas[tabla_sql]["claves"]
+        nuevas = pd.DataFrame({"clave": list(claves), "id": list(ids), "huella": np.asarray(huellas, dtype="uint64")})
+        self.tablas[tabla_sql]["claves"] = (
+            pd.concat([cache, nuevas], ignore_index=True)
+            .drop_duplicates(subset=["clave"], keep="last")
+            .reset_index(drop=True)
+        )
+
+    def registrar_desde_bd(self, conn, tabla_sql: str, columnas: list, claves) -> None:
+        """
+        Registra `claves` con la huella de su contenido actual en la base (la primera de
+        `columnas` es la clave), para las filas que la carga envió pero no escribió.
+        """
+        claves = [int(clave) for clave in pd.unique(pd.Series(claves).dropna())]
+        if not claves:
+            return
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(columnas)} FROM {tabla_sql} WHERE {columnas[0]} = ANY(%s)", (claves,))
+            actuales = pd.DataFrame(cursor.fetchall(), columns=columnas)
+        conn.commit()
+        self.registrar(tabla_sql, actuales[columnas[0]], actuales[columnas[0]], huellas_filas(actuales, columnas))
+
+    @medir
+    def ids_genero(self, generos: pd.Series, conn) -> pd.Series:
+        """
+        Devuelve genre_id (Int64) para cada género de `generos`. Solo los géneros que faltan en la
+        caché van a la base: se insertan con `INSERT ... ON CONFLICT DO NOTHING RETURNING` y, los
+        que ya existían, se leen con una consulta limitada a ellos.
+        """
+        cache = self.tablas["genre"]["claves"]
+        conocidos = set(cache["clave"])
+        faltan = [g for g in pd.unique(generos.dropna()) if g not in conocidos]
+        if faltan:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO genre (primarygenrename)
+                    SELECT unnest(%s::text[])
+                    ON CONFLICT (primarygenrename) DO NOTHING
+                    RETURNING primarygenrename, genre_id
+                    """,
+                    (faltan,)
+                )
+                encontrados = dict(cursor.fetchall())
+                existentes = [g for g in faltan if g not in encontrados]
+                if existentes:
+                    cursor.execute(
+                        "SELECT primarygenrename, genre_id FROM genre WHERE primarygenrename = ANY(%s)",
+                        (existentes,)
+                    )
+                    encontrados.update(cursor.fetchall())
+            conn.commit()
+            claves = list(encontrados)
+            self.registrar("genre", claves, [encontrados[g] for g in claves], huellas_filas(pd.DataFrame({"g": claves}), ["g"]))
+            cache = self.tablas["genre"]["claves"]
+
+        aciertos = len(pd.unique(generos.dropna())) - len(faltan)
+        self.estadisticas["genre"] = {
+            "filas": aciertos + len(faltan), "aciertos": aciertos, "cambiadas": 0, "nuevas": len(faltan),
+            "tasa_acierto": round(aciertos / (aciertos + len(faltan)), 4) if aciertos + len(faltan) else None,
+        }
+        print(f"[INFO] Caché de claves 'genre': {aciertos} géneros en caché, {len(faltan)} consultados en la base")
+        return generos.map(dict(zip(cache["clave"], cache["id"]))).astype("Int64")
+
+    def resumen(self) -> pd.DataFrame:
+        """Filas, aciertos, cambiadas, nuevas y tasa de aciertos por tabla en esta ejecución."""
+        return pd.DataFrame.from_dict(self.estadisticas, orient="index")
+
+    def guardar(self) -> None:
+        """Guarda la caché de forma atómica (archivo temporal + rename)."""
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        pd.to_pickle(self.tablas, f"{self.ruta}.tmp")
+        os.replace(f"{self.ruta}.tmp", self.ruta)
@@ -0,0 +1,174 @@
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from psycopg2.pool import ThreadedConnectionPool
+
+from src.ETL.file_utils import ruta_proyecto
+from src.ETL.load import insertar_dataframe
+from src.instrumentacion import medir
+
+RUTA_ESQUEMA_SQL = ruta_proyecto("documentacion/itunes_database.sql")
+
+_PATRON_TABLA = re.compile(r"CREATE TABLE IF NOT EXISTS\s+(\w+)\s*\((.*?)\n\);", re.IGNORECASE | re.DOTALL)
+_PATRON_REFERENCIA = re.compile(r"REFERENCES\s+(\w+)\s*\(", re.IGNORECASE)
+
+
+def grafo_dependencias(ruta_sql=RUTA_ESQUEMA_SQL) -> dict:
+    """
+    Lee las claves foráneas del script de creación de la base y devuelve, por tabla (en
+    minúsculas, como las crea PostgreSQL), el conjunto de tablas a las que referencia.
+    """
+    with open(ruta_sql, "r", encoding="utf-8") as f:
+        sql = f.read()
+    grafo = {}
+    for tabla, cuerpo in _PATRON_TABLA.findall(sql):
+        referencias = {ref.lower() for ref in _PATRON_REFERENCIA.findall(cuerpo)}
+        grafo[tabla.lower()] = referencias - {tabla.lower()}
+    return grafo
+
+
+def dividir_por_clave(df: pd.DataFrame, clave: str, filas_por_trozo: int) -> list:
+    """
+    Divide un DataFrame en trozos de unas `filas_por_trozo` filas por rangos de `clave`: todas las
+    filas de una misma clave caen en el mismo trozo (los duplicados se resuelven igual que sin
+    dividir) y dentro de cada trozo se conserva el orden original.
+    """
+    if len(df) <= filas_por_trozo:
+        return [df]
+    claves = df[clave].to_numpy(dtype="float64", na_value=np.nan)
+    unicas = np.unique(claves[~np.isnan(claves)])
+    n_trozos = min(int(np.ceil(len(df) / filas_por_trozo)), len(unicas))
+    limites = unicas[np.linspace(0, len(unicas), n_trozos, endpoint=False).astype(int)]
+    # Los nulos (searchsorted los sitúa al final) van al último trozo
+    trozo = np.searchsorted(limites, claves, side="right") - 1
+    return [parte for _, parte in df.groupby(trozo, sort=True)]
+
+
+def _cargar_trozo(pool, df, tabla_sql, columnas, metodo, con_claves=False):
+    conn = pool.getconn()
+    try:
+        inicio = time.perf_counter()
+        escritas = [] if con_claves else None
+        resumen = insertar_dataframe(df, tabla_sql, columnas, conn, metodo=metodo, claves_escritas=escritas)
+        return time.perf_counter() - inicio, resumen, escritas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+@medir
+def cargar_tablas_en_paralelo(tablas: dict, esquema_columnas: dict, config_db: dict, hilos: int = 4,
+                              filas_por_trozo: int = 50_000, metodo: str = "copy",
+                              grafo: dict = None, claves_escritas: dict = None) -> pd.DataFrame:
+    """
+    Carga varias tablas en PostgreSQL con varios hilos y un pool de conexiones, respetando el
+    orden de las claves foráneas.
+
+    - El orden sale del grafo de dependencias de `documentacion/itunes_database.sql`: una tabla
+      empieza a cargarse en cuanto terminan todas las tablas (de las que se cargan) a las que referencia,
+      así que las independientes (p. ej. album_prices y track) se cargan a la vez.
+    - Las tablas grandes se dividen en rangos de su primera columna (`dividir_por_clave`) que
+      se cargan en paralelo, cada uno en su propia transacción (`insertar_dataframe`).
+    - Si falla un trozo, el resto de trozos sigue; las tablas que dependen de una tabla con
+      fallos no se cargan (quedan como "omitido").
+
+    En las tablas de precios los IDs SERIAL se asignan en el orden en que terminan los trozos.
+
+    Parámetros:
+    -----------
+    tablas : dict
+        nombre_tabla -> DataFrame.
+    esquema_columnas : dict
+        nombre_tabla -> lista de columnas (la primera, la clave primaria).
+    config_db : dict
+        Parámetros de conexión (ver `conectar_postgres`).
+    hilos : int
+        Hilos y conexiones simultáneas.
+    filas_por_trozo : int
+        Tamaño aproximado de cada trozo.
+    metodo : str
+        Método de `insertar_dataframe`.
+    grafo : dict, opcional
+        Dependencias tabla -> tablas referenciadas. Por defecto, `grafo_dependencias()`.
+    claves_escritas : dict, opcional
+        nombre_tabla -> lista a la que se añaden las claves de las filas escritas por los trozos
+        confirmados (ver `enviar_dataframe`).
+
+    Retorna:
+    --------
+    pandas.DataFrame
+        Una fila por tabla y trozo: filas, estado ("ok", "error" u "omitido"), error y tiempo.
+    """
+    grafo = grafo_dependencias() if grafo is None else grafo
+    trozos = {
+        nombre: dividir_por_clave(df, esquema_columnas[nombre][0], filas_por_trozo)
+        for nombre, df in tablas.items()
+    }
+    dependencias = {nombre: grafo.get(nombre, set()) & set(tablas) for nombre in tablas}
+
+    informe = []
+    pendientes = set(tablas)
+    completadas, fallidas = set(), set()
+    restantes = {nombre: len(partes) for nombre, partes in trozos.items()}
+    futuros = {}
+
+    pool = ThreadedConnectionPool(1, hilos, **config_db)
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            while pendientes or futuros:
+                # Lanzar las tablas cuyas dependencias ya están cargadas; omitir las que dependen de fallos
+                cambios = True
+                while cambios:
+                    cambios = False
+                    for nombre in sorted(pendientes):
+                        if dependencias[nombre] & fallidas:
+                            pendientes.discard(nombre)
+                            origen = ", ".join(sorted(dependencias[nombre] & fallidas))
+                            fallidas.add(nombre)
+                            cambios = True
+                            informe.extend({"tabla": nombre, "trozo": i, "filas": len(parte), "estado": "omitido",
+                                            "error": f"Depende de tablas con errores: {origen}", "tiempo_s": None}
+                                           for i, parte in enumerate(trozos[nombre]))
+                            print(f"[ADVERTENCIA] '{nombre}' no se carga: depende de {origen}")
+                        elif dependencias[nombre] <= completadas:
+                            pendientes.discard(nombre)
+                            print(f"Insertando datos en tabla '{nombre}' ({len(trozos[nombre])} trozos)...")
+                            for i, parte in enumerate(trozos[nombre]):
+                                futuro = ejecutor.submit(_cargar_trozo, pool, parte, nombre, esquema_columnas[nombre], metodo,
+                                                         claves_escritas is not None and nombre in claves_escritas)
+                                futuros[futuro] = (nombre, i, len(parte))
+                if not futuros:
+                    if pendientes:
+                        raise ValueError(f"Dependencias circulares entre las tablas: {sorted(pendientes)}")
+                    break
+
+                hechos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    nombre, i, filas = futuros.pop(futuro)
+                    registro = {"tabla": nombre, "trozo": i, "filas": filas}
+                    try:
+                        tiempo, resumen, escritas = futuro.result()
+                        if escritas is not None:
+                            claves_escritas[nombre].extend(escritas)
+                        registro.update({"estado": "ok", "error": None, "tiempo_s": round(tiempo, 3), **(resumen or {})})
+                    except Exception as e:
+                        fallidas.add(nombre)
+                        registro.update({"estado": "error", "error": f"{type(e).__name__}: " + " | ".join(str(e).strip().splitlines()), "tiempo_s": None})
+                        print(f"[ERROR] '{nombre}', trozo {i} ({filas} filas): {registro['error']}")
+                    informe.append(registro)
+                    restantes[nombre] -= 1
+                    if restantes[nombre] == 0 and nombre not in fallidas:
+                        completadas.add(nombre)
+    finally:
+        pool.closeall()
+
+    informe = pd.DataFrame(informe).sort_values(["tabla", "trozo"], ignore_index=True)
+    resumen = informe.groupby("tabla")["estado"].value_counts().unstack(fill_value=0)
+    print("[INFO] Carga en paralelo (trozos por estado):")
+    print(resumen.to_string())
+    return informe
@@ -0,0 +1,251 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from src.ETL.load import enviar_dataframe
+from src.instrumentacion import medir
+
+# Errores de contenido de las filas (CHECK, NOT NULL, clave foránea, tipos...): se aíslan y van a
+# cuarentena. El resto (conexión caída, etc.) interrumpe la carga, que se reanuda desde el checkpoint.
+ERRORES_DE_FILA = (psycopg2.IntegrityError, psycopg2.DataError)
+
+
+def huella_tabla(df: pd.DataFrame, columnas: list, filas_por_bloque: int = 100_000) -> str:
+    """
+    Huella del contenido de la tabla, independiente del orden de las filas (suma de las huellas
+    por fila), calculada por bloques para no duplicar la tabla en memoria.
+    """
+    total = np.uint64(0)
+    for inicio in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[inicio:inicio + filas_por_bloque][columnas]
+        with np.errstate(over="ignore"):
+            total += pd.util.hash_pandas_object(bloque, index=False).to_numpy().sum(dtype=np.uint64)
+    return f"{len(df)}-{int(total):016x}"
+
+
+def trozos_por_clave(df: pd.DataFrame, clave: str, filas_por_trozo: int):
+    """
+    Recorre el DataFrame en trozos de unas `filas_por_trozo` filas en orden creciente de `clave`
+    (orden estable: las filas de una misma clave conservan su orden y nunca se reparten entre dos
+    trozos). Genera (clave_desde, clave_hasta, trozo); solo se materializa un trozo cada vez.
+    """
+    claves = df[clave].to_numpy(dtype="float64", na_value=np.nan)
+    orden = np.argsort(claves, kind="stable")
+    ordenadas = claves[orden]
+    validas = int((~np.isnan(ordenadas)).sum())
+
+    inicio = 0
+    while inicio < validas:
+        fin = min(inicio + filas_por_trozo, validas)
+        # Ampliar el trozo hasta el final de la última clave
+        fin = int(np.searchsorted(ordenadas[:validas], ordenadas[fin - 1], side="right"))
+        yield int(ordenadas[inicio]), int(ordenadas[fin - 1]), df.iloc[orden[inicio:fin]]
+        inicio = fin
+
+
+def firma_tabla(cursor, tabla_sql: str) -> str:
+    """
+    Identidad física de la tabla de destino: OID de la base y archivos (relfilenode) de la tabla
+    o de sus particiones. Cambia si la tabla se vacía con TRUNCATE, se borra y se vuelve a crear
+    o se restaura en otra base, aunque el checkpoint siga ahí.
+    """
+    cursor.execute(
+        """
+        SELECT (SELECT oid FROM pg_database WHERE datname = current_database())::text || ':' ||
+               coalesce(string_agg(pg_relation_filenode(relid)::text, ',' ORDER BY relid), '')
+        FROM pg_partition_tree(%s::regclass)
+        WHERE isleaf
+        """,
+        (tabla_sql,)
+    )
+    return cursor.fetchone()[0]
+
+
+def _leer_checkpoint(cursor, tabla_sql: str):
+    cursor.execute(
+        "SELECT huella, firma, clave_hasta, filas_cargadas, filas_rechazadas, trozos, completada "
+        "FROM etl_checkpoint_carga WHERE tabla = %s",
+        (tabla_sql,)
+    )
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    return dict(zip(["huella", "firma", "clave_hasta", "filas_cargadas", "filas_rechazadas", "trozos", "completada"], fila))
+
+
+def _guardar_checkpoint(cursor, tabla_sql: str, huella: str, firma: str, clave_desde: int, clave_hasta: int,
+                        cargadas: int, rechazadas: int, trozos: int, completada: bool = False) -> None:
+    cursor.execute(
+        """
+        INSERT INTO etl_checkpoint_carga
+            (tabla, huella, firma, clave_desde, clave_hasta, filas_cargadas, filas_rechazadas, trozos, completada,
+             actualizado_en)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, now())
+        ON CONFLICT (tabla) DO UPDATE SET
+            huella = EXCLUDED.huella, firma = EXCLUDED.firma,
+            clave_desde = EXCLUDED.clave_desde, clave_hasta = EXCLUDED.clave_hasta,
+            filas_cargadas = EXCLUDED.filas_cargadas, filas_rechazadas = EXCLUDED.filas_rechazadas,
+            trozos = EXCLUDED.trozos, completada = EXCLUDED.completada, actualizado_en = now()
+        """,
+        (tabla_sql, huella, firma, clave_desde, clave_hasta, cargadas, rechazadas, trozos, completada)
+    )
+
+
+def _enviar_aislando_errores(df, tabla_sql, columnas, cursor, metodo, rechazos, nivel=0, claves_escritas=None) -> None:
+    """
+    Envía `df` dentro de un SAVEPOINT. Si alguna fila viola una restricción, se deshace solo ese
+    envío y se reintenta por mitades hasta aislar las filas que fallan, que se añaden a `rechazos`
+    con el mensaje de error de PostgreSQL. Las claves de las filas escritas (ver `enviar_dataframe`)
+    se añaden a `claves_escritas` solo si su envío no se deshace.
+    """
+    punto = f"trozo_{nivel}"
+    escritas = [] if claves_escritas is not None else None
+    cursor.execute(f"SAVEPOINT {punto}")
+    try:
+        enviar_dataframe(df, tabla_sql, columnas, cursor, metodo, claves_escritas=escritas)
+        if escritas is not None:
+            claves_escritas.extend(escritas)
+    except ERRORES_DE_FILA as e:
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {punto}")
+        if len(df) == 1:
+            rechazos.append(df[columnas].assign(motivo=" | ".join(str(e).strip().splitlines())))
+        else:
+            mitad = len(df) // 2
+            _enviar_aislando_errores(df.iloc[:mitad], tabla_sql, columnas, cursor, metodo, rechazos, nivel + 1,
+                                     claves_escritas)
+            _enviar_aislando_errores(df.iloc[mitad:], tabla_sql, columnas, cursor, metodo, rechazos, nivel + 1,
+                                     claves_escritas)
+    cursor.execute(f"RELEASE SAVEPOINT {punto}")
+
+
+def _a_cuarentena(rechazadas: pd.DataFrame, ruta: str) -> None:
+    """Añade las filas rechazadas (con su motivo y la fecha) al CSV de cuarentena de la tabla."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    rechazadas = rechazadas.assign(rechazado_en=datetime.now().isoformat(timespec="seconds"))
+    rechazadas.to_csv(ruta, mode="a", index=False, header=not os.path.exists(ruta))
+
+
+@medir
+def cargar_tabla_reanudable(df: pd.DataFrame, tabla_sql: str, columnas: list, conn, metodo: str = "copy",
+                            filas_por_trozo: int = 50_000, carpeta_cuarentena: str = "cuarentena",
+                            claves_escritas: list = None) -> dict:
+    """
+    Carga una tabla en transacciones acotadas que se pueden reanudar, en lugar de una sola
+    transacción para toda la tabla.
+
+    - Las filas se envían por rangos de la clave (primera columna de `columnas`), de menor a mayor,
+      con `filas_por_trozo` filas aproximadamente (`trozos_por_clave`); cada trozo se confirma con su
+      propio commit. La memoria usada no crece con el tamaño de la tabla: solo se copia un trozo cada vez.
+    - En la misma transacción que cada trozo se guarda el checkpoint de la tabla (último rango de
+      claves confirmado) en `etl_checkpoint_carga`, que crea la migración 6 (ver `aplicar_migraciones`).
+      Si la carga se interrumpe (conexión caída, error inesperado), al repetirla con los mismos datos
+      (misma huella) continúa desde la clave siguiente. Al terminar, el checkpoint queda como
+      completado: repetir la carga con los mismos datos no hace nada. El checkpoint guarda también la
+      firma de la tabla de destino (`firma_tabla`): si la tabla se ha vaciado o recreado desde
+      entonces, no se reanuda ni se omite, se empieza de cero.
+    - Las filas que violan una restricción (p. ej. un precio negativo o una clave foránea inexistente)
+      se aíslan con SAVEPOINTs y se añaden a `<carpeta_cuarentena>/<tabla>.csv` con el motivo, sin
+      detener la carga. Las filas con la clave nula van directamente a cuarentena.
+
+    En las tablas de precios los IDs SERIAL se asignan en el orden de la clave.
+
+    Parámetros:
+    -----------
+    df : pandas.DataFrame
+        Filas a cargar (clave numérica).
+    tabla_sql : str
+        Tabla de destino.
+    columnas : list
+        Columnas a cargar (la primera, la clave por la que se divide).
+    conn : psycopg2.connection
+        Conexión activa a la base de datos.
+    metodo : str
+        Método de `insertar_dataframe` ("copy", "upsert" o "executemany").
+    filas_por_trozo : int
+        Filas por transacción (aproximadas: una clave no se reparte entre dos trozos).
+    carpeta_cuarentena : str
+        Carpeta de los CSV de filas rechazadas.
+    claves_escritas : list, opcional
+        Lista a la que se añaden, tras el commit de cada trozo, las claves de sus filas escritas
+        (ver `enviar_dataframe`). No incluye las de trozos confirmados en ejecuciones anteriores.
+
+    Retorna:
+    --------
+    dict
+        Filas, filas cargadas y rechazadas, trozos confirmados, clave desde la que se reanudó (o None)
+        e índices (del DataFrame) de las filas rechazadas.
+    """
+    clave = columnas[0]
+    ruta_cuarentena = os.path.join(carpeta_cuarentena, f"{tabla_sql}.csv")
+    # Un upsert escribe filas que una carga con ON CONFLICT DO NOTHING ignoró: no comparten checkpoint
+    huella = huella_tabla(df, columnas) + ("-upsert" if metodo == "upsert" else "")
+
+    with conn.cursor() as cursor:
+        checkpoint = _leer_checkpoint(cursor, tabla_sql)
+        firma = firma_tabla(cursor, tabla_sql)
+    conn.commit()
+
+    cargadas = rechazadas = trozos = 0
+    reanudada_desde = None
+    indices_rechazados = []
+    if checkpoint is not None and checkpoint["huella"] == huella and checkpoint["firma"] != firma:
+        print(f"[ADVERTENCIA] '{tabla_sql}': la tabla ha cambiado (vaciada o recreada) desde el último "
+              f"checkpoint; se empieza de cero.")
+        checkpoint = None
+    if checkpoint is not None and checkpoint["huella"] == huella and checkpoint["completada"]:
+        print(f"[INFO] '{tabla_sql}': ya se cargó completa con estos mismos datos; se omite.")
+        return {"filas": checkpoint["filas_cargadas"] + checkpoint["filas_rechazadas"],
+                "cargadas": checkpoint["filas_cargadas"], "rechazadas": checkpoint["filas_rechazadas"],
+                "trozos": checkpoint["trozos"], "reanudada_desde": checkpoint["clave_hasta"],
+                "indices_rechazados": pd.Index([])}
+    if checkpoint is not None and checkpoint["huella"] == huella:
+        reanudada_desde = checkpoint["clave_hasta"]
+        cargadas, rechazadas, trozos = checkpoint["filas_cargadas"], checkpoint["filas_rechazadas"], checkpoint["trozos"]
+        print(f"[INFO] '{tabla_sql}': se reanuda la carga tras la clave {reanudada_desde} "
+              f"({cargadas} filas y {trozos} trozos ya confirmados)")
+        df = df[df[clave] > reanudada_desde]
+    elif checkpoint is not None and not checkpoint["completada"]:
+        print(f"[ADVERTENCIA] '{tabla_sql}': hay una carga anterior sin terminar con otros datos; se empieza de cero.")
+
+    nulas = df[df[clave].isna()]
+    if not nulas.empty:
+        _a_cuarentena(nulas[columnas].assign(motivo=f"{clave} nulo"), ruta_cuarentena)
+        rechazadas += len(nulas)
+        indices_rechazados.append(nulas.index)
+
+    desde = hasta = reanudada_desde
+    for desde, hasta, trozo in trozos_por_clave(df, clave, filas_por_trozo):
+        rechazos = []
+        escritas = [] if claves_escritas is not None else None
+        with conn.cursor() as cursor:
+            _enviar_aislando_errores(trozo, tabla_sql, columnas, cursor, metodo, rechazos, claves_escritas=escritas)
+            rechazadas_trozo = sum(len(r) for r in rechazos)
+            _guardar_checkpoint(cursor, tabla_sql, huella, firma, desde, hasta, cargadas + len(trozo) - rechazadas_trozo,
+                                rechazadas + rechazadas_trozo, trozos + 1)
+        if rechazos:
+            # Antes del commit: si el commit falla, el trozo se repite y sus rechazos se vuelven a anotar
+            _a_cuarentena(pd.concat(rechazos), ruta_cuarentena)
+            indices_rechazados.extend(r.index for r in rechazos)
+        conn.commit()
+        if escritas is not None:
+            claves_escritas.extend(escritas)
+
+        cargadas += len(trozo) - rechazadas_trozo
+        rechazadas += rechazadas_trozo
+        trozos += 1
+        print(f"  - {tabla_sql}, trozo {trozos}: claves {desde}–{hasta}, {len(trozo)} filas"
+              + (f" ({rechazadas_trozo} a cuarentena)" if rechazadas_trozo else ""))
+
+    with conn.cursor() as cursor:
+        _guardar_checkpoint(cursor, tabla_sql, huella, firma, desde, hasta, cargadas, rechazadas, trozos, completada=True)
+    conn.commit()
+
+    if rechazadas:
+        print(f"[ADVERTENCIA] '{tabla_sql}': {rechazadas} filas rechazadas, guardadas en {ruta_cuarentena}")
+    print(f"[OK] '{tabla_sql}': {cargadas} filas cargadas en {trozos} trozos")
+    indices = indices_rechazados[0].append(indices_rechazados[1:]) if indices_rechazados else pd.Index([])
+    return {"filas": cargadas + rechazadas, "cargadas": cargadas, "rechazadas": rechazadas, "trozos": trozos,
+            "reanudada_desde": reanudada_desde, "indices_rechazados": indices}
@@ -0,0 +1,117 @@
+import pandas as pd
+import pyarrow as pa
+
+# Esquema fijo de los campos que devuelve la API de iTunes para `media=music`
+# (ver documentacion/descripcion_columnas_itunes.md).
+# Tipos lógicos: "str", "int", "float", "bool", "fecha".
+COLUMNAS_ITUNES = {
+    "wrapperType": "str",
+    "kind": "str",
+    "artistId": "int",
+    "collectionId": "int",
+    "trackId": "int",
+    "artistName": "str",
+    "collectionName": "str",
+    "trackName": "str",
+    "collectionCensoredName": "str",
+    "trackCensoredName": "str",
+    "artistViewUrl": "str",
+    "collectionViewUrl": "str",
+    "trackViewUrl": "str",
+    "previewUrl": "str",
+    "artworkUrl30": "str",
+    "artworkUrl60": "str",
+    "artworkUrl100": "str",
+    "collectionPrice": "float",
+    "trackPrice": "float",
+    "releaseDate": "str",
+    "collectionExplicitness": "str",
+    "trackExplicitness": "str",
+    "discCount": "int",
+    "discNumber": "int",
+    "trackCount": "int",
+    "trackNumber": "int",
+    "trackTimeMillis": "int",
+    "country": "str",
+    "currency": "str",
+    "primaryGenreName": "str",
+    "isStreamable": "bool",
+    "collectionArtistId": "int",
+    "collectionArtistName": "str",
+    "collectionArtistViewUrl": "str",
+    "contentAdvisoryRating": "str",
+    "checked_at": "fecha",
+}
+
+# Columnas que usa el pipeline ETL (limpieza, normalización y EDA); las portadas no se usan nunca
+COLUMNAS_ETL = [columna for columna in COLUMNAS_ITUNES if not columna.startswith("artworkUrl")]
+
+TIPOS_ARROW = {
+    "str": pa.string(),
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "bool": pa.bool_(),
+    "fecha": pa.date32(),
+}
+
+# Tipos pandas nullables para los tipos Arrow que, con nulos, pandas convertiría a float/object
+MAPEO_TIPOS_PANDAS = {
+    pa.int64(): pd.Int64Dtype(),
+    pa.bool_(): pd.BooleanDtype(),
+}
+
+
+def esquema_arrow(columnas: dict = COLUMNAS_ITUNES) -> pa.Schema:
+    """
+    Construye el esquema Arrow equivalente a un diccionario {columna: tipo lógico}.
+
+    Args:
+        columnas (dict): Diccionario {nombre_columna: tipo lógico}.
+
+    Returns:
+        pa.Schema: Esquema con todas las columnas anulables.
+    """
+    return pa.schema([pa.field(nombre, TIPOS_ARROW[tipo]) for nombre, tipo in columnas.items()])
+
+
+# Esquema de limpieza del DataFrame maestro: {columna: reglas} que aplica `coercionar_tipos`.
+# - "tipo": "int" (trunca decimales → Int64), "bool" ("true"/"false" → boolean), "fecha" (sin hora
+#   → datetime64), "precio" (numérico, -1 → NaN) o "texto".
+# - "obligatoria": se eliminan las filas con nulo en la columna.
+# - "relleno": valor con el que se rellenan los nulos de texto.
+# - "imputar": "media" rellena los precios nulos con la media de todo el histórico (ver `imputar_precios`).
+ESQUEMA_LIMPIEZA = {
+    "checked_at": {"tipo": "fecha"},
+    "releaseDate": {"tipo": "fecha", "obligatoria": True},
+    "collectionId": {"tipo": "int", "obligatoria": True},
+    "collectionArtistId": {"tipo": "int"},
+    "trackTimeMillis": {"tipo": "int", "obligatoria": True},
+    "discCount": {"tipo": "int"},
+    "discNumber": {"tipo": "int"},
+    "trackCount": {"tipo": "int"},
+    "trackNumber": {"tipo": "int"},
+    "isStreamable": {"tipo": "bool", "obligatoria": True},
+    "artistName": {"tipo": "texto", "relleno": "Sin identificar"},
+    "collectionName": {"tipo": "texto", "relleno": "Sin identificar"},
+    "trackName": {"tipo": "texto", "relleno": "Sin identificar"},
+    "collectionCensoredName": {"tipo": "texto", "relleno": "Sin identificar"},
+    "trackCensoredName": {"tipo": "texto", "relleno": "Sin identificar"},
+    "artistViewUrl": {"tipo": "texto", "relleno": "Sin identificar"},
+    "collectionViewUrl": {"tipo": "texto", "relleno": "Sin identificar"},
+    "trackViewUrl": {"tipo": "texto", "relleno": "Sin identificar"},
+    "previewUrl": {"tipo": "texto", "relleno": "Sin identificar"},
+    "collectionArtistName": {"tipo": "texto", "relleno": "Sin identificar"},
+    "collectionArtistViewUrl": {"tipo": "texto", "relleno": "Sin identificar"},
+    "contentAdvisoryRating": {"tipo": "texto", "relleno": "Sin identificar"},
+    "trackPrice": {"tipo": "precio", "imputar": "media"},
+    "collectionPrice": {"tipo": "precio", "imputar": "media"},
+}
+
+# Marcadores de nulo que se aplican a todas las columnas de texto antes de validar el esquema
+VALORES_NULOS = ["", " ", "nan", "NaN"]
+
+# Marcadores de nulo al leer los CSV brutos: los mismos que usa por defecto `pd.read_csv`
+VALORES_NULOS_CSV = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+from datetime import date, datetime
+
+import pandas as pd
+
+from src.ETL.planificador import actualizar_estadisticas_termino
+
+ESQUEMA_SQL = """
+CREATE TABLE IF NOT EXISTS termino (
+    termino       TEXT PRIMARY KEY,
+    usado         INTEGER NOT NULL DEFAULT 0,
+    ejecuciones   INTEGER NOT NULL DEFAULT 0,
+    ultima_fecha  TEXT,
+    filas         INTEGER,
+    nuevos        INTEGER,
+    nuevos_medios REAL,
+    saturado      INTEGER NOT NULL DEFAULT 0,
+    max_track_id  INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS ejecucion (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    termino      TEXT NOT NULL,
+    fecha        TEXT NOT NULL,
+    registrado   TEXT NOT NULL,
+    estado_http  INTEGER,
+    ok           INTEGER NOT NULL,
+    filas        INTEGER,
+    nuevos       INTEGER,
+    latencia_s   REAL,
+    reintentos   INTEGER,
+    bytes        INTEGER,
+    max_track_id INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_ejecucion_termino_fecha ON ejecucion (termino, fecha);
+CREATE INDEX IF NOT EXISTS idx_ejecucion_fecha ON ejecucion (fecha);
+
+CREATE TABLE IF NOT EXISTS track_conocido (
+    track_id INTEGER PRIMARY KEY
+);
+"""
+
+
+class EstadoScrape:
+    """
+    Almacén SQLite del estado del scraping (sustituye a notebooks/terminos_usados.txt).
+
+    - `termino`: una fila por término con sus últimas estadísticas (clave primaria → búsqueda O(1)).
+    - `ejecucion`: historial de cada petición (fecha, estado HTTP, filas, nuevos, latencia,
+      reintentos, bytes y máximo trackId visto).
+    - `track_conocido`: trackIds ya vistos, para medir cuántos resultados son nuevos.
+
+    Cada petición se registra en una única transacción.
+    """
+
+    def __init__(self, ruta: str):
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self.ruta = ruta
+        self.conn = sqlite3.connect(ruta)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(ESQUEMA_SQL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self) -> None:
+        self.conn.close()
+
+    def importar_log_texto(self, ruta_log: str) -> int:
+        """
+        Importa los términos de un log de texto antiguo (uno por línea) como usados.
+        Devuelve el número de términos importados; los ya presentes no se modifican.
+        """
+        if not os.path.exists(ruta_log):
+            return 0
+        with open(ruta_log, "r") as f:
+            terminos = {line.strip() for line in f if line.strip()}
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO termino (termino, usado) VALUES (?, 1)",
+                [(termino,) for termino in sorted(terminos)]
+            )
+        return cursor.rowcount
+
+    def terminos_usados(self) -> set:
+        """Términos que alguna vez devolvieron resultados."""
+        return {fila[0] for fila in self.conn.execute("SELECT termino FROM termino WHERE usado = 1")}
+
+    def estadisticas_terminos(self) -> dict:
+        """
+        Devuelve {término: estadísticas} de los términos con al menos una ejecución correcta,
+        en el formato que espera `planificar_terminos`.
+        """
+        filas = self.conn.execute(
+            "SELECT termino, ejecuciones, ultima_fecha, filas, nuevos, nuevos_medios, saturado, max_track_id "
+            "FROM termino WHERE ejecuciones > 0"
+        )
+        return {
+            termino: {
+                "ejecuciones": ejecuciones,
+                "ultima_fecha": ultima_fecha,
+                "filas": n_filas,
+                "nuevos": nuevos,
+                "nuevos_medios": nuevos_medios,
+                "saturado": bool(saturado),
+                "max_track_id": max_track_id,
+            }
+            for termino, ejecuciones, ultima_fecha, n_filas, nuevos, nuevos_medios, saturado, max_track_id in filas
+        }
+
+    def registrar_ejecucion(self, metrica: dict, df: pd.DataFrame, limite: int = 200, hoy: date = None) -> int:
+        """
+        Registra una petición de forma atómica y devuelve cuántos trackIds nuevos aportó.
+
+        Siempre añade una fila al historial; solo las peticiones correctas (`metrica["ok"]`)
+        actualizan las estadísticas del término y el conjunto de trackIds conocidos.
+        """
+        hoy = hoy or date.today()
+        termino = metrica["termino"]
+        ids = []
+        if metrica["ok"] and "trackId" in df:
+            ids = pd.to_numeric(df["trackId"], errors="coerce").dropna().astype("int64").unique().tolist()
+        max_track_id = max(ids) if ids else None
+
+        with self.conn:
+            nuevos = 0
+            if ids:
+                antes = self.conn.total_changes
+                self.conn.executemany("INSERT OR IGNORE INTO track_conocido (track_id) VALUES (?)",
+                                      [(i,) for i in ids])
+                nuevos = self.conn.total_changes - antes
+
+            self.conn.execute(
+                "INSERT INTO ejecucion (termino, fecha, registrado, estado_http, ok, filas, nuevos, "
+                "latencia_s, reintentos, bytes, max_track_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (termino, hoy.isoformat(), datetime.now().isoformat(timespec="seconds"),
+                 metrica.get("estado_http"), int(bool(metrica["ok"])), len(df), nuevos,
+                 metrica.get("latencia_s"), metrica.get("reintentos"), metrica.get("bytes"), max_track_id)
+            )
+
+            if metrica["ok"]:
+                previas = self.conn.execute(
+                    "SELECT ejecuciones, nuevos_medios, max_track_id, usado FROM termino WHERE termino = ?",
+                    (termino,)
+                ).fetchone()
+                stats_previas = None
+                if previas is not None and previas[0] > 0:
+                    stats_previas = {"ejecuciones": previas[0], "nuevos_medios": previas[1]}
+                stats = actualizar_estadisticas_termino(stats_previas, len(df), nuevos, limite, hoy=hoy)
+                if previas is not None and previas[2] is not None:
+                    max_track_id = max(previas[2], max_track_id or previas[2])
+                usado = int(len(df) > 0 or (previas is not None and bool(previas[3])))
+                self.conn.execute(
+                    "INSERT INTO termino (termino, usado, ejecuciones, ultima_fecha, filas, nuevos, "
+                    "nuevos_medios, saturado, max_track_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(termino) DO UPDATE SET usado = excluded.usado, "
+                    "ejecuciones = excluded.ejecuciones, ultima_fecha = excluded.ultima_fecha, "
+                    "filas = excluded.filas, nuevos = excluded.nuevos, nuevos_medios = excluded.nuevos_medios, "
+                    "saturado = excluded.saturado, max_track_id = excluded.max_track_id",
+                    (termino, usado, stats["ejecuciones"], stats["ultima_fecha"], stats["filas"],
+                     stats["nuevos"], stats["nuevos_medios"], int(stats["saturado"]), max_track_id)
+                )
+        return nuevos
+
+    def historial(self, termino: str = None, desde: str = None) -> pd.DataFrame:
+        """
+        Devuelve el historial de ejecuciones como DataFrame, opcionalmente filtrado
+        por término y/o fecha mínima (AAAA-MM-DD).
+        """
+        condiciones, params = [], []
+        if termino is not None:
+            condiciones.append("termino = ?")
+            params.append(termino)
+        if desde is not None:
+            condiciones.append("fecha >= ?")
+            params.append(desde)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return pd.read_sql_query(f"SELECT * FROM ejecucion {where} ORDER BY id", self.conn, params=params)
+
+    def resumen_por_fecha(self) -> pd.DataFrame:
+        """Peticiones, fallos, filas, nuevos y latencia media por día de scraping."""
+        return pd.read_sql_query(
+            "SELECT fecha, COUNT(*) AS peticiones, SUM(1 - ok) AS fallidas, SUM(filas) AS filas, "
+            "SUM(nuevos) AS nuevos, ROUND(1.0 * SUM(nuevos) / COUNT(*), 2) AS nuevos_por_peticion, "
+            "ROUND(AVG(latencia_s), 3) AS latencia_media_s, SUM(reintentos) AS reintentos, "
+            "SUM(bytes) AS bytes FROM ejecucion GROUP BY fecha ORDER BY fecha",
+            self.conn
+        )
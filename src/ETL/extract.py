@@ -1,28 +1,69 @@
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import pyarrow as pa
 import time
 import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime, UTC
-from itertools import product
+from email.utils import parsedate_to_datetime
+from itertools import chain, product
 from dotenv import load_dotenv
 
+from src.ETL.esquema import COLUMNAS_ITUNES, MAPEO_TIPOS_PANDAS, esquema_arrow
+from src.ETL.file_utils import EscritorParquetStreaming
+from src.ETL.estado_scrape import EstadoScrape
+from src.ETL.planificador import planificar_terminos
+
 def configurar_extraccion():
     load_dotenv()
     API_URL = os.getenv("ITUNES_API_URL")
 
     CARPETA_DATOS = "../data/data_raw"
-    LOG_TERMS = "notebooks/terminos_usados.txt"
+    CARPETA_PARQUET = "../data/data_raw/parquet"
+    LOG_TERMS = "notebooks/terminos_usados.txt"  # log antiguo; se importa una vez en RUTA_ESTADO
+    RUTA_ESTADO = "notebooks/estado_scrape.sqlite"
     os.makedirs(CARPETA_DATOS, exist_ok=True)
 
     TERMINOS = [''.join(p) for p in product('abcdefghijklmnopqrstuvwxyz', repeat=2)]
     TERMINOS_POR_DIA = 97
 
+    # Planificador de términos: "fijo" (recorre TERMINOS una sola vez en orden) o, opcionalmente,
+    # "adaptativo" (expande prefijos saturados y prioriza por filas nuevas esperadas)
+    PLANIFICADOR = os.getenv("ITUNES_PLANIFICADOR", "fijo")
+    LONGITUD_MAXIMA_TERMINO = 3
+    LIMITE_RESULTADOS = 200
+
+    # Modo de extracción: "secuencial" (bucle con sleep) u, opcionalmente, "concurrente"
+    # (pool de hilos + token bucket)
+    MODO_EXTRACCION = os.getenv("ITUNES_MODO_EXTRACCION", "secuencial")
+    PETICIONES_EN_VUELO = int(os.getenv("ITUNES_PETICIONES_EN_VUELO", "4"))
+    PETICIONES_POR_MINUTO = float(os.getenv("ITUNES_PETICIONES_POR_MINUTO", "60"))
+    # Formato de los datos brutos: "csv" (un fichero por día al final) o "parquet" (streaming por término)
+    FORMATO_RAW = os.getenv("ITUNES_FORMATO_RAW", "csv")
+    MAX_REINTENTOS = int(os.getenv("ITUNES_MAX_REINTENTOS", "3"))
+    RONDAS_REINTENTO = int(os.getenv("ITUNES_RONDAS_REINTENTO", "2"))
+
     return {
         "API_URL": API_URL,
         "CARPETA_DATOS": CARPETA_DATOS,
+        "CARPETA_PARQUET": CARPETA_PARQUET,
+        "FORMATO_RAW": FORMATO_RAW,
         "LOG_TERMS": LOG_TERMS,
+        "RUTA_ESTADO": RUTA_ESTADO,
         "TERMINOS": TERMINOS,
-        "TERMINOS_POR_DIA": TERMINOS_POR_DIA
+        "TERMINOS_POR_DIA": TERMINOS_POR_DIA,
+        "PLANIFICADOR": PLANIFICADOR,
+        "LONGITUD_MAXIMA_TERMINO": LONGITUD_MAXIMA_TERMINO,
+        "LIMITE_RESULTADOS": LIMITE_RESULTADOS,
+        "MODO_EXTRACCION": MODO_EXTRACCION,
+        "PETICIONES_EN_VUELO": PETICIONES_EN_VUELO,
+        "PETICIONES_POR_MINUTO": PETICIONES_POR_MINUTO,
+        "MAX_REINTENTOS": MAX_REINTENTOS,
+        "RONDAS_REINTENTO": RONDAS_REINTENTO
     }
 
 def cargar_terminos_usados(log_path):
@@ -35,52 +76,331 @@ def guardar_termino_usado(term, log_path):
     with open(log_path, "a") as f:
         f.write(f"{term}\n")
 
-def buscar_itunes(term, api_url, limit=200):
+class LimitadorTokens:
+    """
+    Token bucket thread-safe que limita el número de peticiones por minuto.
+
+    El cubo se rellena de forma continua a razón de `peticiones_por_minuto / 60` tokens
+    por segundo hasta `capacidad`. Cada petición consume un token; si no hay ninguno
+    disponible, `adquirir` espera exactamente el tiempo necesario para que se genere.
+    """
+
+    def __init__(self, peticiones_por_minuto, capacidad=1):
+        if peticiones_por_minuto <= 0:
+            raise ValueError("peticiones_por_minuto debe ser mayor que 0")
+        self.tasa = peticiones_por_minuto / 60.0
+        self.capacidad = float(capacidad)
+        self.tokens = float(capacidad)
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.tasa
+            time.sleep(espera)
+
+def crear_sesion(tamano_pool=10):
+    """
+    Crea una sesión HTTP con un pool de conexiones keep-alive reutilizable entre términos
+    (y entre hilos), evitando abrir una conexión TCP+TLS nueva por petición.
+    """
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=tamano_pool, pool_maxsize=tamano_pool)
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+def _segundos_retry_after(valor):
+    """Interpreta la cabecera Retry-After (segundos o fecha HTTP). Devuelve None si no es válida."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (fecha - datetime.now(UTC)).total_seconds())
+
+def decodificar_resultados(lotes_resultados, checked_at=None, columnas=COLUMNAS_ITUNES):
+    """
+    Construye un DataFrame tipado directamente a partir de una o varias listas `results`
+    de la API, sin pasar por `pd.json_normalize`.
+
+    Los registros se convierten en columnas Arrow con el esquema fijo de `columnas`
+    (los campos desconocidos se ignoran y los ausentes quedan como nulos), así que todos
+    los términos y días producen exactamente los mismos dtypes: `Int64` para enteros,
+    `float64` para precios, `boolean` para `isStreamable` y `object` para texto.
+
+    Parámetros:
+    - lotes_resultados: lista de listas de registros (una por respuesta).
+    - checked_at: fecha de extracción; por defecto, la fecha UTC actual.
+    - columnas: esquema {columna: tipo lógico}.
+
+    Retorna:
+    - DataFrame con todas las respuestas del lote (vacío si no hay registros).
+    """
+    registros = list(chain.from_iterable(lotes_resultados))
+    if not registros:
+        return pd.DataFrame()
+
+    columnas_api = {nombre: tipo for nombre, tipo in columnas.items() if nombre != "checked_at"}
+    try:
+        tabla = pa.Table.from_pylist(registros, schema=esquema_arrow(columnas_api))
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # Un campo con un tipo inesperado no debe hacer perder el término
+        print(f"[ADVERTENCIA] Registros con tipos inesperados ({e}); se usa json_normalize")
+        df = pd.json_normalize(registros)
+    else:
+        df = tabla.to_pandas(types_mapper=MAPEO_TIPOS_PANDAS.get)
+
+    if "checked_at" in columnas:
+        df["checked_at"] = checked_at if checked_at is not None else datetime.now(UTC).date()
+    return df
+
+def buscar_itunes_con_metricas(term, api_url, limit=200, sesion=None, limitador=None,
+                               max_reintentos=3, backoff_base=1.0, backoff_max=60.0):
+    """
+    Busca un término en la API de iTunes con reintentos y devuelve (DataFrame, métrica).
+
+    - Reutiliza `sesion` (pool keep-alive); si no se indica, usa `requests` directamente.
+    - Reintenta errores de red, 429 y 5xx con backoff exponencial con jitter,
+      respetando la cabecera `Retry-After` en 429/503.
+    - Si se indica `limitador`, cada intento consume un token del token bucket.
+
+    La métrica es un dict con: termino, estado_http, ok, reintentos, latencia_s,
+    bytes y filas. `ok=False` significa que la petición falló tras agotar los reintentos
+    (a diferencia de una respuesta 200 sin resultados).
+    """
     params = {
         "term": term,
         "limit": limit,
         "country": "US",
         "media": "music"
     }
+    cliente = sesion if sesion is not None else requests
+    metrica = {"termino": term, "estado_http": None, "ok": False, "reintentos": 0,
+               "latencia_s": 0.0, "bytes": 0, "filas": 0}
+    df = pd.DataFrame()
 
-    try:
-        response = requests.get(api_url, params=params)
-        if response.status_code == 200:
-            results = response.json().get("results", [])
-            df = pd.json_normalize(results)
-            if not df.empty:
-                df["checked_at"] = datetime.now(UTC).date()
-                return df
-    except Exception as e:
-        print(f"[ERROR] Error con '{term}': {e}")
-    return pd.DataFrame()
+    for intento in range(max_reintentos + 1):
+        if limitador is not None:
+            limitador.adquirir()
+        espera = None
+        inicio = time.perf_counter()
+        try:
+            response = cliente.get(api_url, params=params, timeout=30)
+            contenido = response.content
+            metrica["bytes"] += len(contenido)
+            metrica["estado_http"] = response.status_code
+            if response.status_code == 200:
+                results = response.json().get("results", [])
+                df = decodificar_resultados([results])
+                metrica["ok"] = True
+                metrica["filas"] = len(df)
+            elif response.status_code in (429, 503):
+                espera = _segundos_retry_after(response.headers.get("Retry-After"))
+            elif response.status_code < 500:
+                # 4xx distinto de 429: reintentar no cambiará la respuesta
+                print(f"[ERROR] '{term}' devolvió HTTP {response.status_code}")
+                metrica["latencia_s"] += time.perf_counter() - inicio
+                break
+        except Exception as e:
+            print(f"[ERROR] Error con '{term}': {e}")
+        metrica["latencia_s"] += time.perf_counter() - inicio
+
+        if metrica["ok"] or intento == max_reintentos:
+            break
+        if espera is None:
+            espera = min(backoff_max, backoff_base * 2 ** intento) * random.uniform(0.5, 1.5)
+        metrica["reintentos"] += 1
+        print(f"[REINTENTO] '{term}' intento {intento + 2} en {espera:.1f}s")
+        time.sleep(espera)
+
+    return df, metrica
+
+def buscar_itunes(term, api_url, limit=200, sesion=None, metricas=None):
+    """
+    Busca un término en la API de iTunes y devuelve los resultados como DataFrame
+    (vacío si no hay resultados o si la petición falla tras los reintentos).
+
+    Si se pasa una lista en `metricas`, se le añade la métrica de la petición.
+    """
+    df, metrica = buscar_itunes_con_metricas(term, api_url, limit, sesion=sesion)
+    if metricas is not None:
+        metricas.append(metrica)
+    return df
+
+def _registrar_resultado(termino, df, metrica, config, escritor=None, estado=None):
+    if estado is not None:
+        metrica["nuevos"] = estado.registrar_ejecucion(metrica, df, limite=config.get("LIMITE_RESULTADOS", 200))
+    if not df.empty:
+        if escritor is not None:
+            escritor.escribir(df, etiqueta=termino)
+        if estado is None:
+            guardar_termino_usado(termino, config["LOG_TERMS"])
+        print(f"[COMPLETADO] {len(df)} resultados para '{termino}'")
+    elif metrica["ok"]:
+        print(f"[ADVERTENCIA] Sin resultados para '{termino}'")
+    else:
+        print(f"[ERROR] '{termino}' falló tras {metrica['reintentos']} reintentos; vuelve a la cola")
+
+def buscar_terminos_secuencial(terminos, config, sesion=None, escritor=None, estado=None):
+    """
+    Busca cada término uno detrás de otro con una pausa fija de 1 segundo entre peticiones.
+
+    Si se indica `escritor`, cada resultado se vuelca en él según llega; si se indica
+    `estado` (EstadoScrape), cada petición se registra en él en lugar del log de texto.
+
+    Retorna (resultados, metricas): un diccionario {término: DataFrame} en el orden
+    de `terminos` y la lista de métricas por término.
+    """
+    resultados, metricas = {}, []
+    for termino in terminos:
+        print(f"[BUSCANDO] Buscando: '{termino}'")
+        df, metrica = buscar_itunes_con_metricas(
+            termino, config["API_URL"], config.get("LIMITE_RESULTADOS", 200), sesion=sesion,
+            max_reintentos=config.get("MAX_REINTENTOS", 3)
+        )
+        resultados[termino] = df
+        metricas.append(metrica)
+        _registrar_resultado(termino, df, metrica, config, escritor, estado)
+        time.sleep(1)
+    return resultados, metricas
+
+def buscar_terminos_concurrente(terminos, config, sesion=None, escritor=None, estado=None):
+    """
+    Busca los términos con un pool de hilos y un token bucket compartido.
+
+    `PETICIONES_EN_VUELO` fija cuántas peticiones pueden estar abiertas a la vez y
+    `PETICIONES_POR_MINUTO` el presupuesto de la API, en lugar de dormir a ciegas
+    entre peticiones. El registro en `estado` (o en el log de texto si no se indica) y
+    el volcado a `escritor` se hacen desde el hilo principal a medida que llegan los resultados.
+
+    Retorna (resultados, metricas): un diccionario {término: DataFrame} en el orden
+    de `terminos` y la lista de métricas por término.
+    """
+    limitador = LimitadorTokens(config["PETICIONES_POR_MINUTO"])
+
+    def tarea(termino):
+        return buscar_itunes_con_metricas(
+            termino, config["API_URL"], config.get("LIMITE_RESULTADOS", 200), sesion=sesion, limitador=limitador,
+            max_reintentos=config.get("MAX_REINTENTOS", 3)
+        )
+
+    resultados, metricas = {}, []
+    with ThreadPoolExecutor(max_workers=config["PETICIONES_EN_VUELO"]) as pool:
+        futuros = {pool.submit(tarea, termino): termino for termino in terminos}
+        for futuro in as_completed(futuros):
+            termino = futuros[futuro]
+            df, metrica = futuro.result()
+            resultados[termino] = df
+            metricas.append(metrica)
+            _registrar_resultado(termino, df, metrica, config, escritor, estado)
+
+    return {termino: resultados[termino] for termino in terminos}, metricas
+
+def resumir_metricas(metricas):
+    """
+    Convierte la lista de métricas por petición en un DataFrame e imprime un resumen
+    de latencia, reintentos y bytes recibidos.
+    """
+    df_metricas = pd.DataFrame(metricas)
+    if df_metricas.empty:
+        return df_metricas
+    print("[METRICAS] Peticiones: {} | fallidas: {} | reintentos: {} | "
+          "latencia media: {:.2f}s (p95 {:.2f}s) | recibido: {:.1f} MB".format(
+              len(df_metricas), int((~df_metricas["ok"]).sum()), int(df_metricas["reintentos"].sum()),
+              df_metricas["latencia_s"].mean(), df_metricas["latencia_s"].quantile(0.95),
+              df_metricas["bytes"].sum() / 1e6))
+    return df_metricas
+
+def abrir_estado(config):
+    """
+    Abre el almacén de estado del scraping; la primera vez importa el log de texto antiguo.
+    """
+    nuevo = not os.path.exists(config["RUTA_ESTADO"])
+    estado = EstadoScrape(config["RUTA_ESTADO"])
+    if nuevo:
+        importados = estado.importar_log_texto(config["LOG_TERMS"])
+        if importados:
+            print(f"[INFO] Importados {importados} términos de '{config['LOG_TERMS']}' a '{config['RUTA_ESTADO']}'")
+    return estado
 
 def ejecutar_scrape_diario(config):
-    print("[DEBUG] Entrando a ejecutar_scrape_diario()")
-    usados = cargar_terminos_usados(config["LOG_TERMS"])
-    pendientes = [t for t in config["TERMINOS"] if t not in usados][:config["TERMINOS_POR_DIA"]]
+    with abrir_estado(config) as estado:
+        return _ejecutar_scrape_diario(config, estado)
+
+def _ejecutar_scrape_diario(config, estado):
+    usados = estado.terminos_usados()
+    adaptativo = config.get("PLANIFICADOR", "fijo") == "adaptativo"
+
+    if adaptativo:
+        pendientes = planificar_terminos(
+            estado.estadisticas_terminos(), config["TERMINOS"], config["TERMINOS_POR_DIA"],
+            limite=config.get("LIMITE_RESULTADOS", 200),
+            longitud_maxima=config.get("LONGITUD_MAXIMA_TERMINO", 3),
+            usados=usados
+        )
+    else:
+        pendientes = [t for t in config["TERMINOS"] if t not in usados][:config["TERMINOS_POR_DIA"]]
 
     if not pendientes:
         print("[COMPLETADO] Todos los términos han sido usados.")
-        return
+        return {}
 
-    dfs = []
+    if config.get("MODO_EXTRACCION", "secuencial") == "concurrente":
+        buscar_terminos = buscar_terminos_concurrente
+    else:
+        buscar_terminos = buscar_terminos_secuencial
 
-    for termino in pendientes:
-        print(f"[DEBUG] Término: {termino}")
-        print(f"[BUSCANDO] Buscando: '{termino}'")
-        df = buscar_itunes(termino, config["API_URL"])
-        if not df.empty:
-            dfs.append(df)
-            guardar_termino_usado(termino, config["LOG_TERMS"])
-            print(f"[COMPLETADO] {len(df)} resultados para '{termino}'")
-        else:
-            print(f"[ADVERTENCIA] Sin resultados para '{termino}'")
-        time.sleep(1)
+    # En modo parquet cada término se escribe en disco en cuanto llega; el escritor se cierra
+    # (compactando lo ya descargado) aunque el scraping se interrumpa con una excepción
+    parquet = config.get("FORMATO_RAW", "csv") == "parquet"
+    resultados, metricas = {}, []
+    cola = pendientes
+    with (EscritorParquetStreaming(config["CARPETA_PARQUET"]) if parquet else nullcontext()) as escritor:
+        with crear_sesion(max(config.get("PETICIONES_EN_VUELO", 1), 1)) as sesion:
+            # Los términos que fallan tras agotar sus reintentos vuelven a la cola para otra ronda
+            for ronda in range(config.get("RONDAS_REINTENTO", 2) + 1):
+                if not cola:
+                    break
+                if ronda > 0:
+                    print(f"[REINTENTO] Ronda {ronda}: {len(cola)} términos fallidos vuelven a la cola")
+                resultados_ronda, metricas_ronda = buscar_terminos(
+                    cola, config, sesion=sesion, escritor=escritor, estado=estado
+                )
+                resultados.update(resultados_ronda)
+                metricas.extend(metricas_ronda)
+                cola = [m["termino"] for m in metricas_ronda if not m["ok"]]
+    if escritor is not None:
+        print(f"[GUARDADO] Resultados escritos en el dataset Parquet '{config['CARPETA_PARQUET']}'")
+
+    if cola:
+        print(f"[ADVERTENCIA] {len(cola)} términos siguen fallando y se reintentarán otro día: {cola}")
 
-    if dfs:
+    resumir_metricas(metricas)
+    nuevos = sum(m.get("nuevos", 0) for m in metricas)
+    print(f"[PLANIFICADOR] {nuevos} trackIds nuevos en {len(metricas)} peticiones "
+          f"({nuevos / max(len(metricas), 1):.1f} por petición)")
+    hoy = datetime.now().strftime("%Y-%m-%d")
+
+    resultados = {termino: resultados[termino] for termino in pendientes}
+    dfs = [df for df in resultados.values() if not df.empty]
+
+    if dfs and escritor is None:
         df_total = pd.concat(dfs, ignore_index=True)
-        hoy = datetime.now().strftime("%Y-%m-%d")
         archivo_salida = f"{config['CARPETA_DATOS']}/itunes_{hoy}.csv"
         df_total.to_csv(archivo_salida, index=False)
-        print(f"[GUARDADO] {len(df_total)} registros en '{archivo_salida}'")
\ No newline at end of file
+        print(f"[GUARDADO] {len(df_total)} registros en '{archivo_salida}'")
+
+    return resultados
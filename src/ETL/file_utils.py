@@ -4,40 +4,319 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
+import shutil
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.parquet as pq
+from datetime import datetime
+
+from src.ETL.esquema import COLUMNAS_ITUNES, MAPEO_TIPOS_PANDAS, TIPOS_ARROW, VALORES_NULOS_CSV, esquema_arrow
+from src.instrumentacion import medir
  
 pd.set_option('display.max_columns', None)
  
-def cargar_datos_itunes(directorio="data/data_raw", patron="itunes_*.csv"):
+def _leer_csv_itunes(ruta, columnas=None) -> pd.DataFrame:
+    """
+    Lee un CSV diario con el lector multihilo de pyarrow y tipos explícitos según
+    `COLUMNAS_ITUNES`, en lugar de dejar que pandas los infiera archivo a archivo.
+
+    El DataFrame tiene los mismos dtypes que daría `pd.read_csv` con ese archivo, para que la
+    limpieza vea exactamente lo mismo que con el lector anterior:
+    - Enteros → `int64` si la columna no tiene nulos y `float64` si los tiene (los CSV antiguos
+      guardan los enteros con nulos como "123.0"); precios → `float64`.
+    - `isStreamable` → `bool` sin nulos y `object` (True/False/NaN) con nulos.
+    - Texto (incluidas las fechas, que se limpian más adelante) → `object` con NaN como nulo y
+      los mismos marcadores de nulo que `pd.read_csv` (`VALORES_NULOS_CSV`); las columnas de
+      texto sin ningún valor → `float64`, como las deja pandas.
+
+    Diferencia intencionada: una columna de texto cuyos valores parecen todos números (p. ej.
+    un `trackName` "1989" en todas las filas de un archivo) se mantiene como texto, mientras
+    que `pd.read_csv` la convertiría a número. La paridad se prueba en `tests/test_file_utils.py`.
+    - Si `columnas` se indica, solo se leen esas columnas (las que existan en el archivo).
+    - Si un archivo tiene valores que no encajan con su tipo (p. ej. texto en una columna
+      numérica), se relee ese archivo con `pd.read_csv` para no perder datos.
+    """
+    cabecera = pd.read_csv(ruta, nrows=0).columns
+    usar = [c for c in cabecera if columnas is None or c in columnas]
+
+    tipos = {"int": pa.float64(), "float": pa.float64(), "bool": pa.bool_(), "str": pa.string(), "fecha": pa.string()}
+    column_types = {c: tipos[COLUMNAS_ITUNES[c]] if c in COLUMNAS_ITUNES else pa.string() for c in usar}
+    opciones = pa_csv.ConvertOptions(
+        column_types=column_types,
+        include_columns=usar,
+        null_values=VALORES_NULOS_CSV,
+        strings_can_be_null=True,
+        true_values=["True", "true", "TRUE"],
+        false_values=["False", "false", "FALSE"],
+    )
+
+    try:
+        tabla = pa_csv.read_csv(ruta, convert_options=opciones)
+    except (pa.ArrowInvalid, ValueError) as e:
+        print(f"[ADVERTENCIA] '{Path(ruta).name}' no encaja con el esquema ({e}); se leerá sin tipos")
+        return pd.read_csv(ruta, usecols=usar)[usar]
+
+    # Conversión en Arrow (sin pasar por objetos Python): enteros sin decimales → int64
+    for i, c in enumerate(tabla.column_names):
+        if COLUMNAS_ITUNES.get(c) == "int":
+            try:
+                tabla = tabla.set_column(i, c, tabla.column(i).cast(pa.int64()))
+            except pa.ArrowInvalid:
+                pass
+
+    df = tabla.to_pandas(types_mapper=MAPEO_TIPOS_PANDAS.get)
+    for c in usar:
+        serie, nulos = df[c], tabla.column(c).null_count
+        if isinstance(serie.dtype, pd.Int64Dtype):
+            df[c] = serie.to_numpy("float64", na_value=np.nan) if nulos else serie.to_numpy("int64")
+        elif isinstance(serie.dtype, pd.BooleanDtype):
+            df[c] = serie.to_numpy(object, na_value=np.nan) if nulos else serie.to_numpy("bool")
+        elif COLUMNAS_ITUNES.get(c, "str") in ("str", "fecha") and nulos == len(df) and len(df):
+            df[c] = np.full(len(df), np.nan)
+        elif COLUMNAS_ITUNES.get(c, "str") in ("str", "fecha") and nulos:
+            valores = serie.to_numpy(copy=True)
+            valores[tabla.column(c).is_null().to_numpy(zero_copy_only=False)] = np.nan
+            df[c] = valores
+    return df
+
+
+def ruta_proyecto(directorio) -> Path:
+    """Resuelve una ruta relativa a la raíz del proyecto (3 niveles desde src/ETL/)."""
+    return Path(__file__).resolve().parents[2] / directorio
+
+
+def listar_archivos_raw(directorio="data/data_raw", patron="itunes_*.csv", formato="csv") -> list:
+    """
+    Lista, ordenados por nombre, los archivos de datos brutos: los CSV diarios que cumplen
+    `patron` o, con `formato="parquet"`, los ficheros compactados del dataset Parquet
+    (`checked_at=AAAA-MM-DD/itunes_AAAA-MM-DD_<hora>.parquet`, uno por cierre del escritor, o
+    `itunes-<hora>.parquet` en los datasets escritos antes), nunca las partes pendientes de compactar.
+    """
+    ruta = ruta_proyecto(directorio)
+    if formato == "parquet":
+        return sorted(ruta.glob("*/itunes*.parquet"))
+    return sorted(ruta.glob(patron))
+
+
+@medir
+def cargar_datos_itunes(directorio="data/data_raw", patron="itunes_*.csv", formato="csv",
+                        columnas=None, max_workers=None, archivos=None):
     """
     Carga y concatena archivos CSV de iTunes desde un directorio dado que cumplan con un patrón.
 
+    Los archivos se leen en paralelo (un hilo por archivo, con el lector CSV de pyarrow)
+    con un mapa de tipos explícito y se concatenan en orden de nombre, por lo que el resultado
+    no depende del orden en que terminen las lecturas.
+
     Parámetros:
     - directorio (str): Ruta relativa al directorio donde se encuentran los archivos CSV.
     - patron (str): Patrón de búsqueda de archivos CSV.
+    - formato (str): "csv" (por defecto) o "parquet". Con "parquet", `directorio` es el
+      dataset escrito por `EscritorParquetStreaming` y `patron` se ignora.
+    - columnas (list): Columnas a cargar (p. ej. `COLUMNAS_ETL`). Por defecto, todas.
+    - max_workers (int): Hilos de lectura. Por defecto, el de `ThreadPoolExecutor`.
+    - archivos (list): Lista explícita de archivos a cargar (p. ej. solo los nuevos desde la
+      última ejecución). Si se indica, `directorio` y `patron` se ignoran.
 
     Retorna:
     - DataFrame concatenado con todos los registros encontrados.
     """
     # Calcula la ruta base absoluta (3 niveles desde src/ETL/)
-    base_path = Path(__file__).resolve().parents[2]  # sube desde src/ETL/ hasta raíz del proyecto
-    ruta = base_path / directorio
+    ruta = ruta_proyecto(directorio)
 
-    archivos_csv = sorted(ruta.glob(patron))
+    if formato == "parquet":
+        return cargar_dataset_parquet(ruta if archivos is None else archivos, columnas)
+
+    archivos_csv = sorted(ruta.glob(patron)) if archivos is None else list(archivos)
     if not archivos_csv:
         print(f"[ADVERTENCIA] No se encontraron archivos en: {ruta} con patrón: {patron}")
         return pd.DataFrame()
 
-    df = pd.concat([pd.read_csv(f) for f in archivos_csv], ignore_index=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        dfs = list(pool.map(lambda f: _leer_csv_itunes(f, columnas), archivos_csv))
+
+    df = pd.concat(dfs, ignore_index=True)
     print(f"Total de registros cargados: {df.shape[0]}")
     return df
  
-def guardar_df(df: pd.DataFrame, ruta: str = "../data/data_limpio/itunes.pkl") -> None:
-    os.makedirs(os.path.dirname(ruta), exist_ok=True)
-    df.to_pickle(ruta)
-     
+# Formatos de almacenamiento del DataFrame limpio y las tablas normalizadas
+EXTENSIONES_ALMACEN = {"parquet": ".parquet", "arrow": ".arrow", "pickle": ".pkl"}
+FORMATOS_POR_EXTENSION = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".pkl": "pickle"}
+
+
+def _formato_de_ruta(ruta) -> str:
+    extension = Path(ruta).suffix.lower()
+    if extension not in FORMATOS_POR_EXTENSION:
+        raise ValueError(f"No se reconoce el formato de '{ruta}' (extensiones: {', '.join(FORMATOS_POR_EXTENSION)})")
+    return FORMATOS_POR_EXTENSION[extension]
+
+
+def _sustituir(temporal: str, ruta: str) -> None:
+    """Renombra `temporal` a `ruta`, que puede existir como archivo o como carpeta particionada."""
+    if os.path.isdir(ruta):
+        shutil.rmtree(ruta)
+    os.replace(temporal, ruta)
+
+
+def _escribir_tabla_arrow(tabla: pa.Table, ruta: str, formato: str, compresion: str, filas_por_grupo: int) -> None:
+    """Escribe una tabla Arrow de forma atómica (archivo temporal + rename)."""
+    temporal = os.path.join(os.path.dirname(ruta) or ".", f".{os.path.basename(ruta)}.tmp")
+    if formato == "parquet":
+        pq.write_table(tabla, temporal, compression=compresion, row_group_size=filas_por_grupo,
+                       write_statistics=True)
+    else:
+        # Arrow IPC sin comprimir: se lee con memory map sin copiar ni decodificar
+        with pa.OSFile(temporal, "wb") as f, pa.ipc.new_file(f, tabla.schema) as writer:
+            writer.write_table(tabla, max_chunksize=filas_por_grupo)
+    _sustituir(temporal, ruta)
+
+
+@medir
+def guardar_df(df: pd.DataFrame, ruta: str = "../data/data_limpio/itunes.pkl", formato: str = None,
+               particionar_por: str = None, compresion: str = "zstd", filas_por_grupo: int = 128_000) -> None:
+    """
+    Guarda un DataFrame en Parquet, Arrow IPC o pickle (formato heredado).
+
+    Parquet y Arrow guardan los tipos de pandas (Int64, boolean, category, fechas) y el índice en
+    los metadatos del esquema, así que `leer_df` devuelve el mismo DataFrame. Parquet se escribe
+    con compresión `compresion` y estadísticas (mínimo, máximo, nulos) en cada row group de
+    `filas_por_grupo` filas, que permiten saltar los row groups que no cumplen un filtro.
+
+    Parámetros:
+    - formato (str): "parquet", "arrow" o "pickle". Por defecto, según la extensión de `ruta`.
+    - particionar_por (str): Solo Parquet. Columna de fecha (p. ej. "checked_at") por la que
+      dividir el archivo: `ruta` pasa a ser una carpeta con una subcarpeta `<columna>=AAAA-MM-DD`
+      por día (la columna se conserva dentro de los ficheros, con su tipo). Se escribe en una
+      carpeta temporal que sustituye a la anterior al terminar.
+    """
+    formato = formato or _formato_de_ruta(ruta)
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    if formato == "pickle":
+        df.to_pickle(ruta)
+        return
+
+    tabla = pa.Table.from_pandas(df, preserve_index=True)
+    if particionar_por is None:
+        _escribir_tabla_arrow(tabla, ruta, formato, compresion, filas_por_grupo)
+        return
+    if formato != "parquet":
+        raise ValueError("Solo se puede particionar en formato Parquet")
+
+    fechas = pd.to_datetime(df[particionar_por], errors="coerce").dt.strftime("%Y-%m-%d").fillna("sin_fecha")
+    temporal = f"{ruta}.tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    for fecha, posiciones in fechas.groupby(fechas.to_numpy(), sort=True).indices.items():
+        particion = os.path.join(temporal, f"{particionar_por}={fecha}")
+        os.makedirs(particion)
+        _escribir_tabla_arrow(tabla.take(posiciones), os.path.join(particion, "part-0.parquet"),
+                              formato, compresion, filas_por_grupo)
+    if os.path.isfile(ruta):
+        os.remove(ruta)
+    _sustituir(temporal, ruta)
+
+
+def columnas_indice(esquema: pa.Schema) -> list:
+    """Columnas del esquema que guardan el índice de pandas (según los metadatos de pandas)."""
+    metadatos = esquema.pandas_metadata or {}
+    return [c for c in metadatos.get("index_columns", []) if isinstance(c, str)]
+
+
+@medir
+def leer_df(ruta, columnas: list = None, filtros=None, memory_map: bool = True, como_arrow: bool = False):
+    """
+    Lee un DataFrame guardado con `guardar_df` (un archivo o una carpeta particionada).
+
+    Con Parquet y Arrow solo se leen del disco las columnas pedidas (además del índice) y los
+    filtros se aplican durante la lectura: en Parquet se descartan los ficheros y row groups cuyas
+    estadísticas no cumplen el filtro sin descomprimirlos. Con `memory_map`, los archivos se abren
+    con memory map; en Arrow IPC las columnas apuntan directamente al archivo mapeado (sin copias).
+    Con pickle se lee el archivo entero y después se seleccionan columnas y filas.
+
+    Parámetros:
+    - columnas (list): Columnas a leer. Por defecto, todas.
+    - filtros: Expresión de `pyarrow.dataset` o lista de tuplas (columna, operador, valor), p. ej.
+      `[("checked_at", ">=", pd.Timestamp("2025-06-01")), ("trackPrice", ">", 0)]`. El valor
+      debe tener el tipo de la columna.
+    - como_arrow (bool): Devuelve la `pyarrow.Table` sin convertir a pandas.
+
+    Retorna:
+    - DataFrame (o tabla Arrow) con el índice y los tipos originales. Si `ruta` es una carpeta
+      particionada, las filas se devuelven ordenadas por el índice.
+    """
+    ruta = str(ruta)
+    if isinstance(filtros, list):
+        filtros = pq.filters_to_expression(filtros)
+
+    if os.path.isdir(ruta):
+        formato = "parquet"
+    else:
+        formato = _formato_de_ruta(ruta)
+    if formato == "pickle":
+        df = pd.read_pickle(ruta)
+        if filtros is None and not como_arrow:
+            return df if columnas is None else df[columnas]
+        dataset = ds.dataset(pa.Table.from_pandas(df, preserve_index=True))
+    else:
+        sistema = pa.fs.LocalFileSystem(use_mmap=memory_map)
+        dataset = ds.dataset(ruta, format="parquet" if formato == "parquet" else "ipc",
+                             partitioning=None, filesystem=sistema)
+
+    if columnas is not None:
+        columnas = list(columnas) + [c for c in columnas_indice(dataset.schema) if c not in columnas]
+    tabla = dataset.to_table(columns=columnas, filter=filtros)
+    if como_arrow:
+        return tabla
+    df = tabla.to_pandas()
+    if os.path.isdir(ruta) and pd.api.types.is_numeric_dtype(df.index):
+        df = df.sort_index(kind="stable")
+    return df
+
+
+@medir
+def guardar_tablas(tablas: dict, carpeta_salida: str, formato: str = "parquet") -> None:
+    """
+    Guarda cada DataFrame de un diccionario como `<nombre>.<extensión>` en una carpeta, con
+    `guardar_df` en el formato indicado ("parquet", "arrow" o "pickle").
+    """
+    os.makedirs(carpeta_salida, exist_ok=True)
+    for nombre, df in tablas.items():
+        guardar_df(df, os.path.join(carpeta_salida, f"{nombre.lower()}{EXTENSIONES_ALMACEN[formato]}"), formato)
+
+
+@medir
+def cargar_tablas(carpeta: str, nombres: list, columnas: dict = None) -> dict:
+    """
+    Carga las tablas guardadas con `guardar_tablas` que existan en la carpeta, en el formato en
+    que estén (si hay varios, el archivo más reciente).
+
+    Args:
+        carpeta (str): Carpeta con las tablas.
+        nombres (list): Nombres de las tablas a cargar.
+        columnas (dict): Opcional, {nombre: columnas a leer} (ver `leer_df`).
+
+    Returns:
+        dict: {nombre: DataFrame} solo con las tablas encontradas.
+    """
+    tablas = {}
+    for nombre in nombres:
+        candidatas = [os.path.join(carpeta, f"{nombre.lower()}{extension}") for extension in EXTENSIONES_ALMACEN.values()]
+        candidatas = [ruta for ruta in candidatas if os.path.exists(ruta)]
+        if candidatas:
+            ruta = max(candidatas, key=os.path.getmtime)
+            tablas[nombre] = leer_df(ruta, (columnas or {}).get(nombre))
+    return tablas
+
+
+@medir
 def guardar_tablas_en_pickle(tablas: dict, carpeta_salida: str) -> None:
     """
     Guarda cada DataFrame de un diccionario como archivo .pkl en una carpeta.
+    (Formato heredado: equivale a `guardar_tablas(tablas, carpeta_salida, "pickle")`.)
     
     Args:
         tablas (dict): Diccionario {nombre: DataFrame}.
@@ -47,4 +326,214 @@ def guardar_tablas_en_pickle(tablas: dict, carpeta_salida: str) -> None:
 
     for nombre, df in tablas.items():
         ruta = os.path.join(carpeta_salida, f"{nombre.lower()}.pkl")
-        df.to_pickle(ruta)
\ No newline at end of file
+        df.to_pickle(ruta)
+
+
+@medir
+def cargar_tablas_desde_pickle(carpeta: str, nombres: list) -> dict:
+    """
+    Carga las tablas guardadas con `guardar_tablas_en_pickle` que existan en la carpeta.
+
+    Args:
+        carpeta (str): Carpeta con los .pkl.
+        nombres (list): Nombres de las tablas a cargar.
+
+    Returns:
+        dict: {nombre: DataFrame} solo con las tablas encontradas.
+    """
+    tablas = {}
+    for nombre in nombres:
+        ruta = os.path.join(carpeta, f"{nombre.lower()}.pkl")
+        if os.path.exists(ruta):
+            tablas[nombre] = pd.read_pickle(ruta)
+    return tablas
+
+
+def calcular_hash_archivo(ruta, tamano_bloque: int = 1 << 20) -> str:
+    """Calcula el SHA-256 del contenido de un archivo leyendo por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def cargar_manifiesto(ruta: str) -> dict:
+    """
+    Carga el manifiesto de archivos brutos ya procesados por el ETL:
+    {nombre_archivo: {"hash", "filas_brutas", "filas_limpias", "procesado_en"}}.
+    """
+    if os.path.exists(ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def guardar_manifiesto(manifiesto: dict, ruta: str) -> None:
+    """Guarda el manifiesto de forma atómica (archivo temporal + rename)."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+    os.replace(temporal, ruta)
+
+
+def clave_archivo(ruta) -> str:
+    """Clave de un archivo bruto en el manifiesto: su ruta relativa a la raíz del proyecto."""
+    ruta = Path(ruta).resolve()
+    try:
+        return ruta.relative_to(ruta_proyecto("")).as_posix()
+    except ValueError:
+        return ruta.as_posix()
+
+
+def clasificar_archivos_raw(archivos: list, manifiesto: dict) -> dict:
+    """
+    Compara los archivos brutos actuales con el manifiesto.
+
+    Retorna un diccionario con:
+    - "nuevos": archivos que no figuran en el manifiesto.
+    - "modificados": archivos cuyo hash ha cambiado desde que se procesaron.
+    - "eliminados": claves del manifiesto que ya no existen.
+    - "hashes": {clave: hash} de todos los archivos actuales.
+    """
+    hashes = {clave_archivo(a): calcular_hash_archivo(a) for a in archivos}
+    nuevos = [a for a in archivos if clave_archivo(a) not in manifiesto]
+    modificados = [a for a in archivos
+                   if clave_archivo(a) in manifiesto and manifiesto[clave_archivo(a)]["hash"] != hashes[clave_archivo(a)]]
+    eliminados = sorted(set(manifiesto) - set(hashes))
+    return {"nuevos": nuevos, "modificados": modificados, "eliminados": eliminados, "hashes": hashes}
+
+
+def cargar_dataset_parquet(ruta, columnas=None) -> pd.DataFrame:
+    """
+    Lee el dataset Parquet de datos brutos (particionado por `checked_at=AAAA-MM-DD`).
+
+    La columna `checked_at` se lee del propio fichero, no del nombre de la carpeta,
+    por lo que conserva su tipo fecha. Enteros y booleanos se devuelven con tipos
+    nullables de pandas (`Int64`, `boolean`) para que los nulos no los conviertan en float.
+    Si se indica `columnas`, solo se leen esas columnas del disco. `ruta` puede ser la carpeta
+    del dataset o una lista de ficheros concretos.
+    """
+    if isinstance(ruta, (list, tuple)):
+        if not ruta:
+            return pd.DataFrame()
+        origen = [str(r) for r in ruta]
+    elif not Path(ruta).exists():
+        print(f"[ADVERTENCIA] No existe el dataset Parquet: {ruta}")
+        return pd.DataFrame()
+    else:
+        origen = str(ruta)
+
+    dataset = ds.dataset(origen, format="parquet", partitioning=None)
+    if columnas is not None:
+        columnas = [c for c in columnas if c in dataset.schema.names]
+    tabla = dataset.to_table(columns=columnas)
+    df = tabla.to_pandas(types_mapper=MAPEO_TIPOS_PANDAS.get)
+    print(f"Total de registros cargados: {df.shape[0]}")
+    return df
+
+
+def dataframe_a_tabla_arrow(df: pd.DataFrame, columnas: dict = COLUMNAS_ITUNES) -> pa.Table:
+    """
+    Convierte un DataFrame al esquema fijo {columna: tipo lógico}.
+
+    Las columnas que falten se rellenan con nulos y las que no estén en el esquema se descartan,
+    de modo que todos los términos y todos los días comparten exactamente los mismos tipos.
+    """
+    arrays = []
+    for nombre, tipo in columnas.items():
+        if nombre not in df.columns:
+            arrays.append(pa.nulls(len(df), type=TIPOS_ARROW[tipo]))
+            continue
+        serie = df[nombre]
+        if tipo == "int":
+            serie = pd.to_numeric(serie, errors="coerce").astype("Int64")
+        elif tipo == "float":
+            serie = pd.to_numeric(serie, errors="coerce").astype("float64")
+        elif tipo == "bool":
+            serie = serie.map({True: True, False: False, "true": True, "false": False,
+                               "True": True, "False": False}).astype("boolean")
+        elif tipo == "fecha":
+            serie = pd.to_datetime(serie, errors="coerce").dt.date
+        else:
+            serie = serie.where(serie.isna(), serie.astype(str))
+        arrays.append(pa.array(serie, type=TIPOS_ARROW[tipo], from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=esquema_arrow(columnas))
+
+
+class EscritorParquetStreaming:
+    """
+    Sumidero en streaming para los datos brutos del scraping.
+
+    Cada llamada a `escribir` guarda los resultados de un término como un fichero
+    `_partes/part-*.parquet` dentro de la partición `checked_at=AAAA-MM-DD` (escritura atómica
+    vía fichero temporal + rename), así que un fallo a mitad de lote no pierde los
+    términos ya descargados. Al cerrar, las partes nuevas de cada partición se compactan en un
+    fichero nuevo `itunes_AAAA-MM-DD_<hora>.parquet`, con un row group por término: los ficheros
+    de cierres anteriores del mismo día no se leen ni se reescriben (ni cambia su hash en el
+    manifiesto de la carga incremental).
+
+    Las partes quedan en una subcarpeta que empieza por "_": ni `listar_archivos_raw` ni los
+    lectores de `pyarrow.dataset` las ven, así que un día nunca se lee dos veces. Cada fichero
+    compactado guarda en sus metadatos los nombres de las partes que incluye: si el proceso se
+    interrumpe tras compactar y antes de borrarlas, el siguiente cierre las borra sin volver a
+    añadirlas. Las partes que un cierre interrumpido dejó sin compactar se compactan en el
+    siguiente cierre sobre la misma carpeta. Se puede usar como gestor de contexto (`with`) para
+    que las partes se compacten aunque el scraping termine con una excepción.
+    """
+
+    def __init__(self, carpeta: str, columnas: dict = COLUMNAS_ITUNES, compresion: str = "zstd"):
+        self.carpeta = carpeta
+        self.columnas = columnas
+        self.compresion = compresion
+        os.makedirs(carpeta, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def escribir(self, df: pd.DataFrame, etiqueta: str = "lote") -> None:
+        if df.empty:
+            return
+        tabla = dataframe_a_tabla_arrow(df, self.columnas)
+        fechas = pd.to_datetime(df["checked_at"], errors="coerce").dt.strftime("%Y-%m-%d").fillna("sin_fecha")
+        marca = datetime.now().strftime("%H%M%S%f")
+        for fecha in fechas.unique():
+            carpeta_partes = os.path.join(self.carpeta, f"checked_at={fecha}", "_partes")
+            os.makedirs(carpeta_partes, exist_ok=True)
+            ruta = os.path.join(carpeta_partes, f"part-{marca}-{etiqueta}.parquet")
+            temporal = os.path.join(carpeta_partes, f".{os.path.basename(ruta)}.tmp")
+            pq.write_table(tabla.filter(pa.array((fechas == fecha).to_numpy())), temporal,
+                           compression=self.compresion)
+            os.replace(temporal, ruta)
+
+    def cerrar(self) -> None:
+        esquema = esquema_arrow(self.columnas)
+        marca = datetime.now().strftime("%H%M%S%f")
+        for carpeta_partes in sorted(Path(self.carpeta).glob("*/_partes")):
+            particion = carpeta_partes.parent
+            fecha = particion.name.split("=", 1)[1]
+            # Partes ya incluidas en algún fichero compactado (solo se leen los metadatos del pie)
+            incluidas = set()
+            for compactado in particion.glob("itunes*.parquet"):
+                metadatos = pq.read_schema(compactado).metadata or {}
+                incluidas.update(json.loads(metadatos.get(b"partes", b"[]")))
+
+            partes = sorted(carpeta_partes.glob("part-*.parquet"))
+            nuevas = [parte for parte in partes if parte.name not in incluidas]
+            if nuevas:
+                destino = particion / f"itunes_{fecha}_{marca}.parquet"
+                esquema_destino = esquema.with_metadata(
+                    {b"partes": json.dumps([parte.name for parte in nuevas]).encode()}
+                )
+                temporal = particion / f".{destino.name}.tmp"
+                with pq.ParquetWriter(temporal, esquema_destino, compression=self.compresion) as writer:
+                    for parte in nuevas:
+                        writer.write_table(pq.read_table(parte, schema=esquema).replace_schema_metadata(esquema_destino.metadata))
+                os.replace(temporal, destino)
+            for parte in partes:
+                parte.unlink()
+            shutil.rmtree(carpeta_partes, ignore_errors=True)
@@ -1,7 +1,12 @@
+import io
+
 import pandas as pd
 import psycopg2
 from typing import List, Dict
 
+from src.ETL.transform import intervalos_precio
+from src.instrumentacion import medir
+
 
 def conectar_postgres(dbname: str, user: str, password: str, host: str = "localhost", port: str = "5432"):
     """
@@ -26,50 +31,321 @@ def conectar_postgres(dbname: str, user: str, password: str, host: str = "localh
     )
 
 
-def insertar_dataframe(df: pd.DataFrame, tabla_sql: str, columnas: List[str], conn) -> None:
+# Tablas con clave primaria natural: los registros ya existentes se ignoran (ON CONFLICT DO NOTHING)
+TABLAS_CON_CONFLICTO = ["artist", "album", "track", "genre"]
+
+
+def clave_conflicto(tabla_sql: str, columnas: List[str]):
+    """Columnas de la clave que detecta las filas ya cargadas (None en las tablas de precios, que solo añaden)."""
+    if tabla_sql in TABLAS_CON_CONFLICTO:
+        return [columnas[0]]  # Asumimos que la primera columna es la PK
+    return None
+
+
+def _sql_insercion(tabla_sql: str, columnas: List[str], origen: str) -> str:
+    """INSERT con la semántica de conflictos de cada tabla; `origen` es VALUES (...) o un SELECT."""
+    columnas_str = ", ".join(columnas)
+    clave = clave_conflicto(tabla_sql, columnas)
+    if clave:
+        # Clave única → evitar error duplicado
+        return f"""
+            INSERT INTO {tabla_sql} ({columnas_str})
+            {origen}
+            ON CONFLICT ({", ".join(clave)}) DO NOTHING
+        """
+    # Para tablas sin clave única definida
+    return f"""
+        INSERT INTO {tabla_sql} ({columnas_str})
+        {origen}
+    """
+
+
+def _copiar_csv(df: pd.DataFrame, tabla_sql: str, columnas: List[str], cursor, filas_por_bloque: int) -> None:
+    """
+    Envía el DataFrame con COPY ... FROM STDIN en bloques de CSV en memoria (nulos como \\N).
+
+    Las columnas float del DataFrame que en la tabla son enteras (p. ej. IDs con nulos leídos
+    como float64) se pasan a Int64: en CSV saldrían como "123.0", que COPY rechaza.
+    """
+    sql_copy = f"COPY {tabla_sql} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+          AND atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype)
+    """, (tabla_sql,))
+    enteras = {fila[0] for fila in cursor.fetchall()}
+    a_entero = {col: "Int64" for col in columnas if col in enteras and pd.api.types.is_float_dtype(df[col])}
+    for inicio in range(0, len(df), filas_por_bloque):
+        buffer = io.StringIO()
+        # Seleccionar columnas después de cortar: solo se copia el bloque, no toda la tabla
+        bloque = df.iloc[inicio:inicio + filas_por_bloque][columnas]
+        if a_entero:
+            bloque = bloque.astype(a_entero)
+        bloque.to_csv(buffer, index=False, header=False, na_rep="\\N")
+        buffer.seek(0)
+        cursor.copy_expert(sql_copy, buffer)
+
+
+def _tabla_temporal(df: pd.DataFrame, tabla_sql: str, columnas: List[str], cursor, filas_por_bloque: int) -> str:
+    """
+    Carga el DataFrame con COPY en una tabla temporal (sin WAL, se borra al hacer commit) con solo
+    las columnas cargadas, sin restricciones ni valores por defecto, más `_orden` (posición de
+    cada fila en el DataFrame). Devuelve su nombre.
+    """
+    temporal = f"tmp_carga_{tabla_sql}"
+    cursor.execute(f"DROP TABLE IF EXISTS {temporal}")
+    cursor.execute(f"CREATE TEMP TABLE {temporal} ON COMMIT DROP AS "
+                   f"SELECT {', '.join(columnas)} FROM {tabla_sql} WITH NO DATA")
+    cursor.execute(f"ALTER TABLE {temporal} ADD COLUMN _orden BIGSERIAL")
+    _copiar_csv(df, temporal, columnas, cursor, filas_por_bloque)
+    return temporal
+
+
+def _upsert_desde_temporal(temporal: str, tabla_sql: str, columnas: List[str], cursor) -> dict:
+    """
+    Un único `INSERT ... SELECT ... ON CONFLICT DO UPDATE` desde la tabla temporal: inserta las
+    claves nuevas y actualiza solo las filas cuyo contenido cambia (`IS DISTINCT FROM`).
+    Si una clave se repite en el DataFrame, cuenta su primera fila (como con DO NOTHING), y las
+    filas se insertan en el orden del DataFrame (los IDs SERIAL, como genre_id, no cambian).
+    """
+    clave = clave_conflicto(tabla_sql, columnas)
+    pk_col = ", ".join(clave)
+    resto = [col for col in columnas if col not in clave]
+    columnas_str = ", ".join(columnas)
+    if resto:
+        conflicto = f"""
+            DO UPDATE SET {", ".join(f"{col} = EXCLUDED.{col}" for col in resto)}
+            WHERE ({", ".join(f"{tabla_sql}.{col}" for col in resto)})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{col}" for col in resto)})
+        """
+    else:
+        conflicto = "DO NOTHING"
+
+    # Las claves que ya existían se cuentan en la misma sentencia (mismo snapshot, antes del INSERT):
+    # RETURNING xmax no está disponible en las tablas particionadas
+    cursor.execute(f"""
+        WITH primeras AS (
+            SELECT DISTINCT ON ({pk_col}) {columnas_str}, _orden
+            FROM {temporal}
+            ORDER BY {pk_col}, _orden
+        ), existentes AS (
+            SELECT count(*) AS n
+            FROM primeras p JOIN {tabla_sql} t ON {" AND ".join(f"t.{col} = p.{col}" for col in clave)}
+        ), filas AS (
+            INSERT INTO {tabla_sql} ({columnas_str})
+            SELECT {columnas_str}
+            FROM primeras
+            ORDER BY _orden
+            ON CONFLICT ({pk_col}) {conflicto}
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM filas), (SELECT n FROM existentes), (SELECT count(*) FROM primeras)
+    """)
+    escritas, existentes, claves = cursor.fetchone()
+    insertados = claves - existentes
+    actualizados = escritas - insertados
+    return {"insertados": insertados, "actualizados": actualizados, "sin_cambios": existentes - actualizados}
+
+
+def enviar_dataframe(df: pd.DataFrame, tabla_sql: str, columnas: List[str], cursor,
+                     metodo: str = "copy", filas_por_bloque: int = 100_000, claves_escritas: list = None):
     """
-    Inserta un DataFrame en una tabla PostgreSQL utilizando executemany.
-    Si hay conflicto de clave primaria, se ignora el registro duplicado.
+    Envía el DataFrame a la tabla con el método indicado (ver `insertar_dataframe`) dentro de la
+    transacción en curso, sin hacer commit.
+
+    Si se pasa la lista `claves_escritas`, se le añaden las claves (primera columna) de las filas
+    cuyo contenido en la tabla es el enviado: las insertadas (con `ON CONFLICT DO NOTHING`, las que
+    ya existían no cuentan, aunque su contenido sea otro) o, con `metodo="upsert"`, todas.
+
+    Returns:
+        dict | None: Con `metodo="upsert"`, filas insertadas, actualizadas y sin cambios.
+    """
+    resumen = None
+    clave = clave_conflicto(tabla_sql, columnas)
+    devolver = f" RETURNING {columnas[0]}" if clave and claves_escritas is not None else ""
+    if metodo == "executemany":
+        # Sanitizar valores: convertir pd.NA y np.nan a None
+        data_to_insert = df[columnas].where(pd.notna(df[columnas]), None).values.tolist()
+        placeholders = ", ".join(["%s"] * len(columnas))
+        sql = _sql_insercion(tabla_sql, columnas, f"VALUES ({placeholders})")
+        if devolver:
+            # executemany no devuelve filas: una sentencia por fila para saber cuáles se insertaron
+            for fila in data_to_insert:
+                cursor.execute(sql + devolver, fila)
+                claves_escritas.extend(c for (c,) in cursor.fetchall())
+        else:
+            cursor.executemany(sql, data_to_insert)
+    elif metodo in ("copy", "upsert"):
+        if clave:
+            temporal = _tabla_temporal(df, tabla_sql, columnas, cursor, filas_por_bloque)
+            if metodo == "upsert":
+                resumen = _upsert_desde_temporal(temporal, tabla_sql, columnas, cursor)
+            else:
+                origen = f"SELECT {', '.join(columnas)} FROM {temporal} ORDER BY _orden"
+                cursor.execute(_sql_insercion(tabla_sql, columnas, origen) + devolver)
+                if devolver:
+                    claves_escritas.extend(c for (c,) in cursor.fetchall())
+        else:
+            _copiar_csv(df, tabla_sql, columnas, cursor, filas_por_bloque)
+            if metodo == "upsert":
+                resumen = {"insertados": len(df), "actualizados": 0, "sin_cambios": 0}
+    else:
+        raise ValueError(f"Método de inserción no soportado: {metodo}")
+    if claves_escritas is not None and (metodo == "upsert" or not clave):
+        # Sin conflictos que ignorar, la tabla queda con el contenido enviado para todas las claves
+        claves_escritas.extend(df[columnas[0]].dropna().unique().tolist())
+    return resumen
+
+
+@medir
+def insertar_dataframe(df: pd.DataFrame, tabla_sql: str, columnas: List[str], conn,
+                       metodo: str = "copy", filas_por_bloque: int = 100_000, claves_escritas: list = None):
+    """
+    Inserta un DataFrame en una tabla PostgreSQL.
+    Si hay conflicto de clave primaria, se ignora el registro duplicado (salvo con `metodo="upsert"`).
+
+    Con `metodo="copy"` (por defecto) los datos se envían con COPY en bloques de CSV en memoria,
+    sin construir la lista de filas en Python:
+    - Tablas con clave primaria natural (artist, album, track, genre): COPY a una tabla temporal
+      y `INSERT ... SELECT ... ON CONFLICT DO NOTHING` hacia la tabla final.
+    - Resto (tablas de precios): COPY directo a la tabla; las observaciones ya cargadas se quitan
+      antes, en el ETL (ver `precios_no_cargados`).
+    Con `metodo="upsert"`, en las tablas con clave natural las filas existentes cuyo contenido
+    ha cambiado se actualizan (`ON CONFLICT DO UPDATE ... WHERE ... IS DISTINCT FROM`) y se
+    informa de las filas insertadas, actualizadas y sin cambios.
+    Con `metodo="executemany"` se usa la inserción fila a fila anterior.
 
     Args:
         df (pd.DataFrame): El DataFrame que contiene los datos.
         tabla_sql (str): Nombre de la tabla en la base de datos.
-        columnas (List[str]): Lista de columnas que se insertarán.
+        columnas (List[str]): Lista de columnas que se insertarán (la primera, la clave primaria).
         conn (psycopg2.connection): Conexión activa a la base de datos.
+        metodo (str): "copy", "upsert" o "executemany".
+        filas_por_bloque (int): Filas por cada bloque CSV enviado con COPY.
+        claves_escritas (list, opcional): Lista a la que se añaden las claves de las filas escritas
+            (ver `enviar_dataframe`).
+
+    Returns:
+        dict | None: Con `metodo="upsert"`, filas insertadas, actualizadas y sin cambios.
     """
-    import pandas as pd  # Asegúrate de tener esto arriba si no está
-    cursor = conn.cursor()
+    with conn.cursor() as cursor:
+        resumen = enviar_dataframe(df, tabla_sql, columnas, cursor, metodo, filas_por_bloque, claves_escritas)
+    conn.commit()
 
-    # Sanitizar valores: convertir pd.NA y np.nan a None
-    data_to_insert = df[columnas].where(pd.notna(df[columnas]), None).values.tolist()
+    if resumen is not None:
+        print(f"[INFO] {tabla_sql}: {resumen['insertados']} insertadas, {resumen['actualizados']} actualizadas, "
+              f"{resumen['sin_cambios']} sin cambios")
+    return resumen
 
-    # Construir plantilla base
-    placeholders = ", ".join(["%s"] * len(columnas))
-    columnas_str = ", ".join(columnas)
 
-    # === Manejo de conflictos según la tabla ===
-    if tabla_sql in ["artist", "album", "track", "genre"]:
-        # Clave primaria única → evitar error duplicado
-        pk_col = columnas[0]  # Asumimos que la primera columna es la PK
-        insert_query = f"""
-            INSERT INTO {tabla_sql} ({columnas_str})
-            VALUES ({placeholders})
-            ON CONFLICT ({pk_col}) DO NOTHING
-        """
-    else:
-        # Para tablas sin clave única definida (como track_prices)
-        insert_query = f"""
-            INSERT INTO {tabla_sql} ({columnas_str})
-            VALUES ({placeholders})
-        """
+def precios_no_cargados(df: pd.DataFrame, tabla_sql: str, clave: str, conn) -> pd.DataFrame:
+    """
+    Quita de un historial de precios (`track_prices` o `album_prices`) las observaciones cuya
+    clave y checked_at ya están en la tabla: las de un archivo bruto modificado que se reprocesa
+    o las de una carga anterior que falló después de confirmar los precios. Las tablas de precios
+    no tienen clave única (la carga solo añade filas), así que sin este filtro se duplicarían.
+
+    Solo se leen de la base los días presentes en `df`.
+
+    Args:
+        df (pd.DataFrame): Observaciones a cargar, con `clave` y `checked_at`.
+        tabla_sql (str): Tabla de precios de destino.
+        clave (str): "track_id" o "collection_id".
+        conn (psycopg2.connection): Conexión activa a la base de datos.
+
+    Returns:
+        pd.DataFrame: Las filas de `df` que aún no están en la tabla, en su orden.
+    """
+    dias = pd.to_datetime(df["checked_at"].dropna().unique())
+    if len(dias) == 0:
+        return df
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT {clave}, checked_at FROM {tabla_sql} WHERE checked_at = ANY(%s::date[])",
+                       ([d.date() for d in dias],))
+        cargadas = pd.DataFrame(cursor.fetchall(), columns=[clave, "checked_at"])
+    conn.commit()
+    if cargadas.empty:
+        return df
+
+    cargadas = pd.MultiIndex.from_arrays([cargadas[clave].astype("int64"), pd.to_datetime(cargadas["checked_at"])])
+    observaciones = pd.MultiIndex.from_arrays([df[clave].astype("Int64"), pd.to_datetime(df["checked_at"])])
+    nuevas = ~observaciones.isin(cargadas)
+    print(f"[INFO] {tabla_sql}: {int((~nuevas).sum())} observaciones ya cargadas no se vuelven a enviar")
+    return df[nuevas]
+
+
+@medir
+def insertar_intervalos_precio(observaciones: pd.DataFrame, tabla_sql: str, clave: str, columna_precio: str, conn) -> dict:
+    """
+    Carga un historial diario de precios en una tabla de intervalos (`track_price_intervals`
+    o `album_price_intervals`): solo se inserta una fila cuando el precio de un ID cambia
+    respecto a su último precio conocido en la base.
+
+    - Lee de la base el tramo abierto (`valid_to IS NULL`) de cada ID presente en `observaciones`.
+    - Calcula los tramos con `intervalos_precio`.
+    - Actualiza `valid_to`/`last_checked` de los tramos existentes e inserta los nuevos y
+      anota los días observados que se añaden en la cola de los resúmenes del EDA
+      (`resumen_pendientes`), todo en una única transacción.
+
+    Args:
+        observaciones (pd.DataFrame): Filas (clave, precio, checked_at).
+        tabla_sql (str): Tabla de intervalos de destino.
+        clave (str): Columna ID ("track_id" o "collection_id").
+        columna_precio (str): Columna de precio ("trackprice" o "collectionprice").
+        conn (psycopg2.connection): Conexión activa a la base de datos.
+
+    Returns:
+        dict: Número de observaciones recibidas, tramos actualizados y tramos insertados.
+    """
+    ids = [int(i) for i in observaciones[clave].dropna().unique()]
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {clave}, {columna_precio}, valid_from, last_checked FROM {tabla_sql} "
+            f"WHERE valid_to IS NULL AND {clave} = ANY(%s)",
+            (ids,)
+        )
+        abiertos = pd.DataFrame(cursor.fetchall(), columns=[clave, columna_precio, "valid_from", "last_checked"])
+
+        intervalos = intervalos_precio(observaciones, clave, columna_precio, abiertos)
+        intervalos = intervalos.astype(object).where(intervalos.notna(), None)
+        for col in ["valid_from", "valid_to", "last_checked"]:
+            intervalos[col] = intervalos[col].map(lambda x: x.date() if x is not None else None)
+
+        existentes = intervalos[intervalos["existente"].astype(bool)]
+        nuevos = intervalos[~intervalos["existente"].astype(bool)]
+
+        cursor.executemany(
+            f"UPDATE {tabla_sql} SET valid_to = %s, last_checked = %s WHERE {clave} = %s AND valid_from = %s",
+            existentes[["valid_to", "last_checked", clave, "valid_from"]].values.tolist()
+        )
+        cursor.executemany(
+            f"""
+            INSERT INTO {tabla_sql} ({clave}, {columna_precio}, valid_from, valid_to, last_checked)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT ({clave}, valid_from) DO NOTHING
+            """,
+            nuevos[[clave, columna_precio, "valid_from", "valid_to", "last_checked"]].values.tolist()
+        )
 
-    # Ejecutar inserción
-    cursor.executemany(insert_query, data_to_insert)
+        # Las mismas observaciones que usa `intervalos_precio`: una por ID y día, posteriores al tramo abierto
+        observados = observaciones[[clave, columna_precio, "checked_at"]].dropna().drop_duplicates(subset=[clave, "checked_at"])
+        observados = pd.DataFrame({
+            "tabla": tabla_sql,
+            "id": observados[clave].astype("int64"),
+            "checked_at": pd.to_datetime(observados["checked_at"]).dt.normalize(),
+        })
+        ultimo = pd.to_datetime(observados["id"].map(abiertos.set_index(clave)["last_checked"]))
+        observados = observados[~(observados["checked_at"] <= ultimo)]
+        _copiar_csv(observados, "resumen_pendientes", ["tabla", "id", "checked_at"], cursor, filas_por_bloque=100_000)
     conn.commit()
-    cursor.close()
 
+    resumen = {"observaciones": len(observaciones), "actualizados": len(existentes), "insertados": len(nuevos)}
+    print(f"[INFO] {tabla_sql}: {resumen['observaciones']} observaciones → "
+          f"{resumen['insertados']} tramos nuevos, {resumen['actualizados']} tramos actualizados")
+    return resumen
 
 
+@medir
 def insertar_multiples_tablas(tablas: Dict[str, pd.DataFrame], esquema_columnas: Dict[str, List[str]], conn) -> None:
     """
     Inserta múltiples DataFrames en sus respectivas tablas PostgreSQL.
@@ -86,4 +362,3 @@ def insertar_multiples_tablas(tablas: Dict[str, pd.DataFrame], esquema_columnas:
         print(f"Insertando datos en tabla '{nombre_tabla}'...")
         insertar_dataframe(df, nombre_tabla, columnas, conn)
     print("[COMPLETADO] Todas las tablas fueron insertadas correctamente.")
- 
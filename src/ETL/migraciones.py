@@ -0,0 +1,423 @@
+import pandas as pd
+
+from src.instrumentacion import medir
+
+# Tablas de historial de precios particionadas por mes de checked_at: tabla -> (columna de precio, clave)
+TABLAS_PARTICIONADAS = {
+    "track_prices": ("trackprice", "track_id"),
+    "album_prices": ("collectionprice", "collection_id"),
+}
+
+SQL_TABLA_MIGRACIONES = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        aplicada_en TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+# Versión 1 del esquema, copiada de `documentacion/itunes_database.sql` tal como estaba antes de las
+# migraciones: una migración aplicada no puede cambiar, así que no se lee del archivo (idempotente
+# para las bases creadas con ese script)
+SQL_ESQUEMA_INICIAL = """
+    CREATE TABLE IF NOT EXISTS Artist (
+        artist_Id INTEGER PRIMARY KEY,
+        artistName TEXT,
+        artistViewUrl TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS Genre (
+        genre_Id SERIAL PRIMARY KEY,
+        primaryGenreName TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS Album (
+        collection_Id INTEGER PRIMARY KEY,
+        collectionName TEXT,
+        collectionCensoredName TEXT,
+        release_Date DATE,
+        collectionExplicitness TEXT,
+        contentAdvisoryRating TEXT,
+        collectionPrice FLOAT CHECK (collectionPrice >= 0),
+        currency TEXT,
+        trackCount INTEGER,
+        discCount INTEGER,
+        collectionViewUrl TEXT,
+        collectionArtistName TEXT,
+        collectionArtistViewUrl TEXT,
+        artist_Id INT REFERENCES Artist(artist_Id)
+    );
+
+    CREATE TABLE IF NOT EXISTS Track (
+        track_Id INTEGER PRIMARY KEY,
+        trackName TEXT,
+        trackNumber INTEGER,
+        trackPrice FLOAT CHECK (trackPrice >= 0),
+        discNumber INTEGER,
+        trackTimeMillis INTEGER,
+        trackExplicitness TEXT,
+        release_Date DATE,
+        trackViewUrl TEXT,
+        is_Streamable BOOLEAN,
+        kind TEXT,
+        artist_Id INT REFERENCES Artist(artist_Id),
+        collection_Id INT REFERENCES Album(collection_Id),
+        genre_Id INT REFERENCES Genre(genre_Id)
+    );
+
+    CREATE TABLE IF NOT EXISTS Track_prices (
+        id SERIAL PRIMARY KEY,
+        trackPrice FLOAT CHECK (trackPrice >= 0),
+        checked_at DATE,
+        track_id INT REFERENCES Track(track_Id)
+    );
+
+    CREATE TABLE IF NOT EXISTS Album_prices (
+        id SERIAL PRIMARY KEY,
+        collectionPrice FLOAT CHECK (collectionPrice >= 0),
+        checked_at DATE,
+        collection_Id INT REFERENCES Album(collection_Id)
+    );
+"""
+
+# Historial de precios compactado (SCD tipo 2, `--precios-intervalos`): una fila por tramo de precio constante.
+# valid_to es exclusiva y queda a NULL mientras el precio sigue vigente;
+# last_checked es la última fecha en la que se observó ese precio.
+SQL_PRECIOS_INTERVALOS = """
+    CREATE TABLE IF NOT EXISTS Track_price_intervals (
+        track_Id INT REFERENCES Track(track_Id),
+        trackPrice FLOAT CHECK (trackPrice >= 0),
+        valid_from DATE NOT NULL,
+        valid_to DATE,
+        last_checked DATE NOT NULL,
+        PRIMARY KEY (track_Id, valid_from),
+        CHECK (valid_to IS NULL OR valid_to > valid_from)
+    );
+
+    CREATE TABLE IF NOT EXISTS Album_price_intervals (
+        collection_Id INT REFERENCES Album(collection_Id),
+        collectionPrice FLOAT CHECK (collectionPrice >= 0),
+        valid_from DATE NOT NULL,
+        valid_to DATE,
+        last_checked DATE NOT NULL,
+        PRIMARY KEY (collection_Id, valid_from),
+        CHECK (valid_to IS NULL OR valid_to > valid_from)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_track_price_intervals_vigente
+        ON Track_price_intervals (track_Id) WHERE valid_to IS NULL;
+
+    CREATE INDEX IF NOT EXISTS idx_album_price_intervals_vigente
+        ON Album_price_intervals (collection_Id) WHERE valid_to IS NULL;
+
+    -- Serie diaria reconstruida a partir de los tramos, con las mismas columnas que
+    -- Track_prices / Album_prices: las consultas existentes solo cambian el nombre de la tabla.
+    CREATE OR REPLACE VIEW Track_prices_diario AS
+    SELECT
+        i.track_Id,
+        i.trackPrice,
+        d::date AS checked_at
+    FROM Track_price_intervals i
+    CROSS JOIN LATERAL generate_series(
+        i.valid_from, COALESCE(i.valid_to - 1, i.last_checked), INTERVAL '1 day'
+    ) AS d;
+
+    CREATE OR REPLACE VIEW Album_prices_diario AS
+    SELECT
+        i.collection_Id,
+        i.collectionPrice,
+        d::date AS checked_at
+    FROM Album_price_intervals i
+    CROSS JOIN LATERAL generate_series(
+        i.valid_from, COALESCE(i.valid_to - 1, i.last_checked), INTERVAL '1 day'
+    ) AS d;
+"""
+
+SQL_TABLA_CHECKPOINT = """
+    -- Checkpoints de la carga por trozos (ver `src.ETL.carga_reanudable`): uno por tabla de destino
+    CREATE TABLE IF NOT EXISTS etl_checkpoint_carga (
+        tabla TEXT PRIMARY KEY,
+        huella TEXT NOT NULL,
+        firma TEXT,
+        clave_desde BIGINT,
+        clave_hasta BIGINT,
+        filas_cargadas BIGINT NOT NULL,
+        filas_rechazadas BIGINT NOT NULL,
+        trozos INT NOT NULL,
+        completada BOOLEAN NOT NULL DEFAULT false,
+        actualizado_en TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+# Resúmenes de las consultas repetidas del EDA y del dashboard (ver `src.ETL.resumenes`). Guardan
+# sumas y recuentos (no medias) para poder sumar las observaciones nuevas sin recalcular el grupo entero.
+SQL_TABLAS_RESUMEN = """
+    CREATE TABLE IF NOT EXISTS resumen_precio_genero (
+        genre_id INT PRIMARY KEY,
+        suma_precio DOUBLE PRECISION NOT NULL,
+        n_precio BIGINT NOT NULL,
+        suma_duracion DOUBLE PRECISION NOT NULL,
+        n_duracion BIGINT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS resumen_precio_explicitud (
+        trackexplicitness TEXT PRIMARY KEY,
+        suma_precio DOUBLE PRECISION NOT NULL,
+        n_precio BIGINT NOT NULL,
+        suma_duracion DOUBLE PRECISION NOT NULL,
+        n_duracion BIGINT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS resumen_precio_artista (
+        artist_id INT PRIMARY KEY,
+        suma_precio DOUBLE PRECISION NOT NULL,
+        n_precio BIGINT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS resumen_precio_diario (
+        tipo TEXT NOT NULL,
+        checked_at DATE NOT NULL,
+        suma_precio DOUBLE PRECISION NOT NULL,
+        n_precio BIGINT NOT NULL,
+        PRIMARY KEY (tipo, checked_at)
+    );
+"""
+
+# Cola de observaciones de precio aún no sumadas a los resúmenes. En track_prices / album_prices la
+# rellenan triggers de sentencia en la misma transacción que inserta los precios, así que una fila
+# entra en la cola cuando (y solo si) su carga hace commit, sea cual sea el orden de los ids (cargas
+# en paralelo o por trozos); `id` es el de la fila. En las tablas de intervalos la rellena
+# `insertar_intervalos_precio` con los días observados que añade, y `id` es el track_id o collection_id.
+SQL_COLA_RESUMEN = """
+    CREATE TABLE IF NOT EXISTS resumen_pendientes (
+        tabla TEXT NOT NULL,
+        id BIGINT NOT NULL,
+        checked_at DATE NOT NULL
+    );
+    CREATE OR REPLACE FUNCTION resumen_anotar_pendientes() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO resumen_pendientes (tabla, id, checked_at) SELECT TG_TABLE_NAME, id, checked_at FROM nuevas;
+        RETURN NULL;
+    END
+    $$;
+    DROP TRIGGER IF EXISTS track_prices_resumen_pendientes ON track_prices;
+    CREATE TRIGGER track_prices_resumen_pendientes AFTER INSERT ON track_prices
+        REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION resumen_anotar_pendientes();
+    DROP TRIGGER IF EXISTS album_prices_resumen_pendientes ON album_prices;
+    CREATE TRIGGER album_prices_resumen_pendientes AFTER INSERT ON album_prices
+        REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION resumen_anotar_pendientes();
+
+    -- Los precios ya cargados entran en la cola: se suman en la siguiente carga o con --migrar
+    INSERT INTO resumen_pendientes (tabla, id, checked_at)
+    SELECT 'track_prices', id, checked_at FROM track_prices WHERE checked_at IS NOT NULL
+    UNION ALL
+    SELECT 'album_prices', id, checked_at FROM album_prices WHERE checked_at IS NOT NULL
+    UNION ALL
+    SELECT 'track_price_intervals', track_id, checked_at FROM track_prices_diario
+    UNION ALL
+    SELECT 'album_price_intervals', collection_id, checked_at FROM album_prices_diario;
+"""
+
+
+def nombre_particion(tabla_sql: str, mes: pd.Period) -> str:
+    return f"{tabla_sql}_p{mes.year}_{mes.month:02d}"
+
+
+def _crear_particiones(cursor, tabla_sql: str, meses) -> list:
+    """Crea (si no existen) las particiones mensuales de `tabla_sql`; devuelve las creadas."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        (tabla_sql,)
+    )
+    existentes = {fila[0] for fila in cursor.fetchall()}
+    creadas = []
+    for mes in sorted(set(meses)):
+        nombre = nombre_particion(tabla_sql, mes)
+        if nombre in existentes:
+            continue
+        desde = mes.start_time.date()
+        hasta = (mes + 1).start_time.date()
+        cursor.execute(f"CREATE TABLE {nombre} PARTITION OF {tabla_sql} FOR VALUES FROM (%s) TO (%s)", (desde, hasta))
+        creadas.append(nombre)
+    return creadas
+
+
+def _meses_en_base(cursor, tabla_sql: str) -> list:
+    cursor.execute(f"SELECT DISTINCT date_trunc('month', checked_at)::date FROM {tabla_sql} WHERE checked_at IS NOT NULL")
+    return [pd.Period(fila[0], freq="M") for fila in cursor.fetchall()]
+
+
+def _particionar_precios(cursor) -> None:
+    """
+    Convierte track_prices y album_prices en tablas particionadas por rango mensual de checked_at:
+    crea la tabla particionada (la clave primaria pasa a ser (id, checked_at) y checked_at, NOT NULL),
+    una partición por cada mes con datos, copia las filas conservando los IDs y la secuencia, y
+    borra la tabla anterior tras comprobar que no falta ninguna fila (si falta, la migración falla y
+    se deshace). Las filas sin checked_at no caben en ninguna partición: si las hay, se copian a
+    <tabla>_sin_fecha.
+    """
+    for tabla_sql, (columna_precio, clave) in TABLAS_PARTICIONADAS.items():
+        antigua = f"{tabla_sql}_antigua"
+        cursor.execute(f"ALTER TABLE {tabla_sql} RENAME TO {antigua}")
+        cursor.execute(f"ALTER INDEX {tabla_sql}_pkey RENAME TO {antigua}_pkey")
+        tabla_referenciada = "track" if clave == "track_id" else "album"
+        cursor.execute(f"""
+            CREATE TABLE {tabla_sql} (
+                id INTEGER NOT NULL DEFAULT nextval('{tabla_sql}_id_seq'),
+                {columna_precio} FLOAT CHECK ({columna_precio} >= 0),
+                checked_at DATE NOT NULL,
+                {clave} INT REFERENCES {tabla_referenciada}({clave}),
+                PRIMARY KEY (id, checked_at)
+            ) PARTITION BY RANGE (checked_at)
+        """)
+        _crear_particiones(cursor, tabla_sql, _meses_en_base(cursor, antigua))
+        cursor.execute(f"""
+            INSERT INTO {tabla_sql} (id, {columna_precio}, checked_at, {clave})
+            SELECT id, {columna_precio}, checked_at, {clave} FROM {antigua}
+            WHERE checked_at IS NOT NULL
+            ORDER BY id
+        """)
+        copiadas = cursor.rowcount
+        cursor.execute(f"ALTER SEQUENCE {tabla_sql}_id_seq OWNED BY {tabla_sql}.id")
+        sin_fecha = 0
+        cursor.execute(f"SELECT count(*) FROM {antigua} WHERE checked_at IS NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute(f"CREATE TABLE {tabla_sql}_sin_fecha AS SELECT * FROM {antigua} WHERE checked_at IS NULL")
+            sin_fecha = cursor.rowcount
+            print(f"[ADVERTENCIA] {sin_fecha} filas de '{tabla_sql}' sin checked_at conservadas en '{tabla_sql}_sin_fecha'.")
+
+        # La tabla anterior solo se borra si todas sus filas están en la nueva o en <tabla>_sin_fecha
+        cursor.execute(f"SELECT count(*) FROM {antigua}")
+        originales = cursor.fetchone()[0]
+        cursor.execute(f"SELECT count(*) FROM {tabla_sql}")
+        en_particiones = cursor.fetchone()[0]
+        if copiadas + sin_fecha != originales or en_particiones != copiadas:
+            raise RuntimeError(
+                f"'{tabla_sql}': {originales} filas originales, {en_particiones} en la tabla particionada y "
+                f"{sin_fecha} sin checked_at; no se borra la tabla anterior"
+            )
+        cursor.execute(f"DROP TABLE {antigua}")
+
+
+# Migraciones en orden: (versión, nombre, SQL o función que recibe el cursor). Una migración ya
+# publicada no se modifica: los cambios de esquema van siempre en una migración nueva
+MIGRACIONES = [
+    (1, "esquema_inicial", SQL_ESQUEMA_INICIAL),
+    (2, "genre_nombre_unico", """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint WHERE conname = 'unique_genrename'
+            ) THEN
+                ALTER TABLE genre ADD CONSTRAINT unique_genrename UNIQUE (primarygenrename);
+            END IF;
+        END$$;
+    """),
+    (3, "historial_precios_por_intervalos", SQL_PRECIOS_INTERVALOS),
+    (4, "precios_particionados_por_mes", _particionar_precios),
+    (5, "indices_claves_foraneas_y_fechas", """
+        -- B-tree en las claves foráneas (joins y filtros por artista, álbum, canción o género)
+        CREATE INDEX IF NOT EXISTS idx_album_artist_id ON album (artist_id);
+        CREATE INDEX IF NOT EXISTS idx_track_artist_id ON track (artist_id);
+        CREATE INDEX IF NOT EXISTS idx_track_collection_id ON track (collection_id);
+        CREATE INDEX IF NOT EXISTS idx_track_genre_id ON track (genre_id);
+        CREATE INDEX IF NOT EXISTS idx_track_prices_track_id ON track_prices (track_id);
+        CREATE INDEX IF NOT EXISTS idx_album_prices_collection_id ON album_prices (collection_id);
+        -- BRIN en las fechas del historial: se cargan en orden cronológico, así que cada bloque
+        -- cubre un rango de días estrecho y el índice ocupa muy poco
+        CREATE INDEX IF NOT EXISTS idx_track_prices_checked_at ON track_prices USING brin (checked_at);
+        CREATE INDEX IF NOT EXISTS idx_album_prices_checked_at ON album_prices USING brin (checked_at);
+        CREATE INDEX IF NOT EXISTS idx_track_price_intervals_valid_from ON track_price_intervals USING brin (valid_from);
+        CREATE INDEX IF NOT EXISTS idx_album_price_intervals_valid_from ON album_price_intervals USING brin (valid_from);
+    """),
+    (6, "checkpoints_carga_por_trozos", SQL_TABLA_CHECKPOINT),
+    (7, "resumenes_eda", SQL_TABLAS_RESUMEN),
+    (8, "resumenes_cola_de_pendientes", SQL_COLA_RESUMEN),
+    (9, "vistas_precios_solo_dias_observados", """
+        -- Cada tramo cubre solo días observados (un día sin observación cierra el tramo, ver
+        -- `intervalos_precio`): la serie diaria va de valid_from a last_checked y no rellena
+        -- los días entre tramos. Los tramos cargados antes de esta versión pueden abarcar días
+        -- sin observación, que la vista sigue devolviendo
+        CREATE OR REPLACE VIEW Track_prices_diario AS
+        SELECT i.track_Id, i.trackPrice, d::date AS checked_at
+        FROM Track_price_intervals i
+        CROSS JOIN LATERAL generate_series(i.valid_from, i.last_checked, INTERVAL '1 day') AS d;
+
+        CREATE OR REPLACE VIEW Album_prices_diario AS
+        SELECT i.collection_Id, i.collectionPrice, d::date AS checked_at
+        FROM Album_price_intervals i
+        CROSS JOIN LATERAL generate_series(i.valid_from, i.last_checked, INTERVAL '1 day') AS d;
+    """),
+]
+
+
+def estado_migraciones(conn) -> pd.DataFrame:
+    """Versión, nombre y fecha de aplicación (o None si está pendiente) de cada migración."""
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_TABLA_MIGRACIONES)
+        cursor.execute("SELECT version, aplicada_en FROM schema_migrations")
+        aplicadas = dict(cursor.fetchall())
+    conn.commit()
+    return pd.DataFrame(
+        [{"version": version, "nombre": nombre, "aplicada_en": aplicadas.get(version)} for version, nombre, _ in MIGRACIONES]
+    )
+
+
+@medir
+def aplicar_migraciones(conn, hasta: int = None) -> list:
+    """
+    Aplica en orden las migraciones de `MIGRACIONES` que aún no figuran en `schema_migrations`
+    (hasta la versión `hasta`, si se indica). Cada migración se aplica y se registra en la misma
+    transacción: si falla, la base queda en la versión anterior y se relanza el error.
+
+    Retorna las versiones aplicadas.
+    """
+    pendientes = estado_migraciones(conn)
+    pendientes = pendientes[pendientes["aplicada_en"].isna()]
+    if hasta is not None:
+        pendientes = pendientes[pendientes["version"] <= hasta]
+
+    migraciones = {version: paso for version, _, paso in MIGRACIONES}
+    aplicadas = []
+    for version, nombre in zip(pendientes["version"], pendientes["nombre"]):
+        try:
+            with conn.cursor() as cursor:
+                paso = migraciones[version]
+                if callable(paso):
+                    paso(cursor)
+                else:
+                    cursor.execute(paso)
+                cursor.execute("INSERT INTO schema_migrations (version, nombre) VALUES (%s, %s)", (int(version), nombre))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            print(f"[ERROR] Falló la migración {version} ({nombre}); la base sigue en la versión anterior.")
+            raise
+        aplicadas.append(int(version))
+        print(f"[OK] Migración {version} aplicada: {nombre}")
+    if not aplicadas:
+        print("[INFO] Esquema de la base al día (sin migraciones pendientes).")
+    return aplicadas
+
+
+def asegurar_particiones(conn, fechas_por_tabla: dict) -> list:
+    """
+    Crea antes de una carga las particiones mensuales que faltan para las fechas que se van a
+    insertar. `fechas_por_tabla` es tabla -> Series de checked_at; las tablas que no están
+    particionadas (base sin migrar) se ignoran.
+
+    Retorna los nombres de las particiones creadas.
+    """
+    creadas = []
+    with conn.cursor() as cursor:
+        for tabla_sql, fechas in fechas_por_tabla.items():
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+                (tabla_sql,)
+            )
+            if cursor.fetchone() is None:
+                continue
+            meses = pd.to_datetime(fechas.dropna()).dt.to_period("M").unique()
+            creadas += _crear_particiones(cursor, tabla_sql, meses)
+    conn.commit()
+    if creadas:
+        print(f"[INFO] Particiones nuevas: {', '.join(creadas)}")
+    return creadas
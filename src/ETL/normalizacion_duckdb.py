@@ -0,0 +1,179 @@
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.ETL.esquema import MAPEO_TIPOS_PANDAS
+from src.ETL.file_utils import columnas_indice, leer_df
+from src.ETL.transform import COLUMNAS_ALBUM, COLUMNAS_SQL, COLUMNAS_TRACK, sin_categorias
+from src.instrumentacion import medir
+
+# Columnas del maestro (ya renombradas al esquema SQL) que usa la normalización
+COLUMNAS_NORMALIZACION = list(dict.fromkeys(
+    ["artist_id", "artistname", "artistviewurl"] + COLUMNAS_ALBUM + COLUMNAS_TRACK + ["checked_at"]
+))
+
+
+def _sql_primera_fila(clave, columnas):
+    """Equivale a `drop_duplicates(subset=clave, keep="first")`: primera fila de cada clave, en su orden."""
+    return f"""
+        SELECT {", ".join(columnas)}, _fila
+        FROM maestro
+        QUALIFY row_number() OVER (PARTITION BY {clave} ORDER BY _fila) = 1
+        ORDER BY _fila
+    """
+
+
+def _sql_moda(clave, columnas):
+    """Equivale a `moda_por_clave`: valor no nulo más frecuente por clave (empate: el que aparece antes)."""
+    modas = "\n".join(f"""
+        LEFT JOIN (
+            SELECT {clave}, first({col} ORDER BY n DESC, primera) AS {col}
+            FROM (
+                SELECT {clave}, {col}, count(*) AS n, min(_fila) AS primera
+                FROM maestro
+                WHERE {clave} IS NOT NULL AND {col} IS NOT NULL
+                GROUP BY {clave}, {col}
+            )
+            GROUP BY {clave}
+        ) USING ({clave})""" for col in columnas)
+    return f"""
+        SELECT {clave}, {", ".join(columnas)}
+        FROM (SELECT DISTINCT {clave} FROM maestro WHERE {clave} IS NOT NULL)
+        {modas}
+        ORDER BY {clave}
+    """
+
+
+def _sql_precios(clave, columna_precio):
+    """Equivale a `dropna` + `drop_duplicates(subset=[clave, "checked_at"])` de las tablas de precios."""
+    return f"""
+        SELECT {clave}, {columna_precio}, checked_at, _fila
+        FROM maestro
+        WHERE {clave} IS NOT NULL AND {columna_precio} IS NOT NULL AND checked_at IS NOT NULL
+        QUALIFY row_number() OVER (PARTITION BY {clave}, checked_at ORDER BY _fila) = 1
+        ORDER BY _fila
+    """
+
+
+def _registrar_maestro(con, datos):
+    """
+    Registra en DuckDB la vista `maestro` con las columnas de la normalización y `_fila`
+    (posición de cada fila en el maestro, para reproducir el orden y los índices de pandas).
+
+    Retorna el DataFrame registrado (referencia de índices y tipos) o None si se lee un Parquet.
+    """
+    if isinstance(datos, (str, Path)) and str(datos).endswith(".parquet"):
+        columnas = [f'"{origen}" AS {destino}' for origen, destino in COLUMNAS_SQL.items()]
+        ruta = str(datos).replace("'", "''")
+        if Path(datos).is_dir():
+            # Carpeta particionada de `guardar_df`: checked_at se lee de los ficheros
+            ruta = f"{ruta}/*/*.parquet"
+        # El índice guardado por `guardar_df`; en otros Parquet, la posición de la fila en el archivo
+        indice = columnas_indice(pq.read_schema(next(iter(Path(datos).glob("*/*.parquet")), datos)))
+        fila = f'"{indice[0]}"' if len(indice) == 1 else "file_row_number"
+        con.execute(f"""
+            CREATE VIEW maestro AS
+            SELECT {", ".join(columnas)}, checked_at, {fila} AS _fila
+            FROM read_parquet('{ruta}', file_row_number = true, hive_partitioning = false)
+        """)
+        return None
+
+    df = leer_df(datos) if isinstance(datos, (str, Path)) else datos
+    # Solo las columnas necesarias: DuckDB lee el DataFrame directamente, sin convertirlo a Arrow
+    originales = {destino: origen for origen, destino in COLUMNAS_SQL.items()}
+    df = df[[originales.get(col, col) for col in COLUMNAS_NORMALIZACION]].set_axis(COLUMNAS_NORMALIZACION, axis=1)
+    df.insert(len(df.columns), "_fila", np.arange(len(df), dtype=np.int64))
+    con.register("maestro", df)
+    return df
+
+
+def _a_pandas(resultado, referencia, con_indice):
+    """
+    Convierte un resultado Arrow a DataFrame con los tipos (y, si procede, el índice) del maestro.
+
+    Arrow devuelve los nulos de las columnas `object` siempre como None. Si el resultado trae
+    `_fila`, se copian de esas filas del maestro (pandas conserva el valor original: NaN, None o
+    pd.NA); si no (modas), pasan a NaN, como los que deja el `reindex` de `moda_por_clave`.
+    """
+    df = resultado.to_pandas(types_mapper=MAPEO_TIPOS_PANDAS.get)
+    posiciones = df.pop("_fila").to_numpy() if "_fila" in df.columns else None
+    if con_indice:
+        df.index = referencia.index[posiciones] if referencia is not None else pd.Index(posiciones)
+    if referencia is not None:
+        df = sin_categorias(df.astype({col: referencia[col].dtype for col in df.columns if col in referencia.columns}))
+        for col in df.columns:
+            if col in referencia.columns and df[col].dtype == object and df[col].isna().any():
+                nulos = df[col].isna().to_numpy()
+                if posiciones is not None:
+                    originales = sin_categorias(referencia[[col]])[col].to_numpy()[posiciones]
+                else:
+                    originales = np.full(len(df), np.nan, dtype=object)
+                df[col] = np.where(nulos, originales, df[col].to_numpy())
+    return df
+
+
+@medir
+def procesar_con_duckdb(datos, moda_dimensiones=False, formato="pandas", hilos=None):
+    """
+    Motor alternativo de `procesar_dataframe_maestro`: la misma separación en tablas normalizadas,
+    pero como consultas SQL de DuckDB (multihilo y sin materializar en pandas las copias intermedias).
+
+    Con `formato="pandas"` y un DataFrame o pickle de entrada, las tablas son idénticas a las del
+    motor pandas (mismas filas, orden, índices y tipos); ver `tests/test_normalizacion_duckdb.py`.
+
+    Parámetros:
+    -----------
+    datos : str, Path o pandas.DataFrame
+        DataFrame limpio, ruta a su pickle o ruta a un archivo Parquet (o carpeta particionada)
+        con el DataFrame limpio. Con Parquet, los índices son los guardados por `guardar_df` o, si
+        el archivo no los tiene, la posición de cada fila en el archivo.
+
+    moda_dimensiones : bool
+        Igual que en `procesar_dataframe_maestro`.
+
+    formato : str
+        "pandas" (DataFrames) o "arrow" (tablas `pyarrow.Table`, sin índice).
+
+    hilos : int, opcional
+        Hilos de DuckDB. Por defecto, todos los núcleos disponibles.
+
+    Retorna:
+    --------
+    dict
+        Diccionario con las tablas separadas por nombre.
+    """
+    if formato not in ("pandas", "arrow"):
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    con = duckdb.connect()
+    try:
+        con.execute("SET enable_progress_bar = false")
+        if hilos:
+            con.execute(f"SET threads = {int(hilos)}")
+        referencia = _registrar_maestro(con, datos)
+
+        consultas = {
+            "artist": (_sql_moda("artist_id", ["artistname", "artistviewurl"]), False),
+            "album": ((_sql_moda("collection_id", COLUMNAS_ALBUM[1:]), False) if moda_dimensiones
+                      else (_sql_primera_fila("collection_id", COLUMNAS_ALBUM), True)),
+            # Track no conserva el índice: en pandas lo reinicia el merge con Genre
+            "track": ((_sql_moda("track_id", COLUMNAS_TRACK[1:]), False) if moda_dimensiones
+                      else (_sql_primera_fila("track_id", COLUMNAS_TRACK), False)),
+            "genre": (_sql_primera_fila("primarygenrename", ["primarygenrename"]), False),
+            "track_prices": (_sql_precios("track_id", "trackprice"), True),
+            "album_prices": (_sql_precios("collection_id", "collectionprice"), True),
+        }
+
+        tablas = {}
+        for nombre, (sql, con_indice) in consultas.items():
+            resultado = con.execute(sql).to_arrow_table()
+            if formato == "arrow":
+                tablas[nombre] = resultado.drop_columns(["_fila"]) if "_fila" in resultado.column_names else resultado
+            else:
+                tablas[nombre] = _a_pandas(resultado, referencia, con_indice)
+        return tablas
+    finally:
+        con.close()
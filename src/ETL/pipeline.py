@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentacion import medir_bloque
+
+
+def _actualizar_huella(h, datos) -> None:
+    if isinstance(datos, pd.DataFrame):
+        h.update(repr(list(datos.columns)).encode())
+        h.update(repr(datos.dtypes.tolist()).encode())
+        h.update(pd.util.hash_pandas_object(datos, index=True).to_numpy().tobytes())
+    elif isinstance(datos, pd.Series):
+        h.update(repr((datos.name, datos.dtype)).encode())
+        h.update(pd.util.hash_pandas_object(datos, index=True).to_numpy().tobytes())
+    elif isinstance(datos, dict):
+        for clave in sorted(datos, key=str):
+            h.update(repr(clave).encode())
+            _actualizar_huella(h, datos[clave])
+    elif isinstance(datos, (list, tuple)):
+        h.update(f"{type(datos).__name__}:{len(datos)}".encode())
+        for elemento in datos:
+            _actualizar_huella(h, elemento)
+    elif isinstance(datos, np.ndarray):
+        h.update(repr(datos.dtype).encode())
+        h.update(np.ascontiguousarray(datos).tobytes())
+    else:
+        h.update(repr(datos).encode())
+
+
+def huella_datos(datos) -> str:
+    """
+    Calcula una huella SHA-256 del contenido de una entrada de etapa: DataFrames/Series
+    (valores, índice, columnas y tipos), diccionarios, listas, arrays y valores simples.
+    """
+    h = hashlib.sha256()
+    _actualizar_huella(h, datos)
+    return h.hexdigest()
+
+
+def _rutas_checkpoint(carpeta: str, etapa: str) -> tuple:
+    return os.path.join(carpeta, f"{etapa}.pkl"), os.path.join(carpeta, f"{etapa}.json")
+
+
+def checkpoint_vigente(carpeta: str, etapa: str, huella: str) -> bool:
+    """True si existe un checkpoint de la etapa guardado con la misma huella de entrada."""
+    ruta_datos, ruta_meta = _rutas_checkpoint(carpeta, etapa)
+    if not (os.path.exists(ruta_datos) and os.path.exists(ruta_meta)):
+        return False
+    with open(ruta_meta, "r", encoding="utf-8") as f:
+        return json.load(f).get("huella_entrada") == huella
+
+
+def guardar_checkpoint(carpeta: str, etapa: str, huella: str, salida) -> None:
+    """Guarda la salida de una etapa junto con la huella de la entrada que la produjo."""
+    os.makedirs(carpeta, exist_ok=True)
+    ruta_datos, ruta_meta = _rutas_checkpoint(carpeta, etapa)
+    pd.to_pickle(salida, f"{ruta_datos}.tmp")
+    os.replace(f"{ruta_datos}.tmp", ruta_datos)
+    with open(f"{ruta_meta}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"huella_entrada": huella, "guardado_en": datetime.now().isoformat(timespec="seconds")}, f, indent=2)
+    os.replace(f"{ruta_meta}.tmp", ruta_meta)
+
+
+def cargar_checkpoint(carpeta: str, etapa: str):
+    """Carga la salida guardada de una etapa."""
+    return pd.read_pickle(_rutas_checkpoint(carpeta, etapa)[0])
+
+
+def ejecutar_pipeline(etapas: list, entrada, carpeta_checkpoints: str = None, checkpoints=()) -> object:
+    """
+    Ejecuta una secuencia de etapas pasando la salida de cada una, en memoria, como entrada de la siguiente.
+
+    - Solo se guardan en disco las salidas de las etapas indicadas en `checkpoints`.
+    - Si una etapa con checkpoint recibe una entrada con la misma huella que la de su último
+      checkpoint, no se ejecuta: se reutiliza la salida guardada.
+
+    Parámetros:
+    -----------
+    etapas : list[tuple[str, callable]]
+        Pares (nombre, función). Cada función recibe la salida de la etapa anterior.
+    entrada : object
+        Entrada de la primera etapa.
+    carpeta_checkpoints : str, opcional
+        Carpeta donde guardar los checkpoints (obligatoria si `checkpoints` no está vacío).
+    checkpoints : iterable[str]
+        Nombres de las etapas cuya salida se guarda.
+
+    Retorna:
+    --------
+    object
+        La salida de la última etapa.
+    """
+    checkpoints = set(checkpoints)
+    desconocidas = checkpoints - {nombre for nombre, _ in etapas}
+    if desconocidas:
+        raise ValueError(f"Etapas de checkpoint desconocidas: {sorted(desconocidas)}")
+    if checkpoints and carpeta_checkpoints is None:
+        raise ValueError("Se necesita 'carpeta_checkpoints' para guardar checkpoints")
+
+    datos = entrada
+    for nombre, funcion in etapas:
+        huella = huella_datos(datos) if nombre in checkpoints else None
+        if huella is not None and checkpoint_vigente(carpeta_checkpoints, nombre, huella):
+            print(f"[INFO] Etapa '{nombre}': entrada sin cambios desde su último checkpoint, se reutiliza.")
+            datos = cargar_checkpoint(carpeta_checkpoints, nombre)
+            continue
+
+        inicio = time.perf_counter()
+        with medir_bloque(nombre):
+            datos = funcion(datos)
+        print(f"[INFO] Etapa '{nombre}' completada en {time.perf_counter() - inicio:.2f}s")
+
+        if huella is not None:
+            guardar_checkpoint(carpeta_checkpoints, nombre, huella, datos)
+    return datos
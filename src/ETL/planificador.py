@@ -0,0 +1,115 @@
+import string
+from datetime import date
+
+LETRAS = string.ascii_lowercase
+
+
+def candidatos(estadisticas: dict, semillas: list, longitud_maxima: int = 3) -> list:
+    """
+    Devuelve el espacio de términos candidatos: las semillas más los hijos
+    (término + letra) de cada término saturado que aún no alcanzó `longitud_maxima`.
+    """
+    terminos = dict.fromkeys(semillas)
+    for termino, stats in estadisticas.items():
+        terminos.setdefault(termino)
+        if stats.get("saturado") and len(termino) < longitud_maxima:
+            for letra in LETRAS:
+                terminos.setdefault(termino + letra)
+    return list(terminos)
+
+
+def puntuar_termino(termino: str, estadisticas: dict, limite: int = 200, longitud_maxima: int = 3,
+                    usados: set = None, tasa_cambio: float = 0.01, hoy: date = None) -> float:
+    """
+    Estima cuántas filas nuevas o modificadas aportará una petición del término.
+
+    - Término nunca consultado: `limite` (optimista), la mitad si ya figura en el log de
+      términos usados del modo fijo, o la mitad de la media de nuevos de su padre si viene
+      de expandir un prefijo saturado.
+    - Término consultado: media móvil de trackIds nuevos por petición más las filas que
+      se espera que hayan cambiado desde la última consulta (`tasa_cambio` por día).
+    - Un prefijo saturado ya expandido solo aporta la mitad de sus nuevos esperados,
+      porque sus hijos cubren la mayor parte de su catálogo.
+    """
+    hoy = hoy or date.today()
+    stats = estadisticas.get(termino)
+
+    if stats is None:
+        padre = estadisticas.get(termino[:-1]) if len(termino) > 1 else None
+        if padre is not None and padre.get("saturado"):
+            return max(padre.get("nuevos_medios", 0.0) / 2, 1.0)
+        if usados and termino in usados:
+            return limite / 2
+        return float(limite)
+
+    dias = (hoy - date.fromisoformat(stats["ultima_fecha"])).days
+    cambios = tasa_cambio * stats.get("filas", 0) * max(dias, 0)
+    nuevos = stats.get("nuevos_medios", 0.0)
+    if stats.get("saturado") and len(termino) < longitud_maxima:
+        nuevos *= 0.5
+    return nuevos + cambios
+
+
+def planificar_terminos(estadisticas: dict, semillas: list, presupuesto: int, limite: int = 200,
+                        longitud_maxima: int = 3, usados: set = None, tasa_cambio: float = 0.01,
+                        hoy: date = None) -> list:
+    """
+    Reparte el presupuesto diario de peticiones entre los términos con más filas
+    nuevas o modificadas esperadas.
+
+    Parámetros:
+    -----------
+    estadisticas : dict
+        {término: estadísticas de su última ejecución}, tal como las devuelve
+        `EstadoScrape.estadisticas_terminos`.
+    semillas : list[str]
+        Términos base (por defecto, las 676 combinaciones de dos letras).
+    presupuesto : int
+        Número de peticiones disponibles hoy.
+    limite : int
+        Máximo de resultados por petición de la API; llegar a él marca el término como saturado.
+    longitud_maxima : int
+        Longitud máxima de los términos generados al expandir prefijos saturados.
+    usados : set[str], opcional
+        Términos ya consultados por el modo fijo (sin estadísticas).
+
+    Retorna:
+    --------
+    list[str]
+        Los `presupuesto` términos con mayor puntuación (desempate alfabético).
+    """
+    puntuaciones = {
+        termino: puntuar_termino(termino, estadisticas, limite, longitud_maxima, usados, tasa_cambio, hoy)
+        for termino in candidatos(estadisticas, semillas, longitud_maxima)
+    }
+    ordenados = sorted(puntuaciones, key=lambda t: (-puntuaciones[t], t))
+    return ordenados[:presupuesto]
+
+
+def actualizar_estadisticas_termino(stats: dict, filas: int, nuevos: int, limite: int = 200,
+                                    alfa: float = 0.5, hoy: date = None) -> dict:
+    """
+    Calcula las estadísticas de un término tras una petición correcta.
+
+    - `nuevos_medios` es una media móvil exponencial (peso `alfa`) de trackIds no vistos antes.
+    - Un término que devuelve `limite` filas queda marcado como saturado, lo que hace que
+      `candidatos` genere sus hijos de una letra más.
+
+    `stats` son las estadísticas previas del término (None si nunca se consultó).
+    """
+    hoy = hoy or date.today()
+    if stats is None:
+        nuevos_medios = float(nuevos)
+        ejecuciones = 0
+    else:
+        nuevos_medios = alfa * nuevos + (1 - alfa) * stats.get("nuevos_medios", 0.0)
+        ejecuciones = stats.get("ejecuciones", 0)
+
+    return {
+        "ejecuciones": ejecuciones + 1,
+        "ultima_fecha": hoy.isoformat(),
+        "filas": filas,
+        "nuevos": nuevos,
+        "nuevos_medios": nuevos_medios,
+        "saturado": filas >= limite,
+    }
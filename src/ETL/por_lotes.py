@@ -0,0 +1,377 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.ETL.esquema import COLUMNAS_ETL, ESQUEMA_LIMPIEZA
+from src.ETL.file_utils import cargar_datos_itunes
+from src.ETL.transform import (
+    COLUMNAS_ALBUM,
+    COLUMNAS_SQL,
+    COLUMNAS_TRACK,
+    coercionar_tipos,
+    combinar_conteos,
+    contar_valores_por_clave,
+    elegir_moda,
+    limpieza_total_texto_final
+)
+from src.instrumentacion import medir
+
+# Código de los valores nulos en `ClavesVistas` (el mismo que usa numpy para NaT)
+CODIGO_NULO = np.iinfo(np.int64).min
+
+TABLAS_PRECIOS = {"track_prices": ("track_id", "trackprice"), "album_prices": ("collection_id", "collectionprice")}
+
+
+def _codigos(serie: pd.Series) -> np.ndarray:
+    """
+    Código int64 de cada valor: el propio valor en enteros y fechas (exacto) y su hash de 64 bits
+    en el resto (p. ej. nombres de género). Los nulos tienen todos el código `CODIGO_NULO`.
+    """
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie.astype("Int64").to_numpy(dtype="int64", na_value=CODIGO_NULO)
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        return serie.to_numpy(dtype="datetime64[ns]").view("int64")
+    codigos = pd.util.hash_pandas_object(serie, index=False).to_numpy().view("int64")
+    return np.where(serie.isna().to_numpy(), CODIGO_NULO, codigos)
+
+
+def _vistas_en(corridas: list, codigos: np.ndarray) -> np.ndarray:
+    """Máscara de los códigos que están en alguna de las corridas (arrays ordenados)."""
+    vistas = np.zeros(len(codigos), dtype=bool)
+    for corrida in corridas:
+        posiciones = np.minimum(np.searchsorted(corrida, codigos), len(corrida) - 1)
+        vistas |= corrida[posiciones] == codigos
+    return vistas
+
+
+class ClavesVistas:
+    """
+    Claves (de una columna) ya emitidas por trozos anteriores. Permite repetir
+    `drop_duplicates(subset=[clave], keep="first")` trozo a trozo sin tener todo el histórico en
+    memoria: solo se guarda un código int64 por clave (ver `_codigos`), no las filas.
+
+    Los códigos se guardan en corridas ordenadas; cada trozo añade una y, como en un LSM, se funde
+    con la anterior mientras esta no sea más del doble de grande, así que hay O(log n) corridas
+    y cada código se copia O(log n) veces (añadir a un único índice copiaba todo en cada trozo).
+
+    Con `particion` (p. ej. "checked_at" en las tablas de precios, cuya clave es (ID, día)) las
+    claves solo se comparan dentro de cada valor de la partición y se guardan en disco, un archivo
+    `.npy` por valor en `carpeta`: en memoria solo están las de las particiones del trozo actual.
+    """
+
+    def __init__(self, clave: str, particion: str = None, carpeta: str = None):
+        if particion is not None and carpeta is None:
+            raise ValueError("Las claves por partición se guardan en disco: indica `carpeta`")
+        self.clave = clave
+        self.particion = particion
+        self.carpeta = carpeta
+        self.corridas = []
+        self.tipo = None
+
+    def _ruta(self, codigo_particion: int) -> str:
+        return os.path.join(self.carpeta, f"{codigo_particion}.npy")
+
+    def nuevas(self, df: pd.DataFrame) -> np.ndarray:
+        """Máscara de las filas cuya clave aparece por primera vez (en este trozo o en los anteriores)."""
+        if self.tipo is None:
+            self.tipo = df[self.clave].dtype
+        codigos = _codigos(df[self.clave])
+        if self.particion is None:
+            mascara = ~pd.Series(codigos).duplicated().to_numpy()
+            mascara[mascara] = ~_vistas_en(self.corridas, codigos[mascara])
+            self._anadir(np.sort(codigos[mascara]))
+            return mascara
+
+        mascara = np.zeros(len(df), dtype=bool)
+        particiones = _codigos(df[self.particion])
+        os.makedirs(self.carpeta, exist_ok=True)
+        for codigo_particion, posiciones in pd.Series(particiones).groupby(particiones).indices.items():
+            ruta = self._ruta(codigo_particion)
+            previas = np.load(ruta) if os.path.exists(ruta) else np.array([], dtype="int64")
+            codigos_particion = codigos[posiciones]
+            nuevas = ~pd.Series(codigos_particion).duplicated().to_numpy()
+            if len(previas):
+                nuevas[nuevas] = ~_vistas_en([previas], codigos_particion[nuevas])
+            mascara[posiciones] = nuevas
+            np.save(ruta, np.sort(np.concatenate([previas, codigos_particion[nuevas]]), kind="stable"))
+        return mascara
+
+    def _anadir(self, codigos: np.ndarray) -> None:
+        if not len(codigos):
+            return
+        self.corridas.append(codigos)
+        while len(self.corridas) > 1 and len(self.corridas[-2]) <= 2 * len(self.corridas[-1]):
+            ultima = self.corridas.pop()
+            self.corridas[-1] = np.sort(np.concatenate([self.corridas[-1], ultima]), kind="stable")
+
+    def ordenadas(self) -> pd.Index:
+        """Todas las claves vistas, ordenadas (sin nulos). Solo para claves enteras sin partición."""
+        codigos = np.sort(np.concatenate(self.corridas)) if self.corridas else np.array([], dtype="int64")
+        return pd.Index(codigos[codigos != CODIGO_NULO]).astype(self.tipo)
+
+
+class _ModaIncremental:
+    """Conteos combinables de `moda_por_clave` para varias columnas de una misma clave."""
+
+    def __init__(self, clave: str, columnas: list):
+        self.claves = [clave]
+        self.columnas = columnas
+        self.conteos = {col: None for col in columnas}
+        self.vistas = ClavesVistas(clave)
+
+    def actualizar(self, df: pd.DataFrame, desplazamiento: int) -> None:
+        self.vistas.nuevas(df[self.claves].dropna())
+        for col in self.columnas:
+            parcial = contar_valores_por_clave(df, self.claves, col, desplazamiento)
+            previos = self.conteos[col]
+            self.conteos[col] = parcial if previos is None else combinar_conteos([previos, parcial], self.claves, col)
+
+    def resultado(self) -> pd.DataFrame:
+        indice = self.vistas.ordenadas()
+        indice.names = self.claves
+        resultado = pd.DataFrame(index=indice)
+        for col in self.columnas:
+            resultado[col] = elegir_moda(self.conteos[col], self.claves, col, indice)
+        return resultado.reset_index()
+
+
+def estadisticas_precio(df: pd.DataFrame, esquema: dict = ESQUEMA_LIMPIEZA) -> dict:
+    """Suma y número de precios no nulos de cada columna a imputar con la media: {col: [suma, cuenta]}."""
+    return {col: [float(df[col].sum()), int(df[col].count())]
+            for col, reglas in esquema.items() if reglas.get("imputar") == "media"}
+
+
+class NormalizadorPorLotes:
+    """
+    Estado de la normalización archivo a archivo, persistente entre ejecuciones en `carpeta`:
+    filas ya normalizadas (desplazamiento de índices e IDs incrementales), suma y número de
+    precios, conteos de la moda de artistas (y de álbumes y canciones con `moda_dimensiones`),
+    claves ya emitidas y archivos normalizados (con su hash y su número de parte).
+
+    Cada archivo escribe en `carpeta` una parte de cada tabla (`<tabla>/part-00000.pkl`, ...):
+    las filas de precios y de album, track y genre con claves nuevas, y los IDs de las tablas
+    con moda, que se resuelven con los conteos de todo el histórico (`tablas`). Las claves de
+    precios de cada día se guardan en `claves/`. Con el estado de una ejecución anterior, los
+    archivos nuevos se normalizan como si se hubieran concatenado al final del histórico.
+    """
+
+    ARCHIVO_ESTADO = "estado.pkl"
+
+    def __init__(self, carpeta: str, moda_dimensiones: bool = False):
+        self.carpeta = carpeta
+        self.moda_dimensiones = moda_dimensiones
+        self.filas = 0
+        self.archivos = {}
+        self.precios = {}
+        self.modas = {"artist": _ModaIncremental("artist_id", ["artistname", "artistviewurl"])}
+        if moda_dimensiones:
+            self.modas["album"] = _ModaIncremental("collection_id", COLUMNAS_ALBUM[1:])
+            self.modas["track"] = _ModaIncremental("track_id", COLUMNAS_TRACK[1:])
+        self.vistas = {
+            "album": ClavesVistas("collection_id"),
+            "track": ClavesVistas("track_id"),
+            "genre": ClavesVistas("primarygenrename"),
+            **{nombre: ClavesVistas(clave, particion="checked_at", carpeta=os.path.join(carpeta, "claves", nombre))
+               for nombre, (clave, _) in TABLAS_PRECIOS.items()},
+        }
+
+    @classmethod
+    def abrir(cls, carpeta: str, moda_dimensiones: bool = False) -> "NormalizadorPorLotes":
+        """Estado guardado en `carpeta` o, si no hay, uno vacío."""
+        ruta = os.path.join(carpeta, cls.ARCHIVO_ESTADO)
+        if os.path.exists(ruta):
+            normalizador = pd.read_pickle(ruta)
+            if normalizador.moda_dimensiones != moda_dimensiones:
+                raise ValueError(f"El estado de '{carpeta}' se creó con moda_dimensiones={normalizador.moda_dimensiones}")
+            return normalizador
+        return cls(carpeta, moda_dimensiones)
+
+    def guardar(self) -> None:
+        os.makedirs(self.carpeta, exist_ok=True)
+        pd.to_pickle(self, os.path.join(self.carpeta, self.ARCHIVO_ESTADO))
+
+    def ruta_parte(self, nombre: str, parte: int) -> str:
+        return os.path.join(self.carpeta, nombre, f"part-{parte:05d}.pkl")
+
+    def _escribir_parte(self, df: pd.DataFrame, nombre: str, parte: int) -> None:
+        ruta = self.ruta_parte(nombre, parte)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        df.to_pickle(ruta)
+
+    def normalizado(self, archivo, huella=None) -> bool:
+        """Indica si `archivo` ya está en el estado (con la misma huella, si se indica)."""
+        return archivo in self.archivos and self.archivos[archivo]["hash"] == huella
+
+    def sumar_precios(self, estadisticas: dict) -> None:
+        for col, (suma, cuenta) in estadisticas.items():
+            previa = self.precios.get(col, [0.0, 0])
+            self.precios[col] = [previa[0] + suma, previa[1] + cuenta]
+
+    def medias(self) -> dict:
+        return {col: suma / cuenta if cuenta else np.nan for col, (suma, cuenta) in self.precios.items()}
+
+    def normalizar(self, archivo, df: pd.DataFrame, medias: dict, huella=None, carpeta_maestro: str = None) -> int:
+        """
+        Completa la limpieza de un archivo (media de precios e IDs incrementales), lo añade al
+        estado y escribe sus partes. Retorna el número de parte.
+        """
+        parte = len(self.archivos)
+        df.index = pd.RangeIndex(self.filas, self.filas + len(df))
+        for col, media in medias.items():
+            df.loc[:, col] = df[col].fillna(media).round(2)
+        df.loc[:, "collectionArtistId"] = pd.Series(
+            range(self.filas + 1, self.filas + 1 + len(df)), index=df.index, dtype="Int64"
+        )
+        if carpeta_maestro:
+            os.makedirs(carpeta_maestro, exist_ok=True)
+            df.to_pickle(os.path.join(carpeta_maestro, f"part-{parte:05d}.pkl"))
+
+        df = df.rename(columns=COLUMNAS_SQL)
+        for nombre, columnas in [("album", COLUMNAS_ALBUM), ("track", COLUMNAS_TRACK), ("genre", ["primarygenrename"])]:
+            if nombre not in self.modas:
+                self._escribir_parte(df.loc[self.vistas[nombre].nuevas(df), columnas], nombre, parte)
+        for nombre, moda in self.modas.items():
+            moda.actualizar(df, self.filas)
+            clave = moda.claves[0]
+            self._escribir_parte(df[[clave]].dropna().drop_duplicates(), nombre, parte)
+        for nombre, (clave, precio) in TABLAS_PRECIOS.items():
+            precios = df[[clave, precio, "checked_at"]].dropna(subset=[clave, precio, "checked_at"])
+            self._escribir_parte(precios[self.vistas[nombre].nuevas(precios)], nombre, parte)
+
+        self.filas += len(df)
+        self.archivos[archivo] = {"parte": parte, "hash": huella}
+        return parte
+
+    def tablas(self, partes: list = None) -> dict:
+        """
+        Tablas de las partes indicadas (por defecto, todas): album, track y genre con las claves
+        que aparecieron por primera vez en ellas; artist (y album/track con `moda_dimensiones`)
+        con las claves que aparecen en ellas y la moda de todo el histórico. Las tablas de precios
+        no se leen: son la lista de rutas de sus partes (ver `leer_partes`).
+        """
+        if partes is None:
+            partes = sorted(datos["parte"] for datos in self.archivos.values())
+        leer = lambda nombre: pd.concat([pd.read_pickle(self.ruta_parte(nombre, parte)) for parte in partes])
+
+        tablas = {}
+        for nombre in ["artist", "album", "track", "genre"]:
+            if not partes:
+                tablas[nombre] = None
+            elif nombre in self.modas:
+                completa = self.modas[nombre].resultado()
+                clave = completa.columns[0]
+                tablas[nombre] = completa[completa[clave].isin(leer(nombre)[clave])].reset_index(drop=True)
+            else:
+                tablas[nombre] = leer(nombre)
+        if not partes:
+            return {}
+        tablas["genre"] = tablas["genre"].reset_index(drop=True)
+        tablas["track"] = tablas["track"].merge(tablas["genre"], on="primarygenrename", how="left")
+        for nombre in TABLAS_PRECIOS:
+            tablas[nombre] = [self.ruta_parte(nombre, parte) for parte in partes]
+        return tablas
+
+
+def leer_partes(rutas: list) -> pd.DataFrame:
+    """Concatena partes de una tabla de precios escritas por `NormalizadorPorLotes`."""
+    return pd.concat([pd.read_pickle(ruta) for ruta in rutas])
+
+
+@medir
+def procesar_por_lotes(archivos: list, carpeta: str, formato: str = "csv", esquema: dict = ESQUEMA_LIMPIEZA,
+                       moda_dimensiones: bool = False, ruta_intermedia=None, previos: dict = None,
+                       hashes: dict = None, carpeta_maestro: str = None) -> tuple:
+    """
+    Limpia y normaliza datos brutos archivo a archivo, con memoria acotada (modo alternativo a
+    cargar todo con `cargar_datos_itunes` y usar `procesar_dataframe_maestro`).
+
+    Primera pasada: cada archivo se limpia (`limpieza_total_texto_final` + `coercionar_tipos`), se
+    guarda en disco y se acumulan suma y número de precios no nulos. Los archivos de `previos`
+    cuya limpieza ya está en `ruta_intermedia` no se vuelven a limpiar.
+
+    Segunda pasada: cada archivo limpio se completa con la media de precios de todo el histórico
+    y los IDs incrementales y se normaliza con el estado de `NormalizadorPorLotes` (en `carpeta`):
+    - Artist (y Album/Track con `moda_dimensiones`): conteos por (clave, valor) acumulados.
+    - Album, Track, Genre y tablas de precios: claves ya emitidas (`ClavesVistas`).
+    Las tablas no se acumulan en memoria: cada archivo escribe sus partes en `carpeta`.
+
+    Si `carpeta` tiene el estado de una ejecución anterior, los archivos se añaden al final de
+    ese histórico, y los que ya están en él (mismo hash en `hashes`) no se vuelven a procesar.
+    Sobre una carpeta vacía, `normalizador.tablas()` (con las partes de precios concatenadas con
+    `leer_partes`) da las mismas tablas que `procesar_dataframe_maestro` sobre el DataFrame
+    completo (mismas filas, orden, índices y tipos).
+
+    Parámetros:
+    -----------
+    archivos : list
+        Archivos brutos, en el orden en el que se concatenarían.
+    carpeta : str
+        Carpeta del estado de la normalización y de las partes de las tablas.
+    formato : str
+        "csv" o "parquet" (ver `cargar_datos_itunes`).
+    esquema : dict
+        Esquema de limpieza (ver `ESQUEMA_LIMPIEZA`).
+    moda_dimensiones : bool
+        Igual que en `procesar_dataframe_maestro`.
+    ruta_intermedia : callable, opcional
+        Función archivo → ruta .pkl donde guardar su limpieza por filas (p. ej. la caché por
+        archivo de main_ETL.py). Por defecto, una carpeta temporal que se borra al terminar.
+    previos : dict, opcional
+        archivo → resumen de una ejecución anterior (ver el valor de retorno), para reutilizar
+        su limpieza de `ruta_intermedia`.
+    hashes : dict, opcional
+        archivo → hash de su contenido, con el que se reconocen los archivos ya normalizados.
+    carpeta_maestro : str, opcional
+        Si se indica, guarda ahí el DataFrame limpio por partes (part-00000.pkl, ...).
+
+    Retorna:
+    --------
+    tuple[NormalizadorPorLotes, list[dict]]
+        El estado (ya guardado) y, por archivo procesado en esta llamada, sus filas brutas y
+        limpias, sus estadísticas de precio (`estadisticas_precio`) y su número de parte.
+    """
+    temporal = None
+    if ruta_intermedia is None:
+        temporal = tempfile.mkdtemp(prefix="itunes_lotes_")
+        ruta_intermedia = lambda archivo: os.path.join(temporal, f"{Path(archivo).stem}.pkl")
+    previos = previos or {}
+    hashes = hashes or {}
+    normalizador = NormalizadorPorLotes.abrir(carpeta, moda_dimensiones)
+    archivos = [archivo for archivo in archivos if not normalizador.normalizado(archivo, hashes.get(archivo))]
+    resumen = []
+
+    try:
+        # 1ª pasada: limpieza por filas y estadísticos de precio
+        print(f"[INFO] Limpiando {len(archivos)} archivos por lotes...")
+        for archivo in archivos:
+            previo = previos.get(archivo)
+            if previo is not None and "precios" in previo and os.path.exists(ruta_intermedia(archivo)):
+                resumen.append({"archivo": archivo, **{k: previo[k] for k in ["filas_brutas", "filas_limpias", "precios"]}})
+                continue
+            df = cargar_datos_itunes(formato=formato, columnas=COLUMNAS_ETL, archivos=[archivo])
+            filas_brutas = len(df)
+            df = coercionar_tipos(limpieza_total_texto_final(df), esquema)
+            os.makedirs(os.path.dirname(ruta_intermedia(archivo)) or ".", exist_ok=True)
+            df.to_pickle(ruta_intermedia(archivo))
+            resumen.append({"archivo": archivo, "filas_brutas": filas_brutas, "filas_limpias": len(df),
+                            "precios": estadisticas_precio(df, esquema)})
+        for r in resumen:
+            normalizador.sumar_precios(r["precios"])
+
+        medias = normalizador.medias()
+        print("[INFO] Medias de precio para imputar: " + ", ".join(f"{col}={media:.4f}" for col, media in medias.items()))
+
+        # 2ª pasada: pasos globales y normalización con estado combinable
+        for i, r in enumerate(resumen):
+            r["parte"] = normalizador.normalizar(r["archivo"], pd.read_pickle(ruta_intermedia(r["archivo"])), medias,
+                                                 hashes.get(r["archivo"]), carpeta_maestro)
+            print(f"  - lote {i + 1}/{len(resumen)}: {r['filas_limpias']} registros normalizados")
+        normalizador.guardar()
+    finally:
+        if temporal is not None:
+            shutil.rmtree(temporal, ignore_errors=True)
+    return normalizador, resumen
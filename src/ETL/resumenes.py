@@ -0,0 +1,232 @@
+import pandas as pd
+
+from src.instrumentacion import medir
+
+# Tablas de resúmenes y cola de observaciones pendientes: migraciones 7 y 8 (`src.ETL.migraciones`)
+TABLAS_RESUMEN = ["resumen_precio_genero", "resumen_precio_explicitud", "resumen_precio_artista", "resumen_precio_diario"]
+
+# Historial de precios de cada tipo: tabla diaria, tabla de intervalos, clave y columna de precio.
+# Los resúmenes suman las observaciones de las dos (carga normal y `--precios-intervalos`)
+HISTORIAL_PRECIOS = {
+    "track": ("track_prices", "track_price_intervals", "track_id", "trackprice"),
+    "album": ("album_prices", "album_price_intervals", "collection_id", "collectionprice"),
+}
+
+
+def _sql_sumar(tabla_resumen: str, clave: str, columnas: list, consulta: str) -> str:
+    """INSERT de las sumas por grupo de `consulta`; si el grupo ya existe, se suman a las guardadas."""
+    actualizar = ", ".join(f"{col} = {tabla_resumen}.{col} + EXCLUDED.{col}" for col in columnas)
+    return f"""
+        INSERT INTO {tabla_resumen} ({clave}, {", ".join(columnas)})
+        {consulta}
+        ON CONFLICT ({clave}) DO UPDATE SET {actualizar}
+    """
+
+
+def _observaciones(cursor, temporal: str, tipo: str, select: str, solo_pendientes: bool) -> int:
+    """
+    Guarda en la tabla temporal `temporal` el resultado de `select` (que lee `{origen}`, las
+    observaciones (clave, precio, checked_at) de `tipo` con alias `p`) para las observaciones de la
+    cola, que se vacía en la misma sentencia, o para todas. Las observaciones son las filas de la
+    tabla diaria más los días observados de la tabla de intervalos. Devuelve su número.
+    """
+    diaria, intervalos, clave, precio = HISTORIAL_PRECIOS[tipo]
+    todas = f"""(
+        SELECT {clave}, {precio}, checked_at FROM {diaria}
+        UNION ALL
+        SELECT {clave}, {precio}, checked_at FROM {diaria}_diario
+    ) p"""
+
+    cursor.execute(f"DROP TABLE IF EXISTS {temporal}")
+    cursor.execute(f"CREATE TEMP TABLE {temporal} ON COMMIT DROP AS {select.format(origen=todas)} WITH NO DATA")
+    if solo_pendientes:
+        pendientes = f"""(
+            SELECT d.{clave}, d.{precio}, d.checked_at FROM {diaria} d
+            JOIN pendientes q ON q.tabla = '{diaria}' AND q.id = d.id AND q.checked_at = d.checked_at
+            UNION ALL
+            SELECT i.{clave}, i.{precio}, q.checked_at FROM {intervalos} i
+            JOIN pendientes q ON q.tabla = '{intervalos}' AND q.id = i.{clave}
+                AND q.checked_at BETWEEN i.valid_from AND i.last_checked
+        ) p"""
+        cursor.execute(f"""
+            WITH pendientes AS (
+                DELETE FROM resumen_pendientes WHERE tabla IN (%s, %s) RETURNING tabla, id, checked_at
+            )
+            INSERT INTO {temporal}
+            {select.format(origen=pendientes)}
+        """, (diaria, intervalos))
+    else:
+        cursor.execute(f"INSERT INTO {temporal} {select.format(origen=todas)}")
+    return cursor.rowcount
+
+
+def _sumar_precios(cursor, solo_pendientes: bool) -> dict:
+    grupos = {}
+
+    # Observaciones de canciones, con los atributos de la canción
+    grupos["observaciones_track"] = _observaciones(cursor, "resumen_nuevas", "track", """
+        SELECT p.trackprice, p.checked_at, t.genre_id, t.trackexplicitness, t.tracktimemillis, t.artist_id
+        FROM {origen}
+        LEFT JOIN track t ON t.track_id = p.track_id
+    """, solo_pendientes)
+
+    medias_con_duracion = """
+        SELECT {clave}, coalesce(sum(trackprice), 0), count(trackprice),
+               coalesce(sum(tracktimemillis), 0), count(tracktimemillis)
+        FROM resumen_nuevas WHERE {clave} IS NOT NULL GROUP BY {clave}
+    """
+    columnas_con_duracion = ["suma_precio", "n_precio", "suma_duracion", "n_duracion"]
+    for tabla_resumen, clave in [("resumen_precio_genero", "genre_id"), ("resumen_precio_explicitud", "trackexplicitness")]:
+        cursor.execute(_sql_sumar(tabla_resumen, clave, columnas_con_duracion, medias_con_duracion.format(clave=clave)))
+        grupos[tabla_resumen] = cursor.rowcount
+    cursor.execute(_sql_sumar("resumen_precio_artista", "artist_id", ["suma_precio", "n_precio"], """
+        SELECT artist_id, coalesce(sum(trackprice), 0), count(trackprice)
+        FROM resumen_nuevas WHERE artist_id IS NOT NULL GROUP BY artist_id
+    """))
+    grupos["resumen_precio_artista"] = cursor.rowcount
+    cursor.execute(_sql_sumar("resumen_precio_diario", "tipo, checked_at", ["suma_precio", "n_precio"], """
+        SELECT 'track', checked_at, coalesce(sum(trackprice), 0), count(trackprice)
+        FROM resumen_nuevas WHERE checked_at IS NOT NULL GROUP BY checked_at
+    """))
+    grupos["resumen_precio_diario"] = cursor.rowcount
+
+    # Observaciones de álbumes (solo el precio medio diario)
+    grupos["observaciones_album"] = _observaciones(cursor, "resumen_nuevas_album", "album", """
+        SELECT p.collectionprice, p.checked_at FROM {origen}
+    """, solo_pendientes)
+    cursor.execute(_sql_sumar("resumen_precio_diario", "tipo, checked_at", ["suma_precio", "n_precio"], """
+        SELECT 'album', checked_at, coalesce(sum(collectionprice), 0), count(collectionprice)
+        FROM resumen_nuevas_album WHERE checked_at IS NOT NULL GROUP BY checked_at
+    """))
+    grupos["resumen_precio_diario"] += cursor.rowcount
+    return grupos
+
+
+def sumar_precios_nuevos(cursor) -> dict:
+    """
+    Suma a los resúmenes las observaciones de precio (de las tablas diarias o de intervalos) que están en la cola
+    `resumen_pendientes` y las quita de ella. Solo se tocan los grupos (géneros, explicitudes,
+    artistas y días) que aparecen en esas filas. No hace commit.
+    """
+    return _sumar_precios(cursor, solo_pendientes=True)
+
+
+def sumar_todos_los_precios(cursor) -> dict:
+    """
+    Vacía los resúmenes y la cola y los vuelve a calcular con todas las observaciones de
+    track_prices y album_prices y los días observados de las tablas de intervalos. No hace commit.
+    """
+    cursor.execute(f"TRUNCATE {', '.join(TABLAS_RESUMEN)}, resumen_pendientes")
+    return _sumar_precios(cursor, solo_pendientes=False)
+
+
+@medir
+def actualizar_resumenes(conn) -> dict:
+    """
+    Actualiza los resúmenes con las observaciones de precio pendientes (`sumar_precios_nuevos`), en
+    una transacción. Es idempotente y, si una actualización anterior no llegó a hacerse, también
+    incluye esas filas; las de cargas que aún no han hecho commit quedan para la siguiente.
+
+    Las medias se calculan con los atributos actuales de track: si se modifican canciones o
+    artistas ya cargados (carga con upsert), hay que usar `recalcular_resumenes`.
+
+    Retorna el número de observaciones nuevas y de grupos tocados por resumen.
+    """
+    with conn.cursor() as cursor:
+        grupos = sumar_precios_nuevos(cursor)
+    conn.commit()
+    print(f"[INFO] Resúmenes actualizados: {grupos['observaciones_track']} precios de canción y "
+          f"{grupos['observaciones_album']} de álbum nuevos → {grupos['resumen_precio_genero']} géneros, "
+          f"{grupos['resumen_precio_explicitud']} explicitudes, {grupos['resumen_precio_artista']} artistas, "
+          f"{grupos['resumen_precio_diario']} días")
+    return grupos
+
+
+@medir
+def recalcular_resumenes(conn) -> dict:
+    """Recalcula los resúmenes desde cero (p. ej. tras actualizar canciones o artistas ya cargados)."""
+    with conn.cursor() as cursor:
+        grupos = sumar_todos_los_precios(cursor)
+    conn.commit()
+    print(f"[INFO] Resúmenes recalculados con {grupos['observaciones_track']} precios de canción y "
+          f"{grupos['observaciones_album']} de álbum.")
+    return grupos
+
+
+# Consultas para el EDA y el dashboard: mismas formas que los groupby de main_EDA.py, pero no
+# exactamente los mismos valores. Aquí cada observación es una canción (o álbum) y día, con el
+# género, la explicitud, la duración y el artista actuales de la tabla track, y los artistas se
+# agrupan por artist_id (con su nombre más frecuente); el DataFrame limpio cuenta cada fila bruta
+# (una canción puede repetirse en un día) con sus propios atributos y agrupa por artistName.
+
+def _leer(conn, sql: str, parametros=None) -> pd.DataFrame:
+    with conn.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        columnas = [c.name for c in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columnas)
+    conn.commit()
+    return df
+
+
+def precio_medio_por_genero(conn, top: int = 15) -> pd.Series:
+    """Precio medio de canción por género (índice primaryGenreName), de mayor a menor."""
+    df = _leer(conn, """
+        SELECT g.primarygenrename AS "primaryGenreName", r.suma_precio / r.n_precio AS "trackPrice"
+        FROM resumen_precio_genero r JOIN genre g USING (genre_id)
+        WHERE r.n_precio > 0
+        ORDER BY 2 DESC, 1
+        LIMIT %s
+    """, (top,))
+    return df.set_index("primaryGenreName")["trackPrice"]
+
+
+def duracion_y_precio_por_genero(conn) -> pd.DataFrame:
+    """Duración (ms) y precio medios de canción por género (índice primaryGenreName)."""
+    df = _leer(conn, """
+        SELECT g.primarygenrename AS "primaryGenreName",
+               r.suma_duracion / nullif(r.n_duracion, 0) AS "trackTimeMillis",
+               r.suma_precio / nullif(r.n_precio, 0) AS "trackPrice"
+        FROM resumen_precio_genero r JOIN genre g USING (genre_id)
+        ORDER BY 1
+    """)
+    return df.set_index("primaryGenreName")
+
+
+def precio_y_duracion_por_explicitud(conn) -> pd.DataFrame:
+    """Precio y duración (ms) medios de canción por explicitud (índice trackExplicitness)."""
+    df = _leer(conn, """
+        SELECT trackexplicitness AS "trackExplicitness",
+               suma_precio / nullif(n_precio, 0) AS "trackPrice",
+               suma_duracion / nullif(n_duracion, 0) AS "trackTimeMillis"
+        FROM resumen_precio_explicitud
+        ORDER BY 1
+    """)
+    return df.set_index("trackExplicitness")
+
+
+def top_artistas_por_precio(conn, top: int = 10) -> pd.DataFrame:
+    """Artistas con mayor precio medio de canción (índice artistName, columna 'Precio medio (USD)')."""
+    df = _leer(conn, """
+        SELECT a.artistname AS "artistName", r.suma_precio / r.n_precio AS "Precio medio (USD)"
+        FROM resumen_precio_artista r JOIN artist a USING (artist_id)
+        WHERE r.n_precio > 0
+        ORDER BY 2 DESC, 1
+        LIMIT %s
+    """, (top,))
+    return df.set_index("artistName")
+
+
+def precio_medio_diario(conn, tipo: str = "track") -> pd.DataFrame:
+    """
+    Precio medio diario de canciones (`tipo="track"`, columna trackPrice) o de álbumes
+    (`tipo="album"`, columna collectionPrice), con una fila por checked_at.
+    """
+    columna = {"track": "trackPrice", "album": "collectionPrice"}[tipo]
+    df = _leer(conn, f"""
+        SELECT checked_at, suma_precio / nullif(n_precio, 0) AS "{columna}"
+        FROM resumen_precio_diario
+        WHERE tipo = %s
+        ORDER BY checked_at
+    """, (tipo,))
+    df["checked_at"] = pd.to_datetime(df["checked_at"])
+    return df
@@ -6,6 +6,11 @@ import numpy as np
 import re
 import unicodedata
 
+from src.ETL.esquema import ESQUEMA_LIMPIEZA, VALORES_NULOS
+from src.ETL.file_utils import leer_df
+from src.instrumentacion import medir
+
+@medir
 def limpieza_total_texto_final(df):
     """
     Limpia exhaustivamente todas las columnas de tipo texto (object) en un DataFrame para depurar datos contaminados
@@ -25,6 +30,9 @@ def limpieza_total_texto_final(df):
     - Limpia espacios extra y caracteres no deseados con expresiones regulares.
     - Elimina filas donde todas las columnas de texto hayan quedado vacías tras la limpieza.
 
+    Cada valor distinto de una columna se limpia una sola vez con operaciones vectorizadas
+    de pandas y el resultado se reparte a todas sus filas.
+
      NOTA:
     -------
     - Esta función **no convierte a minúsculas**: respeta las mayúsculas originales.
@@ -41,45 +49,69 @@ def limpieza_total_texto_final(df):
         Un DataFrame limpio, con columnas texto depuradas y sin filas inútiles.
     """
 
-    def limpiar_valor(val):
-        if pd.isna(val):
-            return ""
+    columnas_objetivas = df.select_dtypes(include=["object"]).columns
+    for col in columnas_objetivas:
+        df[col] = _limpiar_columna_texto(df[col])
 
-        val = str(val).strip()
+    if len(columnas_objetivas) == 0:
+        return df
 
-        if any(pat in val.lower() for pat in ["¿", "¡", "nombre", "valor"]):
-            return ""
+    mask = (df[columnas_objetivas] == "").all(axis=1)
+    df = df[~mask]
 
-        if re.fullmatch(r"\.*\s*\d+(\.\d+)?\s*\.*", val):
-            return ""
+    return df
 
-        if re.fullmatch(r"\d{1,2}-[a-zA-Z]{3}", val):
-            return ""
 
-        if re.fullmatch(r"[^\w]*", val):
-            return ""
+# Patrones de `limpieza_total_texto_final`, compilados una sola vez
+_PATRON_ERROR = re.compile(r"¿|¡|nombre|valor")
+_PATRON_NUMERO = re.compile(r"\.*\s*\d+(\.\d+)?\s*\.*")
+_PATRON_FECHA_CORTA = re.compile(r"\d{1,2}-[a-zA-Z]{3}")
+_PATRON_SOLO_SIMBOLOS = re.compile(r"[^\w]*")
+_PATRON_NO_PERMITIDOS = re.compile(r"[^\w\s.,'&!?-]")
+_PATRON_ESPACIOS = re.compile(r"\s+")
 
-        val = unicodedata.normalize("NFKD", val).encode("ascii", "ignore").decode("utf-8")
-        val = re.sub(r"[^\w\s.,'&!?-]", "", val)
-        val = re.sub(r"\s+", " ", val).strip()
 
-        if len(val) < 2:
-            return ""
+def _limpiar_columna_texto(serie):
+    """
+    Aplica las reglas de `limpieza_total_texto_final` a una columna.
 
-        return val
+    Cada valor distinto se limpia una sola vez con los kernels de texto de pandas y el
+    resultado se reparte a las filas por su código (`pd.factorize`), porque URLs, artistas,
+    géneros o monedas se repiten miles de veces. Los nulos quedan como cadena vacía.
 
-    columnas_objetivas = df.select_dtypes(include=["object"]).columns
-    for col in columnas_objetivas:
-        df[col] = df[col].apply(limpiar_valor)
+    Los valores se agrupan por su texto (`str(valor)`, como en la limpieza fila a fila) y no por
+    el valor en sí: `pd.factorize` trataría True, 1 y 1.0 (o False y 0) como el mismo valor.
+    """
+    texto = serie.astype(str).to_numpy(dtype=object)
+    texto[serie.isna().to_numpy()] = None
+    codigos, unicos = pd.factorize(texto)
+    if len(unicos) == 0:
+        return pd.Series("", index=serie.index, dtype="object")
+
+    valores = pd.Series(unicos, dtype="object").str.strip()
+    descartar = (
+        valores.str.lower().str.contains(_PATRON_ERROR)
+        | valores.str.fullmatch(_PATRON_NUMERO)
+        | valores.str.fullmatch(_PATRON_FECHA_CORTA)
+        | valores.str.fullmatch(_PATRON_SOLO_SIMBOLOS)
+    )
 
-    mask = df[columnas_objetivas].apply(lambda row: all(val == "" for val in row), axis=1)
-    df = df[~mask]
+    limpios = (
+        valores.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("utf-8")
+        .str.replace(_PATRON_NO_PERMITIDOS, "", regex=True)
+        .str.replace(_PATRON_ESPACIOS, " ", regex=True)
+        .str.strip()
+    )
+    limpios[descartar | (limpios.str.len() < 2)] = ""
 
-    return df
+    # El código -1 (nulo) toma la última posición, que es la cadena vacía
+    tabla = np.append(limpios.to_numpy(dtype=object), "")
+    return pd.Series(tabla[codigos], index=serie.index, dtype="object")
 
 
 
 # Función para eliminar hora, minutos y segundos usando .str.split() y convertir a datetime
+@medir
 def limpiar_fechas_split(df):
     """
     Elimina la parte de hora, minutos y segundos de las columnas 'checked_at' y 'releaseDate'
@@ -101,6 +133,7 @@ def limpiar_fechas_split(df):
 
 
 
+@medir
 def convertir_columnas_a_entero(df, columnas):
     """
     Convierte columnas numéricas a tipo entero truncando los decimales,
@@ -134,6 +167,7 @@ def convertir_columnas_a_entero(df, columnas):
 
 
 
+@medir
 def convertir_a_booleano(df, columna):
     """
     Convierte una columna del DataFrame a tipo booleano (`True`, `False`, `<NA>`),
@@ -200,6 +234,7 @@ def reporte_nulos(df):
     return df_reporte
 
 
+@medir
 def eliminar_filas_nulas(df, columnas_obligatorias):
     """
     Elimina filas del DataFrame que tengan valores nulos en columnas clave.
@@ -221,6 +256,7 @@ def eliminar_filas_nulas(df, columnas_obligatorias):
  
 
 
+@medir
 def rellenar_nulos_texto(df, columnas):
     """
     Rellena valores nulos en columnas de tipo texto (object) con 'Sin identificar'.
@@ -249,6 +285,7 @@ def rellenar_nulos_texto(df, columnas):
 
 
 
+@medir
 def limpiar_columnas_precio(df):
     """
     Limpia y normaliza las columnas 'trackPrice' y 'collectionPrice':
@@ -283,6 +320,7 @@ def limpiar_columnas_precio(df):
 
 
 
+@medir
 def asignar_id_incremental(df, columna, inicio=1):
     """
     Reemplaza completamente una columna con un ID incremental único.
@@ -310,7 +348,324 @@ def asignar_id_incremental(df, columna, inicio=1):
     return df
 
 
-def procesar_dataframe_maestro(ruta_pickle):
+def _columnas_por_tipo(esquema, df, tipo):
+    return [col for col, reglas in esquema.items() if reglas["tipo"] == tipo and col in df.columns]
+
+
+def _por_valor_unico(serie, convertir, nulo):
+    """
+    Aplica `convertir` (que recibe un Index de valores no nulos) a cada valor distinto de la
+    serie una sola vez, en orden de primera aparición, y reparte el resultado a las filas.
+    Los nulos reciben `nulo`.
+    """
+    codigos, unicos = pd.factorize(serie)
+    convertidos = convertir(pd.Index(unicos, dtype="object"))
+    tabla = pd.Series(convertidos).array
+    resultado = tabla.take(codigos, allow_fill=True, fill_value=nulo)
+    return pd.Series(resultado, index=serie.index)
+
+
+def _a_fecha(serie):
+    """Equivale a `pd.to_datetime(serie.astype(str).str.split("T").str[0], errors="coerce")`."""
+    return _por_valor_unico(
+        serie,
+        lambda unicos: pd.to_datetime(unicos.astype(str).str.split("T").str[0], errors="coerce"),
+        pd.NaT
+    )
+
+
+def _a_entero(serie):
+    """Equivale a `convertir_columnas_a_entero` para una columna: coma decimal → punto y truncado."""
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype("Int64")
+    if pd.api.types.is_float_dtype(serie):
+        numeros = serie
+    else:
+        numeros = pd.to_numeric(serie.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+    numeros = numeros.where(np.isfinite(numeros))
+    return np.trunc(numeros).astype("Int64")
+
+
+def _a_booleano(serie):
+    """Equivale a `convertir_a_booleano` para una columna: "true"/"false" sin distinguir mayúsculas."""
+    if pd.api.types.is_bool_dtype(serie):
+        return serie.astype("boolean")
+
+    def convertir(unicos):
+        texto = unicos.astype(str).str.strip().str.lower()
+        return pd.array(np.where(texto == "true", True, np.where(texto == "false", False, None)), dtype="boolean")
+
+    return _por_valor_unico(serie, convertir, pd.NA).astype("boolean")
+
+
+@medir
+def coercionar_tipos(df, esquema=ESQUEMA_LIMPIEZA, valores_nulos=VALORES_NULOS):
+    """
+    Aplica en una sola pasada el esquema declarativo de columnas (ver `ESQUEMA_LIMPIEZA`)
+    tras la limpieza de texto. Sustituye a la cadena `limpiar_fechas_split`,
+    `convertir_columnas_a_entero`, `convertir_a_booleano`, `eliminar_filas_nulas`,
+    `rellenar_nulos_texto` y la conversión de `limpiar_columnas_precio`, con el mismo resultado.
+
+    Operaciones:
+    - Fechas: se quita la hora y se convierte a datetime64, parseando cada fecha distinta una vez.
+    - Enteros: coma decimal → punto, decimales truncados, tipo `Int64`.
+    - Marcadores de nulo (`valores_nulos`) → `pd.NA` en todas las columnas de texto.
+    - Booleanos: "true"/"false" (sin distinguir mayúsculas) → `boolean`; el resto, nulo.
+    - Precios: a numérico, -1 → NaN. La imputación se hace aparte con `imputar_precios`,
+      porque usa la media de todo el histórico.
+    - Se eliminan las filas con nulos en las columnas obligatorias y se rellenan los
+      nulos de texto con su valor de relleno.
+
+    Parámetros:
+    -----------
+    df : pandas.DataFrame
+        DataFrame con el texto ya limpio (ver `limpieza_total_texto_final`).
+
+    esquema : dict
+        {columna: reglas}. Las columnas que no estén en `df` se ignoran.
+
+    valores_nulos : list[str]
+        Cadenas que se consideran nulas.
+
+    Retorna:
+    --------
+    pandas.DataFrame
+        El DataFrame con los tipos del esquema.
+    """
+    for col in _columnas_por_tipo(esquema, df, "fecha"):
+        df[col] = _a_fecha(df[col])
+
+    for col in _columnas_por_tipo(esquema, df, "int"):
+        df[col] = _a_entero(df[col])
+
+    for col in df.select_dtypes(include=["object"]).columns:
+        df[col] = df[col].where(~df[col].isin(valores_nulos), pd.NA)
+
+    for col in _columnas_por_tipo(esquema, df, "bool"):
+        df[col] = _a_booleano(df[col])
+
+    for col in _columnas_por_tipo(esquema, df, "precio"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").replace(-1, np.nan)
+
+    obligatorias = [col for col, reglas in esquema.items() if reglas.get("obligatoria") and col in df.columns]
+    df = df.dropna(subset=obligatorias)
+
+    for col, reglas in esquema.items():
+        if "relleno" in reglas and col in df.columns:
+            df.loc[:, col] = df[col].astype("object").fillna(reglas["relleno"])
+    return df
+
+
+@medir
+def imputar_precios(df, esquema=ESQUEMA_LIMPIEZA):
+    """
+    Rellena los precios nulos con la media de la columna y redondea a 2 decimales
+    (las columnas con `"imputar": "media"` en el esquema). Imprime estadísticas descriptivas finales.
+
+    Parámetros:
+    -----------
+    df : pandas.DataFrame
+        DataFrame ya procesado por `coercionar_tipos` (con todo el histórico).
+
+    Retorna:
+    --------
+    pandas.DataFrame
+        DataFrame con columnas de precio sin nulos.
+    """
+    columnas_precio = [col for col, reglas in esquema.items()
+                       if reglas.get("imputar") == "media" and col in df.columns]
+
+    for col in columnas_precio:
+        media = df[col].dropna().mean()
+        df.loc[:, col] = df[col].fillna(media).round(2)
+
+    print("\n[GRAFICO] Estadísticas descriptivas de precios:")
+    print(df[columnas_precio].describe())
+
+    return df
+
+
+# Columnas de texto con pocos valores distintos (de unos pocos a unos miles) frente a millones de filas
+COLUMNAS_CATEGORICAS = [
+    "primaryGenreName", "currency", "kind", "country", "trackExplicitness",
+    "collectionExplicitness", "contentAdvisoryRating", "artistName"
+]
+
+
+@medir
+def compactar_categoricas(df, columnas=COLUMNAS_CATEGORICAS, mostrar=True):
+    """
+    Convierte columnas de texto muy repetitivas a tipo `category`: cada valor distinto se guarda
+    una sola vez y las filas solo almacenan un código entero.
+
+    Es un paso opcional tras la limpieza. `procesar_dataframe_maestro` y las funciones del EDA
+    aceptan tanto el DataFrame original como el compactado; las tablas normalizadas salen con los
+    tipos del original (`sin_categorias`), así que la carga y el almacenamiento no ven `category`.
+
+    Parámetros:
+    -----------
+    df : pandas.DataFrame
+        DataFrame limpio.
+
+    columnas : list[str]
+        Columnas a compactar (las que no existan en `df` se ignoran).
+
+    mostrar : bool
+        Si es True, imprime la memoria antes y después de compactar.
+
+    Retorna:
+    --------
+    pandas.DataFrame
+        El DataFrame con las columnas convertidas a `category`.
+    """
+    memoria_antes = df.memory_usage(deep=True).sum()
+    for col in columnas:
+        if col in df.columns and df[col].dtype == "object":
+            df[col] = df[col].astype("category")
+    memoria_despues = df.memory_usage(deep=True).sum()
+
+    if mostrar:
+        print(f"[INFO] Memoria del DataFrame: {memoria_antes / 1024 ** 2:.1f} MB → "
+              f"{memoria_despues / 1024 ** 2:.1f} MB "
+              f"({100 * (1 - memoria_despues / memoria_antes):.1f}% menos)")
+    return df
+
+
+@medir
+def moda_por_clave(df, clave, columnas):
+    """
+    Calcula el valor más frecuente (moda) de cada columna para cada valor de la clave,
+    de forma vectorizada: cuenta por (clave, valor), ordena y se queda con el primero por clave.
+
+    Equivale a `df.groupby(clave)[columnas].agg(lambda x: x.dropna().value_counts().idxmax())`:
+    los nulos no cuentan, en caso de empate gana el valor que aparece antes en `df` (el orden
+    que documenta `value_counts`; su ordenación no estable podía romper algunos empates de
+    otra forma) y las claves sin ningún valor no nulo quedan como nulo.
+
+    Parámetros:
+    -----------
+    df : pandas.DataFrame
+        DataFrame con la clave y las columnas.
+
+    clave : str o list[str]
+        Columna(s) por las que agrupar.
+
+    columnas : list[str]
+        Columnas de las que calcular la moda.
+
+    Retorna:
+    --------
+    pandas.DataFrame
+        Una fila por clave (ordenadas por clave) con la moda de cada columna.
+    """
+    claves = [clave] if isinstance(clave, str) else list(clave)
+    indice = (
+        df[claves].dropna().drop_duplicates()
+        .sort_values(claves).set_index(claves).index
+    )
+
+    resultado = pd.DataFrame(index=indice)
+    for col in columnas:
+        resultado[col] = elegir_moda(contar_valores_por_clave(df, claves, col), claves, col, indice)
+
+    return resultado.reset_index()
+
+
+def contar_valores_por_clave(df, claves, columna, desplazamiento=0):
+    """
+    Cuenta las apariciones no nulas de cada par (clave, valor) y la primera posición en la que
+    aparece (`desplazamiento` + posición en `df`). Es el estado parcial de `moda_por_clave`:
+    los conteos de varios trozos se combinan con `combinar_conteos`.
+    """
+    orden = pd.Series(np.arange(desplazamiento, desplazamiento + len(df)), index=df.index)
+    return (
+        df[claves + [columna]].assign(_orden=orden)
+        .dropna(subset=claves + [columna])
+        .groupby(claves + [columna], sort=False, observed=True)["_orden"]
+        .agg(["size", "min"])
+        .reset_index()
+    )
+
+
+def combinar_conteos(conteos, claves, columna):
+    """Suma los conteos parciales de `contar_valores_por_clave` y conserva la primera posición."""
+    return (
+        pd.concat(conteos, ignore_index=True)
+        .groupby(claves + [columna], sort=False, observed=True)
+        .agg({"size": "sum", "min": "min"})
+        .reset_index()
+    )
+
+
+def elegir_moda(conteos, claves, columna, indice):
+    """Elige, para cada clave de `indice`, el valor con más apariciones (empate: el que aparece antes)."""
+    return (
+        conteos
+        .sort_values(claves + ["size", "min"], ascending=[True] * len(claves) + [False, True], kind="stable")
+        .drop_duplicates(subset=claves, keep="first")
+        .set_index(claves)[columna]
+        .reindex(indice)
+    )
+
+
+# Nombres de columna del DataFrame limpio → nombres del esquema SQL
+COLUMNAS_SQL = {
+    "artistId": "artist_id",
+    "artistName": "artistname",
+    "artistViewUrl": "artistviewurl",
+    "collectionId": "collection_id",
+    "collectionName": "collectionname",
+    "collectionCensoredName": "collectioncensoredname",
+    "releaseDate": "release_date",
+    "collectionExplicitness": "collectionexplicitness",
+    "contentAdvisoryRating": "contentadvisoryrating",
+    "collectionPrice": "collectionprice",
+    "currency": "currency",
+    "trackCount": "trackcount",
+    "discCount": "disccount",
+    "collectionViewUrl": "collectionviewurl",
+    "collectionArtistName": "collectionartistname",
+    "collectionArtistViewUrl": "collectionartistviewurl",
+    "trackId": "track_id",
+    "trackName": "trackname",
+    "trackNumber": "tracknumber",
+    "trackPrice": "trackprice",
+    "discNumber": "discnumber",
+    "trackTimeMillis": "tracktimemillis",
+    "trackExplicitness": "trackexplicitness",
+    "trackViewUrl": "trackviewurl",
+    "isStreamable": "is_streamable",
+    "kind": "kind",
+    "primaryGenreName": "primarygenrename"
+}
+
+COLUMNAS_ALBUM = [
+    "collection_id", "collectionname", "collectioncensoredname", "release_date",
+    "collectionexplicitness", "contentadvisoryrating", "collectionprice", "currency",
+    "trackcount", "disccount", "collectionviewurl",
+    "collectionartistname", "collectionartistviewurl", "artist_id"
+]
+
+COLUMNAS_TRACK = [
+    "track_id", "trackname", "tracknumber", "trackprice", "discnumber", "tracktimemillis",
+    "trackexplicitness", "release_date", "trackviewurl", "is_streamable", "kind",
+    "artist_id", "collection_id", "primarygenrename"
+]
+
+
+def tabla_artistas(df):
+    """
+    Tabla Artist: nombre y URL más frecuentes (`moda_por_clave`) de cada artist_id. Acepta el
+    maestro con sus columnas originales o ya renombradas al esquema SQL.
+    """
+    columnas = ["artist_id", "artistname", "artistviewurl"]
+    originales = {destino: origen for origen, destino in COLUMNAS_SQL.items()}
+    df = df[[col if col in df.columns else originales[col] for col in columnas]].set_axis(columnas, axis=1)
+    return sin_categorias(moda_por_clave(df, "artist_id", columnas[1:]))
+
+
+@medir
+def procesar_dataframe_maestro(ruta_pickle, moda_dimensiones=False, motor="pandas"):
     """
     Carga un DataFrame maestro desde un archivo pickle, lo limpia y separa en tablas normalizadas:
     Artist, Album, Track, Genre, Track_prices, Album_prices.
@@ -319,67 +674,47 @@ def procesar_dataframe_maestro(ruta_pickle):
 
     Parámetros:
     -----------
-    ruta_pickle : str
-        Ruta del archivo pickle con el DataFrame completo.
+    ruta_pickle : str o pandas.DataFrame
+        Ruta del archivo con el DataFrame completo (pickle, Parquet o Arrow, ver `leer_df`), o el
+        propio DataFrame ya cargado.
+
+    moda_dimensiones : bool
+        Si es True, cada atributo de Album y Track toma su valor más frecuente por ID
+        (`moda_por_clave`, como ya se hace con Artist) en lugar del de la primera fila encontrada.
+
+    motor : str
+        "pandas" (por defecto) o "duckdb": las mismas tablas calculadas con consultas SQL
+        multihilo (ver `src.ETL.normalizacion_duckdb.procesar_con_duckdb`).
 
     Retorna:
     --------
     dict
         Diccionario con las tablas limpias separadas por nombre.
     """
+    if motor == "duckdb":
+        from src.ETL.normalizacion_duckdb import procesar_con_duckdb
+        return procesar_con_duckdb(ruta_pickle, moda_dimensiones)
+    if motor != "pandas":
+        raise ValueError(f"Motor de normalización no soportado: {motor}")
+
     # Renombrar columnas para que coincidan con el esquema SQL
-    df = pd.read_pickle(ruta_pickle)
-    df = df.rename(columns={
-        "artistId": "artist_id",
-        "artistName": "artistname",
-        "artistViewUrl": "artistviewurl",
-        "collectionId": "collection_id",
-        "collectionName": "collectionname",
-        "collectionCensoredName": "collectioncensoredname",
-        "releaseDate": "release_date",
-        "collectionExplicitness": "collectionexplicitness",
-        "contentAdvisoryRating": "contentadvisoryrating",
-        "collectionPrice": "collectionprice",
-        "currency": "currency",
-        "trackCount": "trackcount",
-        "discCount": "disccount",
-        "collectionViewUrl": "collectionviewurl",
-        "collectionArtistName": "collectionartistname",
-        "collectionArtistViewUrl": "collectionartistviewurl",
-        "trackId": "track_id",
-        "trackName": "trackname",
-        "trackNumber": "tracknumber",
-        "trackPrice": "trackprice",
-        "discNumber": "discnumber",
-        "trackTimeMillis": "tracktimemillis",
-        "trackExplicitness": "trackexplicitness",
-        "trackViewUrl": "trackviewurl",
-        "isStreamable": "is_streamable",
-        "kind": "kind",
-        "primaryGenreName": "primarygenrename"
-    })
+    df = leer_df(ruta_pickle) if isinstance(ruta_pickle, (str, Path)) else ruta_pickle
+    df = df.rename(columns=COLUMNAS_SQL)
 
     # Tablas principales
-    artist_df = (
-        df.groupby("artist_id")[["artistname", "artistviewurl"]]
-        .agg(lambda x: x.dropna().value_counts().idxmax() if not x.dropna().empty else pd.NA)
-        .reset_index()
-    )
+    artist_df = tabla_artistas(df)
+
+    album_cols = COLUMNAS_ALBUM
+    if moda_dimensiones:
+        album_df = moda_por_clave(df, "collection_id", album_cols[1:])
+    else:
+        album_df = df[album_cols].drop_duplicates(subset=["collection_id"]).copy()
 
-    album_cols = [
-        "collection_id", "collectionname", "collectioncensoredname", "release_date",
-        "collectionexplicitness", "contentadvisoryrating", "collectionprice", "currency",
-        "trackcount", "disccount", "collectionviewurl",
-        "collectionartistname", "collectionartistviewurl", "artist_id"
-    ]
-    album_df = df[album_cols].drop_duplicates(subset=["collection_id"]).copy()
-
-    track_cols = [
-        "track_id", "trackname", "tracknumber", "trackprice", "discnumber", "tracktimemillis",
-        "trackexplicitness", "release_date", "trackviewurl", "is_streamable", "kind",
-        "artist_id", "collection_id", "primarygenrename"
-    ]
-    track_df = df[track_cols].drop_duplicates(subset=["track_id"]).copy()
+    track_cols = COLUMNAS_TRACK
+    if moda_dimensiones:
+        track_df = moda_por_clave(df, "track_id", track_cols[1:])
+    else:
+        track_df = df[track_cols].drop_duplicates(subset=["track_id"]).copy()
 
     genre_df = (
     df[["primarygenrename"]]
@@ -402,7 +737,7 @@ def procesar_dataframe_maestro(ruta_pickle):
         .drop_duplicates(subset=["collection_id", "checked_at"])
     )
 
-    return {
+    tablas = {
         "artist": artist_df,
         "album": album_df,
         "track": track_df,
@@ -410,4 +745,134 @@ def procesar_dataframe_maestro(ruta_pickle):
         "track_prices": track_prices_df,
         "album_prices": album_prices_df
     }
+    # Con el maestro compactado (`compactar_categoricas`), las tablas vuelven a los tipos originales
+    return {nombre: sin_categorias(tabla) for nombre, tabla in tablas.items()}
+
+
+def sin_categorias(df):
+    """Convierte las columnas `category` al tipo de sus categorías (p. ej. `object`)."""
+    categoricas = {col: df[col].cat.categories.dtype for col in df.columns
+                   if isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return df.astype(categoricas) if categoricas else df
+
+
+# Claves primarias de cada tabla normalizada (ver documentacion/itunes_database.sql)
+CLAVES_TABLAS = {
+    "artist": ["artist_id"],
+    "album": ["collection_id"],
+    "track": ["track_id"],
+    "genre": ["primarygenrename"],
+    "track_prices": ["track_id", "checked_at"],
+    "album_prices": ["collection_id", "checked_at"],
+}
+
+TABLAS_NORMALIZADAS = list(CLAVES_TABLAS)
+
+
+@medir
+def fusionar_tablas(existentes, nuevas):
+    """
+    Añade a las tablas ya normalizadas las filas de una ejecución incremental.
+
+    Para cada tabla se concatenan las filas existentes y las nuevas y se eliminan
+    duplicados por su clave primaria conservando la fila existente, igual que hace
+    `ON CONFLICT DO NOTHING` al insertarlas en PostgreSQL.
+
+    Parámetros:
+    -----------
+    existentes : dict
+        Tablas acumuladas de ejecuciones anteriores (ver `procesar_dataframe_maestro`).
+    nuevas : dict
+        Tablas obtenidas solo con los registros nuevos.
 
+    Retorna:
+    --------
+    dict
+        Diccionario con las tablas fusionadas.
+    """
+    tablas = {}
+    for nombre, claves in CLAVES_TABLAS.items():
+        if nombre not in existentes:
+            tablas[nombre] = nuevas[nombre]
+            continue
+        tablas[nombre] = (
+            pd.concat([existentes[nombre], nuevas[nombre]], ignore_index=True)
+            .drop_duplicates(subset=claves, keep="first")
+            .reset_index(drop=True)
+        )
+    return tablas
+
+
+@medir
+def intervalos_precio(observaciones, clave, columna_precio, abiertos=None):
+    """
+    Compacta un historial diario de precios en intervalos (SCD tipo 2): una fila por cada
+    tramo de días consecutivos en los que se observó el mismo precio de un ID. Un día sin
+    observación cierra el tramo (aunque el precio siguiente sea el mismo), así que cada tramo
+    cubre exactamente los días observados entre `valid_from` y `last_checked`.
+
+    Columnas del resultado:
+    - `valid_from`: primera fecha en la que se observó el precio.
+    - `valid_to`: fecha de la siguiente observación tras el tramo (exclusiva); nulo si es el último.
+    - `last_checked`: última fecha en la que se observó el precio.
+    - `existente`: True si el tramo ya estaba en `abiertos` (hay que actualizarlo, no insertarlo).
+
+    Parámetros:
+    -----------
+    observaciones : pandas.DataFrame
+        Filas (clave, precio, checked_at), p. ej. las tablas `track_prices` / `album_prices`.
+
+    clave : str
+        Columna ID ("track_id" o "collection_id").
+
+    columna_precio : str
+        Columna de precio ("trackprice" o "collectionprice").
+
+    abiertos : pandas.DataFrame, opcional
+        Último tramo conocido (sin `valid_to`) de cada ID, con columnas clave, precio,
+        `valid_from` y `last_checked`. Las observaciones anteriores a su `last_checked`
+        se ignoran, porque ya están cubiertas por el historial existente.
+
+    Retorna:
+    --------
+    pandas.DataFrame
+        Tramos ordenados por clave y `valid_from`.
+    """
+    datos = (
+        observaciones[[clave, columna_precio, "checked_at"]]
+        .dropna()
+        .drop_duplicates(subset=[clave, "checked_at"])
+        .assign(checked_at=lambda d: pd.to_datetime(d["checked_at"]).dt.normalize(),
+                last_checked=lambda d: d["checked_at"], existente=False)
+    )
+
+    if abiertos is not None and not abiertos.empty:
+        abiertos = abiertos.assign(
+            checked_at=pd.to_datetime(abiertos["valid_from"]),
+            last_checked=pd.to_datetime(abiertos["last_checked"]),
+            existente=True
+        )[[clave, columna_precio, "checked_at", "last_checked", "existente"]]
+        ultimo = datos[clave].map(abiertos.set_index(clave)["last_checked"])
+        datos = pd.concat([abiertos, datos[~(datos["checked_at"] <= ultimo)]], ignore_index=True)
+
+    datos = datos.sort_values([clave, "checked_at", "existente"], ascending=[True, True, False], kind="stable")
+    precio = datos[columna_precio].astype(float).round(2)
+    nuevo_id = datos[clave].ne(datos[clave].shift())
+    hueco = (datos["checked_at"] - datos["last_checked"].shift()) > pd.Timedelta(days=1)
+    cambio = nuevo_id | precio.ne(precio.shift()) | hueco
+
+    intervalos = (
+        datos.assign(_tramo=cambio.cumsum())
+        .groupby("_tramo", sort=True)
+        .agg(**{
+            clave: (clave, "first"),
+            columna_precio: (columna_precio, "first"),
+            "valid_from": ("checked_at", "min"),
+            "last_checked": ("last_checked", "max"),
+            "existente": ("existente", "any"),
+        })
+        .reset_index(drop=True)
+    )
+    siguiente = intervalos["valid_from"].shift(-1)
+    intervalos["valid_to"] = siguiente.where(intervalos[clave].eq(intervalos[clave].shift(-1)))
+    return intervalos[[clave, columna_precio, "valid_from", "valid_to", "last_checked", "existente"]]
@@ -0,0 +1,282 @@
+import atexit
+import cProfile
+import csv
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import psutil
+
+try:
+    import resource
+except ImportError:  # Windows: el pico de memoria lo da psutil (peak_wset)
+    resource = None
+
+# Estado global de la instrumentación: desactivada por defecto
+_ESTADO = {
+    "activa": False,
+    "registros": [],
+    "ruta_informe": None,
+    "perfil": None,
+    "carpeta_perfil": None,
+    "tracemalloc": False,
+}
+
+_MB = 1024 * 1024
+
+# Etapas en curso de cada hilo (las funciones medidas pueden ejecutarse en varios hilos a la vez)
+_LOCAL = threading.local()
+
+
+def _pila() -> list:
+    if not hasattr(_LOCAL, "pila"):
+        _LOCAL.pila = []
+    return _LOCAL.pila
+
+
+def instrumentacion_activa() -> bool:
+    """True si se están midiendo las etapas."""
+    return _ESTADO["activa"]
+
+
+def activar_instrumentacion(ruta_informe: str = None, perfil: str = None, carpeta_perfil: str = None,
+                            memoria_python: bool = False) -> None:
+    """
+    Activa la medición de las funciones decoradas con `medir` y de los bloques `medir_bloque`.
+
+    Por cada etapa se registra: tiempo real y de CPU, memoria del proceso (RSS) al empezar y
+    al terminar, pico de RSS del proceso hasta ese momento, filas de entrada y de salida y,
+    con `memoria_python`, el pico y la variación de memoria reservada por Python (tracemalloc,
+    que ralentiza bastante la ejecución).
+
+    Parámetros:
+    -----------
+    ruta_informe : str, opcional
+        Archivo .json o .csv donde se escribe el informe al llamar a `finalizar_instrumentacion`
+        (o al terminar el proceso). Sin ruta, solo se imprime el resumen.
+    perfil : str, opcional
+        Nombre de una etapa (función o bloque) a perfilar con cProfile.
+    carpeta_perfil : str, opcional
+        Carpeta del volcado `perfil_<etapa>.prof`. Por defecto, la del informe o la actual.
+    memoria_python : bool
+        Activa tracemalloc.
+    """
+    _ESTADO.update({
+        "activa": True,
+        "registros": [],
+        "ruta_informe": ruta_informe,
+        "perfil": perfil,
+        "carpeta_perfil": carpeta_perfil or (os.path.dirname(ruta_informe) if ruta_informe else ".") or ".",
+        "tracemalloc": memoria_python,
+    })
+    if memoria_python and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    atexit.register(finalizar_instrumentacion)
+    print("[INFO] Instrumentación activada" + (f" (informe: {ruta_informe})" if ruta_informe else ""))
+
+
+def activar_desde_entorno() -> None:
+    """
+    Activa la instrumentación si está definida la variable de entorno ITUNES_INSTRUMENTACION
+    (ruta del informe). ITUNES_PERFIL indica la etapa a perfilar e ITUNES_MEMORIA_PYTHON=1
+    activa tracemalloc.
+    """
+    ruta = os.getenv("ITUNES_INSTRUMENTACION")
+    if ruta:
+        activar_instrumentacion(ruta, perfil=os.getenv("ITUNES_PERFIL"),
+                                memoria_python=os.getenv("ITUNES_MEMORIA_PYTHON") == "1")
+
+
+def _contar_filas(objeto):
+    """Filas de un DataFrame/Series, suma de las de un dict de tablas o las del primer elemento de una tupla."""
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        return len(objeto)
+    if isinstance(objeto, dict):
+        filas = [len(v) for v in objeto.values() if isinstance(v, (pd.DataFrame, pd.Series))]
+        return sum(filas) if filas else None
+    if isinstance(objeto, tuple) and objeto:
+        return _contar_filas(objeto[0])
+    return None
+
+
+def _rss_pico_mb():
+    memoria = psutil.Process().memory_info()
+    if hasattr(memoria, "peak_wset"):
+        return memoria.peak_wset / _MB
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kB en Linux
+    return None
+
+
+class _Medicion:
+    """Mediciones de una etapa en curso; `filas_salida` se puede fijar desde el bloque."""
+
+    def __init__(self, nombre: str, filas_entrada=None):
+        self.nombre = nombre
+        self.filas_entrada = filas_entrada
+        self.filas_salida = None
+        self.pico_python = 0
+
+    def iniciar(self) -> None:
+        self.nivel = len(_pila())
+        self.inicio = datetime.now()
+        self.rss_inicio = psutil.Process().memory_info().rss
+        if _ESTADO["tracemalloc"]:
+            actual, pico = tracemalloc.get_traced_memory()
+            if _pila():
+                padre = _pila()[-1]
+                padre.pico_python = max(padre.pico_python, pico)
+            tracemalloc.reset_peak()
+            self.python_inicio = actual
+        self.perfil = cProfile.Profile() if self.nombre == _ESTADO["perfil"] else None
+        _pila().append(self)
+        self.t_real = time.perf_counter()
+        self.t_cpu = time.process_time()
+        if self.perfil is not None:
+            self.perfil.enable()
+
+    def terminar(self, error=None) -> None:
+        if self.perfil is not None:
+            self.perfil.disable()
+        tiempo = time.perf_counter() - self.t_real
+        cpu = time.process_time() - self.t_cpu
+        _pila().pop()
+        rss_fin = psutil.Process().memory_info().rss
+        rss_pico = _rss_pico_mb()
+        registro = {
+            "etapa": self.nombre,
+            "nivel": self.nivel,
+            "inicio": self.inicio.isoformat(timespec="milliseconds"),
+            "tiempo_s": round(tiempo, 4),
+            "cpu_s": round(cpu, 4),
+            "rss_inicio_mb": round(self.rss_inicio / _MB, 1),
+            "rss_fin_mb": round(rss_fin / _MB, 1),
+            "rss_delta_mb": round((rss_fin - self.rss_inicio) / _MB, 1),
+            "rss_pico_mb": round(rss_pico, 1) if rss_pico is not None else None,
+            "filas_entrada": self.filas_entrada,
+            "filas_salida": self.filas_salida,
+            "error": error,
+        }
+        if _ESTADO["tracemalloc"]:
+            actual, pico = tracemalloc.get_traced_memory()
+            self.pico_python = max(self.pico_python, pico)
+            if _pila():
+                padre = _pila()[-1]
+                padre.pico_python = max(padre.pico_python, self.pico_python)
+            tracemalloc.reset_peak()
+            registro["python_delta_mb"] = round((actual - self.python_inicio) / _MB, 1)
+            registro["python_pico_mb"] = round((self.pico_python - self.python_inicio) / _MB, 1)
+        _ESTADO["registros"].append(registro)
+
+        if self.perfil is not None:
+            os.makedirs(_ESTADO["carpeta_perfil"], exist_ok=True)
+            ruta = os.path.join(_ESTADO["carpeta_perfil"], f"perfil_{self.nombre}.prof")
+            self.perfil.dump_stats(ruta)
+            print(f"[INFO] Perfil de '{self.nombre}' guardado en {ruta}")
+
+
+@contextmanager
+def medir_bloque(nombre: str, filas_entrada=None):
+    """
+    Mide un bloque de código como una etapa. Devuelve la medición (o None si la instrumentación
+    está desactivada) para poder fijar `filas_salida`:
+
+        with medir_bloque("carga_bd", filas_entrada=len(df)) as m:
+            ...
+            if m: m.filas_salida = insertadas
+    """
+    if not _ESTADO["activa"]:
+        yield None
+        return
+    medicion = _Medicion(nombre, filas_entrada)
+    medicion.iniciar()
+    try:
+        yield medicion
+    except BaseException as e:
+        medicion.terminar(error=type(e).__name__)
+        raise
+    medicion.terminar()
+
+
+def medir(funcion=None, *, nombre: str = None):
+    """
+    Decorador que mide cada llamada a la función como una etapa (con el nombre de la función
+    salvo que se indique otro). Las filas de entrada son las del primer argumento y las de salida
+    las del resultado (DataFrame, Series, dict de tablas o tupla cuyo primer elemento lo sea).
+
+    Con la instrumentación desactivada solo añade una comprobación por llamada.
+    """
+    if funcion is None:
+        return lambda f: medir(f, nombre=nombre)
+    etiqueta = nombre or funcion.__name__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not _ESTADO["activa"]:
+            return funcion(*args, **kwargs)
+        medicion = _Medicion(etiqueta, _contar_filas(args[0]) if args else None)
+        medicion.iniciar()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            medicion.terminar(error=type(e).__name__)
+            raise
+        medicion.filas_salida = _contar_filas(resultado)
+        medicion.terminar()
+        return resultado
+
+    return envoltura
+
+
+def informe_instrumentacion() -> pd.DataFrame:
+    """Registros medidos hasta el momento, en orden de finalización."""
+    return pd.DataFrame(_ESTADO["registros"])
+
+
+def guardar_informe(ruta: str) -> None:
+    """Escribe los registros en un archivo .json o .csv."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    registros = _ESTADO["registros"]
+    if ruta.endswith(".csv"):
+        columnas = list(dict.fromkeys(clave for registro in registros for clave in registro))
+        with open(ruta, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=columnas)
+            escritor.writeheader()
+            escritor.writerows(registros)
+    else:
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(registros, f, indent=2, ensure_ascii=False)
+
+
+def finalizar_instrumentacion() -> pd.DataFrame:
+    """
+    Desactiva la instrumentación, imprime el resumen por etapa (de mayor a menor tiempo) y
+    escribe el informe si se indicó una ruta. Se llama sola al terminar el proceso.
+    """
+    if not _ESTADO["activa"]:
+        return informe_instrumentacion()
+    _ESTADO["activa"] = False
+    atexit.unregister(finalizar_instrumentacion)
+    if _ESTADO["tracemalloc"]:
+        tracemalloc.stop()
+
+    informe = informe_instrumentacion()
+    if not informe.empty:
+        resumen = (
+            informe.groupby("etapa", sort=False)
+            .agg(llamadas=("etapa", "size"), tiempo_s=("tiempo_s", "sum"), cpu_s=("cpu_s", "sum"),
+                 rss_delta_mb=("rss_delta_mb", "sum"), rss_pico_mb=("rss_pico_mb", "max"))
+            .sort_values("tiempo_s", ascending=False)
+        )
+        print("\n[INFO] Instrumentación por etapa:")
+        print(resumen.to_string())
+    if _ESTADO["ruta_informe"]:
+        guardar_informe(_ESTADO["ruta_informe"])
+        print(f"[OK] Informe de instrumentación guardado en {_ESTADO['ruta_informe']}")
+    return informe
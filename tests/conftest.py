@@ -0,0 +1,174 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+
+from src.ETL.esquema import COLUMNAS_ITUNES
+
+# DSN de una base de mantenimiento (p. ej. "host=localhost user=postgres dbname=postgres"). Las pruebas
+# de PostgreSQL crean y borran su propia base; sin esta variable se omiten.
+DSN_PRUEBAS = os.getenv("ITUNES_TEST_DB")
+BD_PRUEBAS = "itunes_pruebas"
+
+NOMBRES = ["The Beatles", "Beyoncé", "AC/DC", "Sigur Rós", "123", "#¿NOMBRE?", "", "Ñandú & Co.",
+           "  spaced   out ", "09-may", "?", "Café  Tacvba"]
+GENEROS = ["Pop", "Rock", "Hip-Hop/Rap", "Música Mexicana", "Jazz", "Soundtrack"]
+
+
+def generar_dia_raw(dia: date, filas: int = 2000, semilla: int = 0) -> pd.DataFrame:
+    """
+    Genera un día de datos brutos con el formato de los CSV de `data/data_raw`: IDs repetidos entre
+    días, texto sucio (espacios, marcadores de error, Unicode), nulos y precios -1.
+    """
+    rng = np.random.default_rng(semilla)
+    tid = rng.integers(1, filas * 2, filas)
+    art = tid % (filas // 10 + 1)
+    col = tid % (filas // 3 + 1)
+    opcional = rng.random(filas) < 0.1
+    return pd.DataFrame({
+        "wrapperType": "track",
+        "kind": rng.choice(["song", "music-video", "feature-movie"], filas, p=[0.9, 0.08, 0.02]),
+        "artistId": art, "collectionId": col, "trackId": tid,
+        "artistName": [f"{NOMBRES[(a + rng.integers(0, 2)) % len(NOMBRES)]} {a % 50}" if a % 7
+                       else NOMBRES[a % len(NOMBRES)] for a in art],
+        "collectionName": [f"Álbum {c % 400}" for c in col],
+        "trackName": [f"Canción #{t}" for t in tid],
+        "collectionCensoredName": [f"Album {c % 400}" for c in col],
+        "trackCensoredName": [f"Song {t}" for t in tid],
+        "artistViewUrl": [f"https://music.apple.com/us/artist/{a}" for a in art],
+        "collectionViewUrl": [f"https://music.apple.com/us/album/{c}" for c in col],
+        "trackViewUrl": [f"https://music.apple.com/us/album/{c}?i={t}" for c, t in zip(col, tid)],
+        "previewUrl": np.where(rng.random(filas) < 0.05, None, "https://audio"),
+        "artworkUrl30": "https://a30", "artworkUrl60": "https://a60", "artworkUrl100": "https://a100",
+        "collectionPrice": rng.choice([9.99, 10.99, -1, np.nan, 5.0], filas),
+        "trackPrice": rng.choice([1.29, 0.99, -1, np.nan], filas),
+        "releaseDate": rng.choice(["2020-01-01T08:00:00Z", "1999-05-03T07:00:00Z", "2024-11-11T12:00:00Z", None],
+                                  filas, p=[0.4, 0.3, 0.29, 0.01]),
+        "collectionExplicitness": rng.choice(["notExplicit", "explicit", "cleaned"], filas),
+        "trackExplicitness": rng.choice(["notExplicit", "explicit", "cleaned"], filas),
+        "discCount": 1, "discNumber": 1,
+        "trackCount": rng.integers(1, 30, filas), "trackNumber": rng.integers(1, 30, filas),
+        "trackTimeMillis": np.where(rng.random(filas) < 0.01, np.nan, rng.integers(1000, 10**6, filas)),
+        "country": "USA", "currency": "USD",
+        "primaryGenreName": rng.choice(GENEROS, filas),
+        "isStreamable": rng.choice(np.array([True, False, None], dtype=object), filas, p=[0.8, 0.19, 0.01]),
+        "collectionArtistId": np.where(opcional, rng.integers(1, 50, filas), np.nan),
+        "collectionArtistName": np.where(opcional, "Various Artists", None),
+        "collectionArtistViewUrl": np.where(opcional, "https://music.apple.com/us/artist/va", None),
+        "contentAdvisoryRating": np.where(rng.random(filas) < 0.2, "Explicit", None),
+        "checked_at": dia.isoformat(),
+    })[list(COLUMNAS_ITUNES)]
+
+
+def generar_csv_raw(carpeta, dias: int = 3, filas: int = 2000, inicio: date = date(2025, 1, 1)) -> list:
+    """Escribe `dias` archivos `itunes_<fecha>.csv` en `carpeta` y devuelve sus rutas, en orden."""
+    carpeta.mkdir(parents=True, exist_ok=True)
+    rutas = []
+    for i in range(dias):
+        dia = inicio + timedelta(days=i)
+        ruta = carpeta / f"itunes_{dia.isoformat()}.csv"
+        generar_dia_raw(dia, filas, semilla=i).to_csv(ruta, index=False)
+        rutas.append(ruta)
+    return rutas
+
+
+@pytest.fixture
+def archivos_raw(tmp_path):
+    return generar_csv_raw(tmp_path / "data_raw")
+
+
+def _conectar_mantenimiento():
+    conn = psycopg2.connect(DSN_PRUEBAS)
+    conn.autocommit = True
+    return conn
+
+
+@pytest.fixture
+def conexion_vacia():
+    """Conexión a una base PostgreSQL vacía, creada para la prueba y borrada al terminar."""
+    if not DSN_PRUEBAS:
+        pytest.skip("ITUNES_TEST_DB no está definida")
+    admin = _conectar_mantenimiento()
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {BD_PRUEBAS} WITH (FORCE)")
+        cursor.execute(f"CREATE DATABASE {BD_PRUEBAS}")
+    conn = psycopg2.connect(DSN_PRUEBAS, dbname=BD_PRUEBAS)
+    try:
+        yield conn
+    finally:
+        conn.close()
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {BD_PRUEBAS} WITH (FORCE)")
+        admin.close()
+
+
+@pytest.fixture
+def conexion_bd(conexion_vacia):
+    """Conexión a una base de prueba con todas las migraciones aplicadas."""
+    from src.ETL.migraciones import aplicar_migraciones
+
+    aplicar_migraciones(conexion_vacia)
+    return conexion_vacia
+
+
+@pytest.fixture
+def config_bd(conexion_bd):
+    """Datos de conexión a la base de prueba (migrada) con las claves de `main_ETL.config_db`."""
+    dsn = psycopg2.extensions.parse_dsn(DSN_PRUEBAS)
+    return {"dbname": BD_PRUEBAS, "user": dsn.get("user"), "password": dsn.get("password"),
+            "host": dsn.get("host", "localhost"), "port": dsn.get("port", "5432")}
+
+
+def limpiar_archivos(archivos) -> pd.DataFrame:
+    """DataFrame limpio de `archivos` con los mismos pasos que `main_ETL` (por archivo y globales)."""
+    from main_ETL import completar_limpieza, limpiar_lote
+    from src.ETL.esquema import COLUMNAS_ETL
+    from src.ETL.file_utils import cargar_datos_itunes
+
+    lotes = [limpiar_lote(cargar_datos_itunes(columnas=COLUMNAS_ETL, archivos=[a])) for a in archivos]
+    return completar_limpieza(pd.concat(lotes, ignore_index=True))
+
+
+@pytest.fixture
+def maestro_limpio(archivos_raw):
+    return limpiar_archivos(archivos_raw)
+
+
+@pytest.fixture
+def ejecutar_etl(tmp_path, monkeypatch):
+    """
+    Ejecuta `main_ETL.main()` sobre los archivos brutos indicados con las carpetas de salida en
+    `tmp_path` y sin base de datos: devuelve las tablas que se habrían cargado en cada ejecución
+    (concatenando las llamadas a `cargar_en_postgres`, que en modo por lotes es una por parte).
+    """
+    import main_ETL
+
+    carpeta = tmp_path / "data_limpio"
+    for nombre, ruta in {
+        "CARPETA_LIMPIO": carpeta,
+        "CARPETA_LOTES": carpeta / "por_archivo",
+        "RUTA_MAESTRO": carpeta / "itunes_limpio",
+        "RUTA_MANIFIESTO": carpeta / "manifiesto_etl.json",
+        "CARPETA_CHECKPOINTS": carpeta / "checkpoints",
+        "CARPETA_MAESTRO_LOTES": carpeta / "itunes_limpio_lotes",
+        "CARPETA_TABLAS_LOTES": carpeta / "tablas_por_lotes",
+        "RUTA_CACHE_CLAVES": carpeta / "cache_claves.pkl",
+        "CARPETA_CUARENTENA": carpeta / "cuarentena",
+    }.items():
+        monkeypatch.setattr(main_ETL, nombre, str(ruta))
+
+    cargas = []
+    monkeypatch.setattr(main_ETL, "cargar_en_postgres", lambda tablas, *args, **kwargs: cargas.append(tablas))
+
+    def ejecutar(archivos, *opciones):
+        monkeypatch.setattr(main_ETL, "listar_archivos_raw", lambda *args, **kwargs: [str(a) for a in archivos])
+        monkeypatch.setattr("sys.argv", ["main_ETL.py", *opciones])
+        cargas.clear()
+        main_ETL.main()
+        return {nombre: pd.concat([carga[nombre] for carga in cargas]) for nombre in cargas[0]} if cargas else {}
+
+    ejecutar.carpeta = str(carpeta)
+    return ejecutar
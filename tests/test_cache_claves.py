@@ -0,0 +1,59 @@
+from datetime import date
+
+import pandas as pd
+
+import main_ETL
+from main_ETL import ESQUEMA_COLUMNAS, cargar_en_postgres
+from src.ETL.cache_claves import CacheClaves, huellas_filas
+from src.ETL.transform import procesar_dataframe_maestro
+
+
+def test_huellas_no_dependen_del_tipo():
+    base = pd.DataFrame({"id": [1, 2, 3], "precio": [0.99, None, 1.29], "fecha": pd.to_datetime(["2020-01-01"] * 3),
+                         "explicito": [True, None, False], "nombre": ["a", None, "c"]})
+    otros = pd.DataFrame({
+        "id": pd.array([1, 2, 3], dtype="Int64"),
+        "precio": pd.array([0.99, None, 1.29], dtype="Float64"),
+        "fecha": pd.Series([date(2020, 1, 1)] * 3, dtype=object),
+        "explicito": pd.array([True, None, False], dtype="boolean"),
+        "nombre": pd.Series(["a", None, "c"], dtype="category"),
+    })
+    assert (huellas_filas(base, list(base.columns)) == huellas_filas(otros, list(base.columns))).all()
+    assert (huellas_filas(base, ["id"]) != huellas_filas(base.assign(id=[1, 2, 4]), ["id"])).any()
+
+
+def test_cambios_ignorados_por_do_nothing_no_se_reenvian(maestro_limpio, config_bd, conexion_bd, tmp_path,
+                                                          monkeypatch):
+    monkeypatch.setattr(main_ETL, "RUTA_CACHE_CLAVES", str(tmp_path / "cache_claves.pkl"))
+    tablas = procesar_dataframe_maestro(maestro_limpio)
+    cargar_en_postgres({nombre: df.copy() for nombre, df in tablas.items()}, config_bd)
+
+    # Lo que hay en la base tiene la huella de lo enviado (mismos valores con los tipos de psycopg2)
+    cache = CacheClaves(main_ETL.RUTA_CACHE_CLAVES)
+    for nombre in ["artist", "album", "track"]:
+        columnas = ESQUEMA_COLUMNAS[nombre]
+        en_bd = pd.read_sql(f"SELECT {', '.join(columnas)} FROM {nombre}", conexion_bd)
+        registradas = cache.tablas[nombre]["claves"].set_index("clave")["huella"]
+        assert (huellas_filas(en_bd, columnas) == registradas.loc[en_bd[columnas[0]]].to_numpy()).all(), nombre
+
+    # Un artista con otro nombre: con COPY (DO NOTHING) la base no cambia y no se reenvía en cada carga
+    cambiadas = {nombre: df.copy() for nombre, df in tablas.items()}
+    cambiadas["artist"].loc[cambiadas["artist"].index[0], "artistname"] = "Otro nombre"
+    enviadas = []
+    insertar = main_ETL.insertar_dataframe
+    monkeypatch.setattr(main_ETL, "insertar_dataframe",
+                        lambda df, tabla, *args, **kwargs: enviadas.append((tabla, len(df))) or
+                        insertar(df, tabla, *args, **kwargs))
+    for _ in range(2):
+        enviadas.clear()
+        cargar_en_postgres({nombre: df.copy() for nombre, df in cambiadas.items()}, config_bd)
+        assert dict(enviadas)["artist"] == 0
+
+    # Con upsert sí se envía (y se actualiza); después, ya nada
+    for esperadas in [1, 0]:
+        enviadas.clear()
+        cargar_en_postgres({nombre: df.copy() for nombre, df in cambiadas.items()}, config_bd, metodo="upsert")
+        assert dict(enviadas)["artist"] == esperadas
+    with conexion_bd.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM artist WHERE artistname = 'Otro nombre'")
+        assert cursor.fetchone()[0] == 1
@@ -0,0 +1,103 @@
+import json
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from src.ETL.esquema import COLUMNAS_ITUNES
+from src.ETL.extract import decodificar_resultados
+
+HOY = date(2025, 1, 1)
+
+
+def registro(i):
+    """Registro sintético con los campos que devuelve la API de iTunes para `media=music`."""
+    return {
+        "wrapperType": "track", "kind": "song", "artistId": 100 + i % 50,
+        "collectionId": 1000 + i % 300, "trackId": 10_000 + i,
+        "artistName": f"Artista {i % 50}", "collectionName": f"Álbum {i % 300}",
+        "trackName": f"Canción {i}", "collectionCensoredName": f"Album {i % 300}",
+        "trackCensoredName": f"Cancion {i}", "artistViewUrl": f"https://music.apple.com/us/artist/{i % 50}",
+        "collectionViewUrl": f"https://music.apple.com/us/album/{i % 300}",
+        "trackViewUrl": f"https://music.apple.com/us/album/{i % 300}?i={i}",
+        "previewUrl": f"https://audio.itunes.apple.com/{i}.m4a",
+        "artworkUrl30": "https://is1.mzstatic.com/30x30bb.jpg",
+        "artworkUrl60": "https://is1.mzstatic.com/60x60bb.jpg",
+        "artworkUrl100": "https://is1.mzstatic.com/100x100bb.jpg",
+        "collectionPrice": 9.99, "trackPrice": 1.29, "releaseDate": "2020-01-01T08:00:00Z",
+        "collectionExplicitness": "notExplicit", "trackExplicitness": "notExplicit",
+        "discCount": 1, "discNumber": 1, "trackCount": 12, "trackNumber": i % 12 + 1,
+        "trackTimeMillis": 200_000 + i, "country": "USA", "currency": "USD",
+        "primaryGenreName": "Pop", "isStreamable": True,
+    }
+
+
+def respuestas(n_respuestas, registros_por_respuesta):
+    """Cuerpos JSON crudos, para que ambos métodos incluyan el mismo coste de parseo."""
+    return [json.dumps({"results": [registro(r * registros_por_respuesta + i) for i in range(registros_por_respuesta)]})
+            for r in range(n_respuestas)]
+
+
+def con_json_normalize(cuerpos):
+    """Decodificación anterior: `pd.json_normalize` por respuesta + `pd.concat`."""
+    dfs = []
+    for cuerpo in cuerpos:
+        df = pd.json_normalize(json.loads(cuerpo)["results"])
+        df["checked_at"] = HOY
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def con_decodificador(cuerpos):
+    return decodificar_resultados([json.loads(cuerpo)["results"] for cuerpo in cuerpos], checked_at=HOY)
+
+
+def test_decodificador_mismos_valores_que_json_normalize():
+    cuerpos = respuestas(5, 40)
+    # Registros sin campos opcionales y con nulos, como los que devuelve la API
+    extra = [{**registro(1), "trackPrice": None, "isStreamable": None},
+             {k: v for k, v in registro(2).items() if k != "previewUrl"}]
+    cuerpos.append(json.dumps({"results": extra}))
+
+    obtenido = con_decodificador(cuerpos)
+    esperado = con_json_normalize(cuerpos)
+
+    assert list(obtenido.columns) == list(COLUMNAS_ITUNES)
+    assert len(obtenido) == len(esperado)
+    for columna in esperado.columns:
+        pd.testing.assert_series_equal(obtenido[columna].astype(object).where(obtenido[columna].notna(), None),
+                                       esperado[columna].astype(object).where(esperado[columna].notna(), None),
+                                       check_names=False)
+    # Columnas tipadas en lugar de `object`
+    assert obtenido["trackId"].dtype == "Int64"
+    assert obtenido["isStreamable"].dtype == "boolean"
+    assert obtenido["trackPrice"].dtype == "float64"
+    # Las columnas que no vienen en ninguna respuesta quedan a nulo
+    assert obtenido["collectionArtistId"].isna().all()
+
+
+def test_decodificador_sin_registros():
+    assert decodificar_resultados([[], []]).empty
+
+
+def test_decodificador_tipos_inesperados_usa_json_normalize(capsys):
+    df = decodificar_resultados([[{**registro(0), "trackId": "no-es-un-entero"}]], checked_at=HOY)
+    assert df.loc[0, "trackId"] == "no-es-un-entero"
+    assert "[ADVERTENCIA]" in capsys.readouterr().out
+
+
+@pytest.mark.benchmark
+def test_decodificador_mas_rapido_que_json_normalize():
+    cuerpos = respuestas(97, 200)
+    tiempos = {}
+    for nombre, funcion in [("json_normalize", con_json_normalize), ("decodificar_resultados", con_decodificador)]:
+        mejores = []
+        for _ in range(5):
+            inicio = time.perf_counter()
+            funcion(cuerpos)
+            mejores.append(time.perf_counter() - inicio)
+        tiempos[nombre] = min(mejores)
+    print(f"[INFO] json_normalize {tiempos['json_normalize']:.3f}s | "
+          f"decodificar_resultados {tiempos['decodificar_resultados']:.3f}s")
+    assert tiempos["decodificar_resultados"] < tiempos["json_normalize"]
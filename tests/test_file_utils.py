@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from src.ETL.esquema import COLUMNAS_ETL
+from src.ETL.file_utils import _leer_csv_itunes, cargar_datos_itunes
+
+
+def leer_con_pandas(ruta, columnas):
+    return pd.read_csv(ruta, usecols=columnas)[columnas]
+
+
+@pytest.mark.parametrize("columnas", [None, COLUMNAS_ETL])
+def test_lector_tipado_igual_que_read_csv(archivos_raw, columnas):
+    for archivo in archivos_raw:
+        obtenido = _leer_csv_itunes(archivo, columnas)
+        pd.testing.assert_frame_equal(obtenido, leer_con_pandas(archivo, list(obtenido.columns)))
+
+
+def test_lector_tipado_columnas_sin_nulos_y_vacias(tmp_path, archivos_raw):
+    # Enteros y booleanos sin nulos → int64/bool; columnas de texto vacías → float64, como pandas
+    df = pd.read_csv(archivos_raw[0])
+    df = df.assign(trackTimeMillis=df["trackTimeMillis"].fillna(1).astype("int64"),
+                   isStreamable=df["isStreamable"].fillna(False).astype(bool),
+                   contentAdvisoryRating=None)
+    ruta = tmp_path / "itunes_2025-02-01.csv"
+    df.to_csv(ruta, index=False)
+
+    obtenido = _leer_csv_itunes(ruta)
+    pd.testing.assert_frame_equal(obtenido, pd.read_csv(ruta))
+    assert obtenido["trackTimeMillis"].dtype == "int64"
+    assert obtenido["isStreamable"].dtype == bool
+    assert obtenido["contentAdvisoryRating"].dtype == "float64"
+
+
+def test_lector_tipado_mantiene_texto_numerico(tmp_path):
+    # Diferencia intencionada con pd.read_csv: un texto que parece número sigue siendo texto
+    ruta = tmp_path / "itunes_2025-02-01.csv"
+    pd.DataFrame({"trackId": [1, 2], "trackName": ["1989", "1989"]}).to_csv(ruta, index=False)
+    obtenido = _leer_csv_itunes(ruta)
+    assert obtenido["trackName"].tolist() == ["1989", "1989"]
+    assert pd.read_csv(ruta)["trackName"].dtype == "int64"
+
+
+def test_lector_tipado_relee_sin_tipos_si_no_encaja(tmp_path, capsys):
+    ruta = tmp_path / "itunes_2025-02-01.csv"
+    pd.DataFrame({"trackId": [1, "abc"], "trackPrice": [0.99, 1.29]}).to_csv(ruta, index=False)
+    obtenido = _leer_csv_itunes(ruta)
+    pd.testing.assert_frame_equal(obtenido, pd.read_csv(ruta))
+    assert "[ADVERTENCIA]" in capsys.readouterr().out
+
+
+def test_cargar_datos_itunes_concatena_en_el_orden_indicado(archivos_raw):
+    obtenido = cargar_datos_itunes(archivos=list(reversed(archivos_raw)), columnas=COLUMNAS_ETL)
+    esperado = pd.concat([leer_con_pandas(a, list(obtenido.columns)) for a in reversed(archivos_raw)],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(obtenido, esperado)
@@ -0,0 +1,102 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.ETL.esquema import COLUMNAS_ETL
+from src.ETL.file_utils import cargar_datos_itunes
+from src.ETL.transform import limpieza_total_texto_final
+
+
+def limpieza_fila_a_fila(df):
+    """Implementación anterior de `limpieza_total_texto_final` (un `apply` por valor), como referencia."""
+    def limpiar_valor(val):
+        if pd.isna(val):
+            return ""
+
+        val = str(val).strip()
+
+        if any(pat in val.lower() for pat in ["¿", "¡", "nombre", "valor"]):
+            return ""
+
+        if re.fullmatch(r"\.*\s*\d+(\.\d+)?\s*\.*", val):
+            return ""
+
+        if re.fullmatch(r"\d{1,2}-[a-zA-Z]{3}", val):
+            return ""
+
+        if re.fullmatch(r"[^\w]*", val):
+            return ""
+
+        val = unicodedata.normalize("NFKD", val).encode("ascii", "ignore").decode("utf-8")
+        val = re.sub(r"[^\w\s.,'&!?-]", "", val)
+        val = re.sub(r"\s+", " ", val).strip()
+
+        if len(val) < 2:
+            return ""
+
+        return val
+
+    columnas_objetivas = df.select_dtypes(include=["object"]).columns
+    for col in columnas_objetivas:
+        df[col] = df[col].apply(limpiar_valor)
+
+    mask = df[columnas_objetivas].apply(lambda row: all(val == "" for val in row), axis=1)
+    df = df[~mask]
+
+    return df
+
+
+def assert_igual_que_fila_a_fila(df):
+    pd.testing.assert_frame_equal(limpieza_total_texto_final(df.copy()), limpieza_fila_a_fila(df.copy()))
+
+
+VALORES = [
+    # Errores de importación y codificación
+    "#¿NOMBRE?", "#¡VALOR!", "¿?", "Valoración", "Sin nombre",
+    # Números y fechas cortas
+    "123", "111.0", "... 3235 ...", " 42 ", "09-may", "10-abr", "1-ene",
+    # Vacíos y solo símbolos
+    "?", "!", "---", "", " ", "x",
+    # Nulos
+    None, np.nan, pd.NA, pd.NaT,
+    # Unicode y espacios
+    "Café  Tacvba", "Beyoncé", "Sigur Rós", "Ñandú & Co.", "Ｆｕｌｌ", "١٢٣", "foo\tbar\nbaz", "日本語",
+    "a😀b", "  spaced   out ", "Guns N' Roses", "AC/DC", "Hip-Hop/Rap", "Música Mexicana",
+    # Otros tipos en columnas object
+    12, 3.5, True, False, 1, 1.0, 0, 0.0, -1, "True", "1",
+]
+
+
+def test_valores_sueltos():
+    df = pd.DataFrame({"texto": pd.Series(VALORES, dtype=object), "n": range(len(VALORES))})
+    assert_igual_que_fila_a_fila(df)
+
+
+def test_tipos_mezclados_no_se_confunden():
+    # True, 1 y 1.0 (o False y 0) son iguales para pd.factorize, pero no su texto
+    df = pd.DataFrame({"texto": pd.Series([True, 1, 1.0, False, 0, "True"], dtype=object)})
+    assert limpieza_total_texto_final(df.copy())["texto"].tolist() == ["True", "False", "True"]
+    assert_igual_que_fila_a_fila(df)
+
+
+def test_varias_columnas_y_filas_vacias():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "a": pd.Series(rng.choice(np.array(VALORES, dtype=object), 500), dtype=object),
+        "b": pd.Series(rng.choice(np.array(VALORES, dtype=object), 500), dtype=object),
+        "precio": rng.random(500),
+    }, index=rng.permutation(1000)[:500])
+    assert_igual_que_fila_a_fila(df)
+
+
+@pytest.mark.parametrize("valores", [[None, np.nan], ["Beyoncé"]])
+def test_columnas_degeneradas(valores):
+    assert_igual_que_fila_a_fila(pd.DataFrame({"texto": pd.Series(valores, dtype=object),
+                                               "n": range(len(valores))}))
+
+
+def test_datos_brutos(archivos_raw):
+    assert_igual_que_fila_a_fila(cargar_datos_itunes(columnas=COLUMNAS_ETL, archivos=archivos_raw))
@@ -0,0 +1,115 @@
+import time
+
+import pandas as pd
+import pytest
+
+from main_ETL import ESQUEMA_COLUMNAS
+from src.ETL.load import _copiar_csv, insertar_dataframe, insertar_intervalos_precio, precios_no_cargados
+from src.ETL.migraciones import asegurar_particiones
+from src.ETL.transform import procesar_dataframe_maestro
+
+TABLAS = ["artist", "album", "album_prices"]
+
+
+@pytest.fixture
+def tablas(maestro_limpio):
+    normalizadas = procesar_dataframe_maestro(maestro_limpio)
+    return {nombre: normalizadas[nombre] for nombre in TABLAS}
+
+
+def contenido(conn, nombre):
+    columnas = ESQUEMA_COLUMNAS[nombre]
+    df = pd.read_sql(f"SELECT {', '.join(columnas)} FROM {nombre}", conn)
+    return df.sort_values(columnas[:1] + (["checked_at"] if "checked_at" in columnas else [])).reset_index(drop=True)
+
+
+def cargar(conn, tablas, metodo):
+    with conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TABLAS)} CASCADE")
+    conn.commit()
+    asegurar_particiones(conn, {"album_prices": tablas["album_prices"]["checked_at"]})
+    for nombre, df in tablas.items():
+        insertar_dataframe(df, nombre, ESQUEMA_COLUMNAS[nombre], conn, metodo=metodo)
+
+
+def test_copy_mismo_contenido_que_executemany(conexion_bd, tablas):
+    cargar(conexion_bd, tablas, "executemany")
+    esperado = {nombre: contenido(conexion_bd, nombre) for nombre in TABLAS}
+
+    cargar(conexion_bd, tablas, "copy")
+    for nombre in TABLAS:
+        pd.testing.assert_frame_equal(contenido(conexion_bd, nombre), esperado[nombre], obj=nombre)
+
+
+def test_copy_recarga_ignora_claves_existentes(conexion_bd, tablas):
+    cargar(conexion_bd, tablas, "copy")
+    antes = contenido(conexion_bd, "artist")
+    escritas = []
+    insertar_dataframe(tablas["artist"], "artist", ESQUEMA_COLUMNAS["artist"], conexion_bd, claves_escritas=escritas)
+    assert escritas == []
+    pd.testing.assert_frame_equal(contenido(conexion_bd, "artist"), antes)
+
+
+def test_precios_ya_cargados_no_se_reenvian(conexion_bd, tablas):
+    precios = tablas["album_prices"]
+    dias = sorted(precios["checked_at"].unique())
+    cargados = precios[precios["checked_at"] != dias[-1]]
+    cargar(conexion_bd, {**tablas, "album_prices": cargados}, "copy")
+
+    # Al reprocesar todos los días solo queda el último, que aún no estaba en la base
+    pendientes = precios_no_cargados(precios, "album_prices", "collection_id", conexion_bd)
+    pd.testing.assert_frame_equal(pendientes, precios[precios["checked_at"] == dias[-1]])
+
+    insertar_dataframe(pendientes, "album_prices", ESQUEMA_COLUMNAS["album_prices"], conexion_bd)
+    assert precios_no_cargados(precios, "album_prices", "collection_id", conexion_bd).empty
+    assert len(contenido(conexion_bd, "album_prices")) == len(precios)
+
+
+def test_vista_diaria_igual_al_historial_sin_compactar(conexion_bd, tablas):
+    # Huecos: la mitad de los álbumes no se observan el segundo día
+    precios = tablas["album_prices"]
+    dias = sorted(precios["checked_at"].unique())
+    precios = precios[~((precios["checked_at"] == dias[1]) & (precios["collection_id"] % 2 == 0))]
+    cargar(conexion_bd, {**tablas, "album_prices": precios}, "copy")
+
+    # En dos cargas, para que el segundo día continúe o cierre los tramos abiertos
+    for parte in [precios[precios["checked_at"] <= dias[1]], precios[precios["checked_at"] > dias[1]]]:
+        insertar_intervalos_precio(parte, "album_price_intervals", "collection_id", "collectionprice", conexion_bd)
+
+    consulta = "SELECT collection_id, collectionprice, checked_at FROM {} ORDER BY collection_id, checked_at"
+    diario = pd.read_sql(consulta.format("album_prices_diario"), conexion_bd)
+    observado = pd.read_sql(consulta.format(
+        "(SELECT DISTINCT ON (collection_id, checked_at) * FROM album_prices ORDER BY collection_id, checked_at, id) p"
+    ), conexion_bd)
+    pd.testing.assert_frame_equal(diario, observado)
+    assert len(pd.read_sql("SELECT * FROM album_price_intervals", conexion_bd)) < len(observado)
+
+
+def test_copy_ids_float(conexion_vacia):
+    # IDs float64, como quedan las columnas enteras con nulos tras un merge o una lectura sin tipos
+    ids = pd.Series(range(1, 1001), dtype="float64")
+    ids[::10] = float("nan")
+    df = pd.DataFrame({"id": ids, "id_grande": ids * 1_000_000_007, "precio": ids / 100})
+    with conexion_vacia.cursor() as cursor:
+        cursor.execute("CREATE TABLE prueba_ids_float (id INTEGER, id_grande BIGINT, precio NUMERIC(10, 2))")
+        _copiar_csv(df, "prueba_ids_float", list(df.columns), cursor, filas_por_bloque=333)
+        cursor.execute("SELECT id, id_grande FROM prueba_ids_float")
+        leidos = pd.DataFrame(cursor.fetchall(), columns=["id", "id_grande"], dtype="Int64")
+
+    esperados = df[["id", "id_grande"]].astype("Int64")
+    pd.testing.assert_frame_equal(leidos.sort_values("id").reset_index(drop=True),
+                                  esperados.sort_values("id").reset_index(drop=True))
+
+
+@pytest.mark.benchmark
+def test_copy_mas_rapido_que_executemany(conexion_bd, tablas):
+    tiempos = {}
+    for metodo in ["executemany", "copy"]:
+        mejores = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            cargar(conexion_bd, tablas, metodo)
+            mejores.append(time.perf_counter() - inicio)
+        tiempos[metodo] = min(mejores)
+    print(f"[INFO] executemany {tiempos['executemany']:.2f}s | copy {tiempos['copy']:.2f}s")
+    assert tiempos["copy"] < tiempos["executemany"]
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pandas as pd
+
+from src.ETL.migraciones import MIGRACIONES, aplicar_migraciones, estado_migraciones
+from src.ETL.resumenes import actualizar_resumenes
+
+RUTA_ESQUEMA_SQL = Path(__file__).resolve().parents[1] / "documentacion" / "itunes_database.sql"
+
+
+def consultar(conn, sql):
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+def test_base_vacia_llega_a_la_ultima_version(conexion_vacia):
+    assert aplicar_migraciones(conexion_vacia) == [version for version, _, _ in MIGRACIONES]
+    assert estado_migraciones(conexion_vacia)["aplicada_en"].notna().all()
+    assert aplicar_migraciones(conexion_vacia) == []
+    # Historial de precios particionado y tabla de checkpoints de la carga por trozos
+    assert consultar(conexion_vacia, "SELECT count(*) FROM pg_partitioned_table "
+                                     "WHERE partrelid IN ('track_prices'::regclass, 'album_prices'::regclass)") == [(2,)]
+    assert consultar(conexion_vacia, "SELECT to_regclass('etl_checkpoint_carga') IS NOT NULL") == [(True,)]
+
+
+def test_base_del_script_sql_conserva_los_precios(conexion_vacia):
+    # Base creada con documentacion/itunes_database.sql y con datos antes de las migraciones
+    conn = conexion_vacia
+    with conn.cursor() as cursor:
+        cursor.execute(RUTA_ESQUEMA_SQL.read_text(encoding="utf-8"))
+        cursor.execute("INSERT INTO artist VALUES (1, 'Artista', NULL)")
+        cursor.execute("INSERT INTO album (collection_id, artist_id) VALUES (10, 1)")
+        cursor.execute("INSERT INTO track (track_id, artist_id, collection_id) VALUES (100, 1, 10)")
+        cursor.execute("""
+            INSERT INTO track_prices (trackprice, checked_at, track_id)
+            SELECT 0.99 + (d % 3) / 10.0, DATE '2024-12-20' + d, 100 FROM generate_series(0, 59) d
+        """)
+        cursor.execute("INSERT INTO track_prices (trackprice, checked_at, track_id) VALUES (1.29, NULL, 100)")
+        cursor.execute("INSERT INTO album_prices (collectionprice, checked_at, collection_id) VALUES (9.99, '2025-01-01', 10)")
+    conn.commit()
+    antes = pd.read_sql("SELECT id, trackprice, checked_at, track_id FROM track_prices ORDER BY id", conn)
+
+    aplicar_migraciones(conn)
+
+    despues = pd.read_sql("SELECT id, trackprice, checked_at, track_id FROM track_prices ORDER BY id", conn)
+    sin_fecha = pd.read_sql("SELECT id, trackprice, checked_at, track_id FROM track_prices_sin_fecha", conn)
+    pd.testing.assert_frame_equal(pd.concat([despues, sin_fecha]).sort_values("id").reset_index(drop=True), antes)
+    assert consultar(conn, "SELECT count(*) FROM album_prices") == [(1,)]
+    # Tres meses con datos → tres particiones; la secuencia sigue tras el último id
+    assert consultar(conn, "SELECT count(*) FROM pg_inherits WHERE inhparent = 'track_prices'::regclass") == [(3,)]
+    assert consultar(conn, "SELECT nextval('track_prices_id_seq')") == [(antes["id"].max() + 1,)]
+    # Los precios ya cargados quedan en la cola de los resúmenes del EDA hasta la siguiente actualización
+    actualizar_resumenes(conn)
+    assert consultar(conn, "SELECT tipo, sum(n_precio)::int FROM resumen_precio_diario GROUP BY tipo ORDER BY tipo") == [
+        ("album", 1), ("track", 60)
+    ]
@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.ETL.normalizacion_duckdb import procesar_con_duckdb
+from src.ETL.transform import compactar_categoricas, procesar_dataframe_maestro
+
+
+def assert_tablas_iguales(obtenidas, esperadas):
+    assert obtenidas.keys() == esperadas.keys()
+    for nombre, esperado in esperadas.items():
+        pd.testing.assert_frame_equal(obtenidas[nombre], esperado, obj=nombre)
+
+
+@pytest.mark.parametrize("moda_dimensiones", [False, True])
+def test_duckdb_mismas_tablas_que_pandas(maestro_limpio, moda_dimensiones):
+    assert_tablas_iguales(procesar_con_duckdb(maestro_limpio, moda_dimensiones),
+                          procesar_dataframe_maestro(maestro_limpio, moda_dimensiones))
+
+
+def test_duckdb_desde_pickle(maestro_limpio, tmp_path):
+    ruta = tmp_path / "itunes_limpio.pkl"
+    maestro_limpio.to_pickle(ruta)
+    assert_tablas_iguales(procesar_dataframe_maestro(str(ruta), motor="duckdb"),
+                          procesar_dataframe_maestro(str(ruta)))
+
+
+def test_duckdb_con_categoricas(maestro_limpio):
+    compacto = compactar_categoricas(maestro_limpio)
+    assert_tablas_iguales(procesar_con_duckdb(compacto), procesar_dataframe_maestro(maestro_limpio))
+
+
+def test_duckdb_formato_arrow(maestro_limpio):
+    tablas = procesar_con_duckdb(maestro_limpio, formato="arrow")
+    esperadas = procesar_dataframe_maestro(maestro_limpio)
+    for nombre, esperado in esperadas.items():
+        assert tablas[nombre].column_names == list(esperado.columns)
+        assert tablas[nombre].num_rows == len(esperado)
+
+
+def replicar_maestro(df, filas):
+    """
+    Maestro sintético de `filas` registros repitiendo `df`. Cada réplica desplaza los IDs de
+    artista, álbum y canción para que el número de claves distintas crezca con el tamaño.
+    """
+    df = df.reset_index(drop=True)
+    posiciones = np.resize(np.arange(len(df)), filas)
+    replica = np.arange(filas) // len(df)
+    grande = df.iloc[posiciones].reset_index(drop=True)
+    for col in ["artistId", "collectionId", "trackId"]:
+        desplazamiento = int(df[col].max()) + 1
+        grande[col] = grande[col] + pd.array(replica * desplazamiento, dtype=grande[col].dtype)
+    return grande
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("filas", [1_000_000])
+def test_duckdb_tiempos_a_escala(maestro_limpio, filas):
+    grande = replicar_maestro(maestro_limpio, filas)
+
+    inicio = time.perf_counter()
+    esperadas = procesar_dataframe_maestro(grande)
+    t_pandas = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    obtenidas = procesar_con_duckdb(grande)
+    t_duckdb = time.perf_counter() - inicio
+
+    # La aceleración depende de los núcleos disponibles: se informa, pero solo se exige la paridad
+    print(f"[INFO] {filas} filas: pandas {t_pandas:.2f}s | duckdb {t_duckdb:.2f}s")
+    assert_tablas_iguales(obtenidas, esperadas)
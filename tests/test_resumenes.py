@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from main_ETL import cargar_en_postgres
+from src.ETL.resumenes import (
+    duracion_y_precio_por_genero,
+    precio_medio_diario,
+    precio_y_duracion_por_explicitud,
+    recalcular_resumenes,
+    top_artistas_por_precio,
+)
+from src.ETL.transform import procesar_dataframe_maestro
+
+
+@pytest.fixture
+def tablas(maestro_limpio):
+    return procesar_dataframe_maestro(maestro_limpio)
+
+
+def cargar_por_dias(tablas, config_bd, precios_intervalos):
+    """Carga las tablas en dos ejecuciones (el primer día y el resto), como dos cargas incrementales."""
+    primer_dia = min(tablas["track_prices"]["checked_at"])
+    for primera in [True, False]:
+        parte = {nombre: df.copy() for nombre, df in tablas.items()}
+        for nombre in ["track_prices", "album_prices"]:
+            parte[nombre] = parte[nombre][(parte[nombre]["checked_at"] == primer_dia) == primera]
+        cargar_en_postgres(parte, config_bd, precios_intervalos=precios_intervalos, cache_claves=False)
+
+
+def esperados(tablas):
+    """Agregados de los resúmenes calculados con pandas sobre las tablas normalizadas."""
+    track = tablas["track"][["track_id", "primarygenrename", "trackexplicitness", "tracktimemillis", "artist_id"]]
+    precios = (
+        tablas["track_prices"].merge(track, on="track_id", how="left")
+        .rename(columns={"trackprice": "trackPrice", "tracktimemillis": "trackTimeMillis"})
+    )
+    return {
+        "genero": precios.groupby("primarygenrename")[["trackTimeMillis", "trackPrice"]].mean(),
+        "explicitud": precios.groupby("trackexplicitness")[["trackPrice", "trackTimeMillis"]].mean(),
+        "artista": precios.groupby("artist_id")["trackPrice"].mean(),
+        "track": precios.groupby("checked_at")["trackPrice"].mean(),
+        "album": tablas["album_prices"].groupby("checked_at")["collectionprice"].mean(),
+    }
+
+
+@pytest.mark.parametrize("precios_intervalos", [False, True])
+def test_resumenes_iguales_a_los_agregados_de_las_tablas(conexion_bd, config_bd, tablas, precios_intervalos):
+    cargar_por_dias(tablas, config_bd, precios_intervalos)
+    esperado = esperados(tablas)
+
+    for _ in range(2):  # mantenidos en cada carga y recalculados desde cero
+        genero = duracion_y_precio_por_genero(conexion_bd)
+        pd.testing.assert_frame_equal(genero, esperado["genero"], check_names=False, check_dtype=False)
+        explicitud = precio_y_duracion_por_explicitud(conexion_bd)
+        pd.testing.assert_frame_equal(explicitud, esperado["explicitud"], check_names=False, check_dtype=False)
+
+        artistas = top_artistas_por_precio(conexion_bd, top=len(esperado["artista"]))["Precio medio (USD)"]
+        assert sorted(artistas.round(6)) == sorted(esperado["artista"].round(6))
+
+        for tipo in ["track", "album"]:
+            diario = precio_medio_diario(conexion_bd, tipo).set_index("checked_at").iloc[:, 0]
+            pd.testing.assert_series_equal(diario, esperado[tipo].set_axis(pd.to_datetime(esperado[tipo].index)),
+                                           check_names=False, check_index_type=False, check_freq=False)
+        recalcular_resumenes(conexion_bd)